@@ -1,21 +1,156 @@
+import base64
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, case, delete, func, literal, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 from . import models, schemas
 
 
+def get_user_by_email(db: Session, email: str) -> models.User | None:
+    return db.query(models.User).filter(models.User.email == email).first()
+
+
+def count_users(db: Session) -> int:
+    return db.query(models.User).count()
+
+
+def create_user(db: Session, email: str, hashed_password: str, role: str = "user") -> models.User:
+    user = models.User(email=email, hashed_password=hashed_password, role=role)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+def update_password_hash(db: Session, user_id: int, hashed_password: str):
+    db.query(models.User).filter(models.User.id == user_id).update({"hashed_password": hashed_password})
+    db.commit()
+
+
 def create_prediction(db: Session, data: schemas.PredictionCreate, user_id: int | None = None) -> models.Prediction:
     pred = models.Prediction(
         image_url=data.image_url,
         predicted_class=data.predicted_class,
         confidence=data.confidence,
         heatmap_url=data.heatmap_url,
+        heatmap_status=data.heatmap_status,
+        heatmap_requested_at=func.now() if data.heatmap_status == "pending" else None,
+        thumbnail_url=data.thumbnail_url,
+        image_hash=data.image_hash,
+        model_version=data.model_version,
         user_id=user_id,
     )
     db.add(pred)
+    bump_history_versions(db, [user_id])
     db.commit()
     db.refresh(pred)
     return pred
 
 
+def get_prediction(db: Session, pred_id: int) -> models.Prediction | None:
+    # populate_existing: heatmap workers update rows from other sessions
+    return db.get(models.Prediction, pred_id, populate_existing=True)
+
+
+def find_prediction_by_hash(db: Session, image_hash: str, model_version: str) -> models.Prediction | None:
+    """Most recent finished prediction for the same image bytes and model."""
+    return (
+        db.query(models.Prediction)
+        .filter(
+            models.Prediction.image_hash == image_hash,
+            models.Prediction.model_version == model_version,
+            models.Prediction.heatmap_status == "ready",
+        )
+        .order_by(models.Prediction.id.desc())
+        .first()
+    )
+
+
+def update_heatmap(db: Session, pred_id: int, status: str, heatmap_url: str | None = None,
+                   thumbnail_url: str | None = None) -> bool:
+    pred = db.get(models.Prediction, pred_id)
+    if not pred:
+        return False
+    pred.heatmap_status = status
+    if status == "pending":
+        pred.heatmap_requested_at = func.now()
+    if heatmap_url is not None:
+        pred.heatmap_url = heatmap_url
+    if thumbnail_url is not None:
+        pred.thumbnail_url = thumbnail_url
+    bump_history_versions(db, [pred.user_id])
+    db.commit()
+    return True
+
+
+def claim_stale_heatmap(db: Session, pred_id: int, stale_after: float) -> bool:
+    """
+    Take over a pending heatmap whose job was queued more than stale_after
+    seconds ago (e.g. lost in a worker restart) by resetting its queue time.
+    The check and the reset are one UPDATE, so only one caller wins.
+    """
+    P = models.Prediction
+    cutoff = _timestamp_param(db, datetime.now(timezone.utc) - timedelta(seconds=stale_after))
+    claimed = db.execute(
+        update(P)
+        .where(P.id == pred_id, P.heatmap_status == "pending",
+               or_(P.heatmap_requested_at.is_(None), P.heatmap_requested_at < cutoff))
+        .values(heatmap_requested_at=func.now())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return bool(claimed)
+
+
+ANONYMOUS_HISTORY = 0  # HistoryVersion scope of predictions stored without a user
+
+
+def history_version(db: Session, user_id: int | None = None) -> str:
+    """
+    Token that changes whenever a prediction list changes: the user's
+    HistoryVersion, or for the all-predictions listing (user_id None) the
+    highest prediction id and the sum of every scope's version. Each write
+    bumps some scope, so the sum moves on inserts, updates and deletes
+    without a shared row that every prediction write would have to lock.
+    """
+    V = models.HistoryVersion
+    if user_id is not None:
+        return str(db.execute(select(V.version).where(V.scope == user_id)).scalar() or 0)
+    max_id = db.execute(select(func.max(models.Prediction.id))).scalar()
+    total = db.execute(select(func.sum(V.version))).scalar()
+    return f"{max_id or 0}.{total or 0}"
+
+
+def bump_history_versions(db: Session, user_ids):
+    """
+    Advance the history version of each affected user (ANONYMOUS_HISTORY for
+    predictions without one), in the caller's transaction. Every write to
+    predictions must call this, or GET /history serves stale 304s and cached
+    pages. New rows start at
+    the current time in ms rather than 1, so versions never repeat after the
+    table is dropped (reset_database.py) and a client's old ETag cannot match.
+    """
+    scopes = sorted({ANONYMOUS_HISTORY if u is None else u for u in user_ids})
+    if not scopes:
+        return
+    table = models.HistoryVersion.__table__
+    initial = int(time.time() * 1000)
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite_insert if dialect == "sqlite" else pg_insert
+        stmt = insert(table).values([{"scope": scope, "version": initial} for scope in scopes])
+        db.execute(stmt.on_conflict_do_update(index_elements=[table.c.scope],
+                                              set_={"version": table.c.version + 1}))
+        return
+    for scope in scopes:
+        bumped = db.execute(update(table).where(table.c.scope == scope).values(version=table.c.version + 1))
+        if not bumped.rowcount:
+            db.execute(table.insert().values(scope=scope, version=initial))
+
+
 def list_predictions(db: Session):
     return db.query(models.Prediction).order_by(models.Prediction.timestamp.desc()).all()
 
@@ -29,12 +164,159 @@ def list_predictions_for_user(db: Session, user_id: int):
     )
 
 
-def delete_prediction(db: Session, pred_id: int) -> bool:
-    pred = db.query(models.Prediction).filter(models.Prediction.id == pred_id).first()
-    if not pred:
-        return False
-    db.delete(pred)
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(pred: models.Prediction) -> str:
+    """Opaque keyset cursor for the position just after ``pred`` in (timestamp, id) desc order."""
+    raw = f"{pred.timestamp.isoformat()}|{pred.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, pred_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(pred_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+
+
+def _timestamp_param(db: Session, value: datetime):
+    """
+    Bind a datetime for comparison with Prediction.timestamp.
+
+    SQLite stores server_default timestamps as "YYYY-MM-DD HH:MM:SS" text (UTC)
+    and compares them as strings, so the value is bound in the same form;
+    binding a datetime would add ".000000" and break equality at page edges.
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        return value
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return literal(value.isoformat(sep=" ", timespec="microseconds" if value.microsecond else "seconds"))
+
+
+def _filtered_predictions(db: Session, user_id: int | None = None, predicted_class: str | None = None,
+                          date_from: datetime | None = None, date_to: datetime | None = None,
+                          min_confidence: float | None = None):
+    query = db.query(models.Prediction)
+    if user_id is not None:
+        query = query.filter(models.Prediction.user_id == user_id)
+    if predicted_class is not None:
+        query = query.filter(models.Prediction.predicted_class == predicted_class)
+    if date_from is not None:
+        query = query.filter(models.Prediction.timestamp >= _timestamp_param(db, date_from))
+    if date_to is not None:
+        query = query.filter(models.Prediction.timestamp < _timestamp_param(db, date_to))
+    if min_confidence is not None:
+        query = query.filter(models.Prediction.confidence >= min_confidence)
+    return query
+
+
+def history_page_query(db: Session, limit: int, cursor: str | None = None, **filters):
+    """The query behind list_predictions_page (fetches limit + 1 rows to detect a next page)."""
+    query = _filtered_predictions(db, **filters)
+    if cursor is not None:
+        timestamp, pred_id = decode_cursor(cursor)
+        timestamp = _timestamp_param(db, timestamp)
+        query = query.filter(or_(
+            models.Prediction.timestamp < timestamp,
+            and_(models.Prediction.timestamp == timestamp, models.Prediction.id < pred_id),
+        ))
+    return query.order_by(models.Prediction.timestamp.desc(), models.Prediction.id.desc()).limit(limit + 1)
+
+
+def list_predictions_page(db: Session, limit: int, cursor: str | None = None,
+                          **filters) -> tuple[list[models.Prediction], str | None]:
+    """
+    One page of predictions, newest first, keyset-paginated on (timestamp, id).
+
+    ``filters`` are user_id, predicted_class, date_from (inclusive), date_to
+    (exclusive) and min_confidence. Returns (rows, cursor for the next page or
+    None). Cost depends on the page size, not on the offset into the table.
+    """
+    rows = history_page_query(db, limit, cursor, **filters).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+
+def count_predictions(db: Session, **filters) -> int:
+    return _filtered_predictions(db, **filters).order_by(None).count()
+
+
+def prediction_stats(db: Session, weeks: int = 8, now: datetime | None = None, **filters) -> dict:
+    """
+    Dashboard aggregates computed in the database: the number of predictions,
+    their mean confidence, the count per predicted class and the count in
+    each of the last ``weeks`` 7-day windows (oldest first, the last one
+    ending now). ``filters`` are those of list_predictions_page.
+    """
+    P = models.Prediction
+    query = _filtered_predictions(db, **filters).order_by(None)
+    total, avg_confidence = query.with_entities(func.count(P.id), func.avg(P.confidence)).one()
+    by_class = dict(query.with_entities(P.predicted_class, func.count(P.id)).group_by(P.predicted_class).all())
+    now = now or datetime.now(timezone.utc)
+    starts = [_timestamp_param(db, now - timedelta(weeks=weeks - i)) for i in range(weeks)]
+    windows = [
+        func.sum(case((and_(P.timestamp >= start, P.timestamp < end) if end is not None else P.timestamp >= start, 1),
+                      else_=0))
+        for start, end in zip(starts, [*starts[1:], None])
+    ]
+    weekly = query.filter(P.timestamp >= starts[0]).with_entities(*windows).one()
+    return {
+        "total": total,
+        "avg_confidence": avg_confidence,
+        "by_class": by_class,
+        "weekly": [count or 0 for count in weekly],
+    }
+
+
+def delete_prediction(db: Session, pred_id: int, user_id: int | None = None) -> bool:
+    return bool(delete_predictions(db, [pred_id], user_id=user_id))
+
+
+def delete_predictions(db: Session, pred_ids, user_id: int | None = None) -> list:
+    """
+    Delete predictions by id in one statement, only those owned by user_id when
+    given. Returns the deleted rows' (id, user_id, image_url, heatmap_url,
+    thumbnail_url); ids that do not exist or belong to someone else are skipped.
+    """
+    pred_ids = list(pred_ids)
+    if not pred_ids:
+        return []
+    P = models.Prediction
+    columns = (P.id, P.user_id, P.image_url, P.heatmap_url, P.thumbnail_url)
+    conditions = [P.id.in_(pred_ids)]
+    if user_id is not None:
+        conditions.append(P.user_id == user_id)
+    if db.get_bind().dialect.delete_returning:
+        rows = db.execute(delete(P).where(*conditions).returning(*columns)).all()
+    else:
+        rows = db.execute(select(*columns).where(*conditions)).all()
+        if rows:
+            db.execute(delete(P).where(P.id.in_([row.id for row in rows])))
+    if rows:
+        bump_history_versions(db, {row.user_id for row in rows})
     db.commit()
-    return True
+    return rows
 
 
+def referenced_urls(db: Session, urls) -> set[str]:
+    """
+    The static URLs in ``urls`` that some prediction still uses. Uploads are
+    stored under their content hash and cache hits reuse the image, heatmap
+    and thumbnail, so each URL is looked up in all three (indexed) columns;
+    image_hash is not enough, fallback predictions are stored without one.
+    """
+    urls = list(urls)
+    if not urls:
+        return set()
+    P = models.Prediction
+    in_use = set()
+    for column in (P.image_url, P.heatmap_url, P.thumbnail_url):
+        in_use.update(db.execute(select(column).where(column.in_(urls)).distinct()).scalars())
+    return in_use
@@ -1,22 +1,225 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from collections import deque
 import os
+import threading
+import time
 
 
 DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./skinvision.db")
+# Routers use an AsyncSession on an async driver (asyncpg / aiosqlite) instead of
+# running sync sessions in the threadpool. The sync engine is kept for
+# migrations, scripts and background heatmap jobs.
+DB_ASYNC = os.environ.get("DB_ASYNC", "false").lower() in ("1", "true", "yes")
 
-connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+# Connection pool (per worker process). Keep
+# workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) below the server's max_connections.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Postgres: seconds to establish a connection, and a per-statement limit (0 = none)
+DB_CONNECT_TIMEOUT = int(os.environ.get("DB_CONNECT_TIMEOUT", "10"))
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+# SQLite: WAL lets readers run alongside a writer; NORMAL fsyncs only at
+# checkpoints (safe with WAL); writers wait up to the busy timeout for the lock.
+SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "wal").lower()
+if SQLITE_JOURNAL_MODE not in ("wal", "delete", "truncate", "persist", "memory", "off"):
+    print(f"⚠️  Unknown SQLITE_JOURNAL_MODE={SQLITE_JOURNAL_MODE!r}; using wal")
+    SQLITE_JOURNAL_MODE = "wal"
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "normal").lower()
+if SQLITE_SYNCHRONOUS not in ("off", "normal", "full", "extra"):
+    print(f"⚠️  Unknown SQLITE_SYNCHRONOUS={SQLITE_SYNCHRONOUS!r}; using normal")
+    SQLITE_SYNCHRONOUS = "normal"
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+class PoolWaitStats:
+    """Time spent waiting for a pooled connection (rolling window, milliseconds)."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.max_ms = 0.0
+
+    def record(self, started: float, timed_out: bool = False):
+        elapsed = (time.perf_counter() - started) * 1000.0
+        with self._lock:
+            self._samples.append(elapsed)
+            self.max_ms = max(self.max_ms, elapsed)
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            samples = sorted(self._samples)
+            checkouts, timeouts, max_ms = self.checkouts, self.timeouts, self.max_ms
+
+        def percentile(q):
+            return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+
+        return {
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "wait_ms": {"p50": percentile(0.5), "p99": percentile(0.99), "max": max_ms},
+        }
+
+
+POOL_WAITS = PoolWaitStats()
+
+
+class _TimedCheckout:
+    """Pool mixin that records how long each checkout waited (see /metrics/db)."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            POOL_WAITS.record(started, timed_out=True)
+            raise
+        POOL_WAITS.record(started)
+        return conn
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def async_database_url(url: str) -> str:
+    """The same database with its async driver: asyncpg for Postgres, aiosqlite for SQLite."""
+    url = make_url(url)
+    if url.get_backend_name() == "postgresql":
+        url = url.set(drivername="postgresql+asyncpg")
+    elif url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url.render_as_string(hide_password=False)
+
+
+def _engine_options(url: str, is_async: bool = False) -> dict:
+    options = {"echo": False, "future": True}
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False}
+        if make_url(url).database in (None, "", ":memory:"):
+            # In-memory databases live in one connection; keep SQLAlchemy's default pool
+            return options
+    elif url.startswith("postgresql") and is_async:
+        # asyncpg names: connect timeout and server settings
+        connect_args = {"timeout": DB_CONNECT_TIMEOUT}
+        if DB_STATEMENT_TIMEOUT_MS > 0:
+            connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+        options["connect_args"] = connect_args
+    elif url.startswith("postgresql"):
+        connect_args = {"connect_timeout": DB_CONNECT_TIMEOUT}
+        if DB_STATEMENT_TIMEOUT_MS > 0:
+            connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+        options["connect_args"] = connect_args
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    return options
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _sqlite_pragmas)
 
-engine = create_engine(DATABASE_URL, echo=False, future=True, connect_args=connect_args)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    _async_url = async_database_url(DATABASE_URL)
+    async_engine = create_async_engine(_async_url, **_engine_options(_async_url, is_async=True))
+    if async_engine.dialect.name == "sqlite":
+        event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+    # Rows are returned to the routers after commit; expiring them would need lazy (awaited) reloads
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def get_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+else:
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+async def run_db(db: Session | AsyncSession, fn, *args, **kwargs):
+    """
+    Call a sync crud function ``fn(session, *args, **kwargs)`` without blocking
+    the event loop: through ``AsyncSession.run_sync`` (the queries await the
+    async driver) or, for a sync Session, in the threadpool.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+def sync_bind(db: Session | AsyncSession):
+    """Engine for sync work outside the request (background jobs) that matches ``db``."""
+    return engine if isinstance(db, AsyncSession) else db.get_bind()
+
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def _queue_pool_stats(pool) -> dict:
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        # Negative while the pool has not opened pool_size connections yet
+        "overflow": pool.overflow(),
+    }
 
 
+def pool_stats() -> dict:
+    """Connection pool metrics for this worker process, exposed under /metrics/db."""
+    pool = engine.pool
+    stats = {"pid": os.getpid(), "dialect": engine.dialect.name, "pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            max_overflow=DB_MAX_OVERFLOW,
+            timeout=DB_POOL_TIMEOUT,
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            # Negative while the pool has not opened pool_size connections yet
+            overflow=pool.overflow(),
+        )
+    if async_engine is not None and isinstance(async_engine.pool, QueuePool):
+        stats["async"] = _queue_pool_stats(async_engine.pool)
+    # Waits and timeouts cover both pools
+    stats.update(POOL_WAITS.stats())
+    return stats
@@ -0,0 +1,90 @@
+import asyncio
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class QueueFullError(Exception):
+    """Raised when an executor has no free slot for another request."""
+
+
+class BoundedExecutor:
+    """
+    Thread pool with admission control for CPU-bound request stages.
+
+    At most ``max_workers`` stages run at once. Requests are admitted with
+    ``acquire()``; once ``max_workers + max_queue`` requests are in flight,
+    further requests are rejected with ``QueueFullError`` instead of piling
+    up behind the pool.
+
+    With ``processes=True`` the stages run in spawned worker processes; the
+    callables and their arguments must then be picklable (module-level
+    functions).
+    """
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 32, name: str = "inference", processes: bool = False):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.name = name
+        self.processes = processes
+        if processes:
+            # spawn: the API process has model and server threads running, which fork would copy mid-state
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{name}-worker")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._admitted = 0
+        self._rejected = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def acquire(self):
+        """Reserve a slot for one request; raises QueueFullError if none is free."""
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self._rejected += 1
+                raise QueueFullError(f"{self.name} executor is full ({self._in_flight} in flight)")
+            self._in_flight += 1
+            self._admitted += 1
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    @contextmanager
+    def admit(self):
+        """Context-manager form of acquire()/release()."""
+        self.acquire()
+        try:
+            yield self
+        finally:
+            self.release()
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking callable on the pool without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule a background job on the pool (no admission control)."""
+        return self._pool.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "processes": self.processes,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+            }
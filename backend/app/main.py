@@ -1,21 +1,74 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
 from .database import Base, engine
-from .routers import auth, predict, history
+from .migrations import apply_migrations
+from .routers import auth, predict, history, metrics
 import os
 
 
-Base.metadata.create_all(bind=engine)
+# Tables and migrations in one locked transaction: every uvicorn worker runs this at import
+apply_migrations(engine, Base.metadata)
 
-app = FastAPI(title="SkinVision AI API", version="1.0.0")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load and warm up the model in the background; /health/ready reports 503 until done
+    predict.start_warm_up()
+    yield
+
+
+app = FastAPI(title="SkinVision AI API", version="1.0.0", lifespan=lifespan)
+
+
+class UploadSizeLimit:
+    """
+    Answer 413 for prediction uploads over the limit before the body is
+    spooled: at once when the declared Content-Length is too large, otherwise
+    (e.g. chunked requests) as soon as the streamed body passes the limit.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] != "/predict":
+            return await self.app(scope, receive, send)
+        limit = predict.MAX_UPLOAD_BYTES + predict.MULTIPART_OVERHEAD_BYTES
+        length = Headers(scope=scope).get("content-length", "")
+        if length.isdigit() and int(length) > limit:
+            response = JSONResponse(status_code=413, content={"detail": predict.upload_too_large().detail})
+            return await response(scope, receive, send)
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside body parsing; FastAPI passes HTTPExceptions through as responses
+                    raise predict.upload_too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(UploadSizeLimit)
+
+
+# Added after the size check so its CORS headers are also set on 413 responses
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # History pagination and revalidation headers (routers/history.py)
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag"],
 )
 
 static_dir = os.environ.get("STATIC_DIR", os.path.join(os.path.dirname(__file__), "static"))
@@ -25,6 +78,7 @@ app.mount("/static", StaticFiles(directory=static_dir), name="static")
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(predict.router, tags=["predict"])  # /predict
 app.include_router(history.router, prefix="/history", tags=["history"])  # /history
+app.include_router(metrics.router, prefix="/metrics", tags=["metrics"])  # /metrics
 
 
 @app.get("/")
@@ -32,3 +86,10 @@ def root():
     return {"message": "SkinVision AI API is running"}
 
 
+@app.get("/health/ready")
+def health_ready():
+    """Readiness probe: 503 until the model has been loaded and warmed up."""
+    state = predict.readiness()
+    if not state["ready"]:
+        return JSONResponse(status_code=503, content=state)
+    return state
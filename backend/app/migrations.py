@@ -0,0 +1,131 @@
+"""
+Versioned schema migrations.
+
+Each migration runs once per database and is recorded in the
+schema_migrations table, so new indexes and schema changes reach existing
+databases (Base.metadata.create_all only creates missing tables). Add new
+steps to the end of MIGRATIONS with the next version number; steps must be
+safe to run on a database whose tables were just created by create_all.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False),
+)
+
+
+def _history_indexes(conn: Connection):
+    # GET /history: per-user and admin listings ordered by (timestamp desc, id desc)
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_predictions_user_timestamp_id "
+        "ON predictions (user_id, timestamp DESC, id DESC)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_predictions_timestamp_id "
+        "ON predictions (timestamp DESC, id DESC)"
+    ))
+    # Refresh planner statistics so the new indexes are costed like the existing ones
+    conn.execute(text("ANALYZE predictions"))
+
+
+# Columns added to predictions after the first release, as (name, DDL type)
+_PREDICTION_COLUMNS = [
+    ("heatmap_status", "VARCHAR NOT NULL DEFAULT 'ready'"),
+    ("thumbnail_url", "VARCHAR"),
+    ("image_hash", "VARCHAR(64)"),
+    ("model_version", "VARCHAR"),
+]
+
+
+def _add_prediction_columns(conn: Connection, columns):
+    # create_all only adds columns to new tables; skip those a database already has
+    existing = {column["name"] for column in inspect(conn).get_columns("predictions")}
+    for name, ddl in columns:
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE predictions ADD COLUMN {name} {ddl}"))
+
+
+def _prediction_columns(conn: Connection):
+    # Heatmap status, thumbnails and the prediction cache key
+    _add_prediction_columns(conn, _PREDICTION_COLUMNS)
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_predictions_image_hash ON predictions (image_hash)"))
+
+
+def _heatmap_requested_at(conn: Connection):
+    # Lets GET /predictions/{id}/heatmap re-queue pending heatmaps whose job was lost
+    _add_prediction_columns(conn, [("heatmap_requested_at", "TIMESTAMP WITH TIME ZONE")])
+
+
+def _static_url_indexes(conn: Connection):
+    # History deletes look up each removed file in all three URL columns
+    for column in ("image_url", "heatmap_url", "thumbnail_url"):
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_predictions_{column} ON predictions ({column})"))
+
+
+MIGRATIONS = [
+    (1, "history composite indexes", _history_indexes),
+    (2, "prediction heatmap, thumbnail and cache columns", _prediction_columns),
+    (3, "heatmap requested_at", _heatmap_requested_at),
+    (4, "static url indexes", _static_url_indexes),
+]
+
+
+# Key of the Postgres advisory lock held while migrations run (any constant unique to this app)
+MIGRATION_LOCK_KEY = 7_204_311_958
+
+
+def _lock_for_migrations(conn: Connection):
+    """
+    Begin the migration transaction under a database-wide lock. Every uvicorn
+    worker runs the migrations at import; the first one applies them and the
+    others wait here, then find them recorded. Other dialects are not locked.
+    """
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        # Released when the transaction ends
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    elif dialect == "sqlite":
+        # Waits for the lock up to the connection's busy timeout (SQLITE_BUSY_TIMEOUT_MS)
+        conn.exec_driver_sql("BEGIN EXCLUSIVE")
+
+
+def applied_versions(engine: Engine) -> set[int]:
+    if not inspect(engine).has_table("schema_migrations"):
+        return set()
+    with engine.connect() as conn:
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def apply_migrations(engine: Engine, metadata: MetaData | None = None) -> list[int]:
+    """
+    Create the tables in ``metadata`` that do not exist yet, then run pending
+    migrations in order; returns the versions applied. Everything happens in
+    one transaction under _lock_for_migrations, so concurrent callers neither
+    repeat a migration nor fail on each other's DDL.
+    """
+    applied = []
+    with engine.connect() as conn:
+        _lock_for_migrations(conn)
+        _metadata.create_all(bind=conn)
+        if metadata is not None:
+            metadata.create_all(bind=conn)
+        done = set(conn.execute(select(schema_migrations.c.version)).scalars())
+        for version, name, migrate in MIGRATIONS:
+            if version in done:
+                continue
+            migrate(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=version, name=name, applied_at=datetime.now(timezone.utc)))
+            applied.append((version, name))
+        conn.commit()
+    for version, name in applied:
+        print(f"✅ Applied migration {version}: {name}")
+    return [version for version, _ in applied]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from .database import Base
 
@@ -7,12 +7,28 @@ class Prediction(Base):
     __tablename__ = "predictions"
 
     id = Column(Integer, primary_key=True, index=True)
-    image_url = Column(String, nullable=False)
+    # The three static URLs are indexed for the reference check after history deletes
+    image_url = Column(String, nullable=False, index=True)
     predicted_class = Column(String, nullable=False)
     confidence = Column(Float, nullable=False)
-    heatmap_url = Column(String, nullable=True)
+    heatmap_url = Column(String, nullable=True, index=True)
+    # ready | pending | failed | not_requested (see HEATMAP_MODE in routers/predict.py)
+    heatmap_status = Column(String, nullable=False, default="ready", server_default="ready")
+    # When the current heatmap job was queued; pending rows older than HEATMAP_STALE_SECONDS are queued again
+    heatmap_requested_at = Column(DateTime(timezone=True), nullable=True)
+    # Small rendition of the upload for history lists (HEATMAP_THUMBNAIL_DIM)
+    thumbnail_url = Column(String, nullable=True, index=True)
     timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    # SHA-256 of the uploaded bytes and the model that produced the result (prediction cache key)
+    image_hash = Column(String(64), nullable=True, index=True)
+    model_version = Column(String, nullable=True)
+
+    # History listings (see migrations.py, which adds these to existing databases)
+    __table_args__ = (
+        Index("ix_predictions_user_timestamp_id", user_id, timestamp.desc(), id.desc()),
+        Index("ix_predictions_timestamp_id", timestamp.desc(), id.desc()),
+    )
 
 
 class User(Base):
@@ -24,3 +40,12 @@ class User(Base):
     role = Column(String, nullable=False, default="user")
 
 
+
+
+class HistoryVersion(Base):
+    """Changes whenever a prediction list changes; drives the ETag of GET /history."""
+    __tablename__ = "history_versions"
+
+    # The user's id, or 0 for predictions stored without a user
+    scope = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(BigInteger, nullable=False)
@@ -0,0 +1,94 @@
+"""
+Argon2 password hashing off the request path.
+
+Hashing and verification run on a dedicated BoundedExecutor (processes by
+default), so a burst of logins waits for PASSWORD_WORKERS slots instead of
+taking every threadpool thread and starving /predict, and is rejected once
+PASSWORD_QUEUE_LIMIT more are waiting. Cost parameters come from ARGON2_*;
+hashes made with other parameters verify as before and are replaced on the
+next successful login.
+"""
+import os
+from functools import lru_cache
+from typing import Optional
+
+from passlib.context import CryptContext
+from passlib.hash import argon2
+
+from .executor import BoundedExecutor
+
+ARGON2_TIME_COST = int(os.environ.get("ARGON2_TIME_COST", str(argon2.default_rounds)))
+ARGON2_MEMORY_COST = int(os.environ.get("ARGON2_MEMORY_COST", str(argon2.memory_cost)))  # KiB
+ARGON2_PARALLELISM = int(os.environ.get("ARGON2_PARALLELISM", str(argon2.parallelism)))
+ARGON2_PARAMS = (ARGON2_TIME_COST, ARGON2_MEMORY_COST, ARGON2_PARALLELISM)
+
+# process: hashing runs in worker processes (no GIL contention with the API);
+# thread: a dedicated thread pool (argon2-cffi releases the GIL while hashing)
+PASSWORD_EXECUTOR = os.environ.get("PASSWORD_EXECUTOR", "process").lower()
+if PASSWORD_EXECUTOR not in ("process", "thread"):
+    print(f"⚠️  Unknown PASSWORD_EXECUTOR={PASSWORD_EXECUTOR!r}; using process")
+    PASSWORD_EXECUTOR = "process"
+PASSWORD_WORKERS = int(os.environ.get("PASSWORD_WORKERS", "2"))
+PASSWORD_QUEUE_LIMIT = int(os.environ.get("PASSWORD_QUEUE_LIMIT", "64"))
+
+_EXECUTOR: Optional[BoundedExecutor] = None
+
+
+@lru_cache(maxsize=8)
+def password_context(params: tuple = ARGON2_PARAMS) -> CryptContext:
+    time_cost, memory_cost, parallelism = params
+    return CryptContext(
+        schemes=["argon2"],
+        deprecated="auto",
+        argon2__rounds=time_cost,
+        argon2__memory_cost=memory_cost,
+        argon2__parallelism=parallelism,
+    )
+
+
+# Module-level so they can be sent to worker processes
+def hash_password_sync(password: str, params: tuple = ARGON2_PARAMS) -> str:
+    return password_context(params).hash(password)
+
+
+def verify_and_update_sync(password: str, hashed: str, params: tuple = ARGON2_PARAMS) -> tuple[bool, Optional[str]]:
+    """(matches, new hash if the stored one uses outdated parameters else None)."""
+    return password_context(params).verify_and_update(password, hashed)
+
+
+def get_password_executor() -> BoundedExecutor:
+    """Return the process-wide password hashing pool, creating it on first use."""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = BoundedExecutor(
+            max_workers=PASSWORD_WORKERS,
+            max_queue=PASSWORD_QUEUE_LIMIT,
+            name="password",
+            processes=PASSWORD_EXECUTOR == "process",
+        )
+    return _EXECUTOR
+
+
+async def hash_password(password: str) -> str:
+    """Hash on the password pool; raises QueueFullError when it is saturated."""
+    executor = get_password_executor()
+    with executor.admit():
+        return await executor.run(hash_password_sync, password, ARGON2_PARAMS)
+
+
+async def verify_and_update(password: str, hashed: str) -> tuple[bool, Optional[str]]:
+    """Verify on the password pool; raises QueueFullError when it is saturated."""
+    executor = get_password_executor()
+    with executor.admit():
+        return await executor.run(verify_and_update_sync, password, hashed, ARGON2_PARAMS)
+
+
+def password_stats() -> dict:
+    stats = {
+        "executor": PASSWORD_EXECUTOR,
+        "argon2": {"time_cost": ARGON2_TIME_COST, "memory_cost": ARGON2_MEMORY_COST,
+                   "parallelism": ARGON2_PARALLELISM},
+    }
+    if _EXECUTOR is not None:
+        stats.update(_EXECUTOR.stats())
+    return stats
@@ -0,0 +1,63 @@
+import threading
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    In-process LRU cache of prediction results.
+
+    Keys are ``(model_version, image_sha256)`` so a new checkpoint never serves
+    results computed by an older one. Values are plain dicts with the fields
+    needed to recreate a prediction row (class, confidence, image and heatmap
+    URLs).
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max(0, max_entries)
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value: dict):
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def record(self, outcome: str):
+        """Count a lookup outcome: 'memory', 'db' or 'miss'."""
+        with self._lock:
+            if outcome == "memory":
+                self.memory_hits += 1
+            elif outcome == "db":
+                self.db_hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": ((self.memory_hits + self.db_hits) / lookups) if lookups else 0.0,
+            }
@@ -1,18 +1,18 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
-from jose import jwt, JWTError
-from passlib.context import CryptContext
 from ..schemas import UserCreate, Token, TokenData, UserOut
-from ..database import get_db
-from .. import models
-import os, datetime as dt
+from ..crud import count_users, create_user, get_user_by_email, update_password_hash
+from ..database import get_db, run_db
+from ..executor import QueueFullError
+from .. import passwords
+from ..security import create_access_token
+import os
 
 
 router = APIRouter()
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
-ALGO = "HS256"
-SECRET = os.environ.get("JWT_SECRET", "devsecret")
+pwd_context = passwords.password_context()
+PASSWORD_RETRY_AFTER = int(os.environ.get("PASSWORD_RETRY_AFTER", "1"))
 
 
 def get_password_hash(password: str) -> str:
@@ -23,60 +23,59 @@ def verify_password(password: str, hashed: str) -> bool:
     return pwd_context.verify(password, hashed)
 
 
-def create_access_token(sub: str, role: str, expires_minutes: int = 60) -> str:
-    now = dt.datetime.now(dt.timezone.utc)
-    payload = {
-        "sub": sub,
-        "role": role,
-        "exp": now + dt.timedelta(minutes=expires_minutes),
-        "iat": now,
-    }
-    return jwt.encode(payload, SECRET, algorithm=ALGO)
+def password_pool_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Too many sign-in requests, please retry shortly",
+        headers={"Retry-After": str(PASSWORD_RETRY_AFTER)},
+    )
 
 
 @router.post("/signup", response_model=UserOut)
-def signup(body: UserCreate, db: Session = Depends(get_db)):
+async def signup(body: UserCreate, db: Session = Depends(get_db)):
     try:
         # Check if email already exists
-        existing = db.query(models.User).filter(models.User.email == body.email).first()
+        existing = await run_db(db, get_user_by_email, body.email)
         if existing:
             raise HTTPException(status_code=400, detail="Email already registered")
         
         # Determine role (first user becomes admin)
-        first_user = db.query(models.User).count() == 0
+        first_user = await run_db(db, count_users) == 0
         role = "admin" if first_user else "user"
         
-        # Hash password
+        # Hash password on the bounded password pool
         try:
-            hashed_password = get_password_hash(body.password)
+            hashed_password = await passwords.hash_password(body.password)
+        except QueueFullError:
+            raise password_pool_busy()
         except ValueError:
             # Argon2 may reject extremely large inputs; surface a clear error
             raise HTTPException(status_code=400, detail="Password is too large to hash. Please use a shorter password.")
         
         # Create user
-        user = models.User(
-            email=body.email, 
-            hashed_password=hashed_password, 
-            role=role
-        )
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-        
-        return user
+        return await run_db(db, create_user, body.email, hashed_password, role)
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await run_db(db, Session.rollback)
         print(f"Signup error: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to create account: {str(e)}")
 
 
 @router.post("/login", response_model=Token)
-def login(body: UserCreate, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == body.email).first()
-    if not user or not verify_password(body.password, user.hashed_password):
+async def login(body: UserCreate, db: Session = Depends(get_db)):
+    user = await run_db(db, get_user_by_email, body.email)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    try:
+        valid, new_hash = await passwords.verify_and_update(body.password, user.hashed_password)
+    except QueueFullError:
+        raise password_pool_busy()
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # Stored hash used older ARGON2_* parameters
+        await run_db(db, update_password_hash, user.id, new_hash)
     return Token(access_token=create_access_token(str(user.id), user.role))
 
 
@@ -1,85 +1,165 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Response
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session, sessionmaker
 from typing import List
-from ..database import get_db
-from ..schemas import PredictionOut
+from datetime import datetime
+import hashlib
+from ..database import get_db, run_db, sync_bind
+from ..schemas import BulkDeleteRequest, HistoryStats, PredictionOut
 from .. import models
-from ..crud import list_predictions_for_user, delete_prediction
-from jose import jwt, JWTError
-from fastapi import Header
+from ..crud import (InvalidCursor, count_predictions, delete_predictions, history_version,
+                    list_predictions_page, prediction_stats)
+from .predict import get_static_dir, remove_unreferenced_files
 from ..database import SessionLocal
 from .. import models
+from ..response_cache import ResponseCache
+from ..security import Principal, get_current_user_id, get_principal, require_admin
 import os
 
 
-ALGO = "HS256"
-SECRET = os.environ.get("JWT_SECRET", "devsecret")
+router = APIRouter()
 
 
-def get_current_user_id(authorization: str | None = Header(default=None)) -> int:
-    if not authorization or not authorization.lower().startswith("bearer "):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    token = authorization.split(" ", 1)[1]
-    try:
-        payload = jwt.decode(token, SECRET, algorithms=[ALGO])
-        user_id = int(payload.get("sub"))
-    except (JWTError, ValueError, TypeError):
-        raise HTTPException(status_code=401, detail="Invalid token")
-    return user_id
+HISTORY_PAGE_SIZE = int(os.environ.get("HISTORY_PAGE_SIZE", "50"))
+HISTORY_MAX_PAGE_SIZE = int(os.environ.get("HISTORY_MAX_PAGE_SIZE", "500"))
+# Serialized GET /history responses per worker, keyed by user, list version and query (0 disables)
+HISTORY_CACHE_SIZE = int(os.environ.get("HISTORY_CACHE_SIZE", "256"))
+HISTORY_CACHE_MAX_BYTES = int(os.environ.get("HISTORY_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
 
+HISTORY_CACHE = ResponseCache(HISTORY_CACHE_SIZE, HISTORY_CACHE_MAX_BYTES)
+_PAGE_ADAPTER = TypeAdapter(List[PredictionOut])
+# Clients may keep the list but must revalidate it (If-None-Match) on every use
+_CACHE_HEADERS = {"Cache-Control": "private, no-cache", "Vary": "Authorization"}
 
-def is_admin(authorization: str | None = Header(default=None)) -> bool:
-    if not authorization or not authorization.lower().startswith("bearer "):
-        return False
-    token = authorization.split(" ", 1)[1]
-    try:
-        payload = jwt.decode(token, SECRET, algorithms=[ALGO])
-        return payload.get("role") == "admin"
-    except Exception:
-        return False
 
+def _page_body(rows) -> bytes:
+    # Validate first: dumping ORM objects directly skips expired or unloaded attributes
+    return _PAGE_ADAPTER.dump_json(_PAGE_ADAPTER.validate_python(rows, from_attributes=True))
 
-router = APIRouter()
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
 
 
 @router.get("/", response_model=List[PredictionOut])
-def get_history(
+async def get_history(
     db: Session = Depends(get_db),
-    authorization: str = Header(default=None),
-    all: bool = Query(False, alias="all")
+    principal: Principal | None = Depends(get_principal),
+    all: bool = Query(False, alias="all"),
+    limit: int | None = Query(None, ge=1),
+    cursor: str | None = Query(None),
+    predicted_class: str | None = Query(None),
+    date_from: datetime | None = Query(None),
+    date_to: datetime | None = Query(None),
+    min_confidence: float | None = Query(None, ge=0.0, le=1.0),
+    include_total: bool = Query(False),
+    if_none_match: str | None = Header(default=None),
 ):
-    """Get prediction history. Requires authentication. Use ?all=true for admin to see all predictions."""
-    admin = is_admin(authorization)
+    """
+    Get prediction history, newest first. Requires authentication. Use ?all=true for admin to see all predictions.
+
+    Results are paginated: pass the X-Next-Cursor response header back as
+    ?cursor= to get the next page (the header is absent on the last page).
+    Filters: predicted_class, date_from (inclusive), date_to (exclusive),
+    min_confidence. ?include_total=true adds an X-Total-Count header with the
+    number of matching predictions (a COUNT query, so it is off by default).
+
+    Responses carry an ETag derived from the caller's history version, which
+    changes whenever one of their predictions is created, updated or deleted.
+    A request with a matching If-None-Match gets 304 without any row query.
+    """
+    # The token is verified once by get_principal (and cached across requests)
+    admin = principal is not None and principal.is_admin
     if all and not admin:
         raise HTTPException(status_code=403, detail="Admin required to view all predictions")
+    if principal is None:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    user_id = principal.user_id
     
-    try:
-        user_id = get_current_user_id(authorization)
-    except HTTPException:
-        # Allow viewing all without auth if admin query param is used (for demo)
-        if not all:
-            raise HTTPException(status_code=401, detail="Authentication required")
-        user_id = None
-    
-    if all and admin:
-        # Admin can view all
-        return db.query(models.Prediction).order_by(models.Prediction.timestamp.desc()).all()
-    elif user_id:
-        return list_predictions_for_user(db, user_id)
-    else:
-        # Fallback: return all if no auth (for development/demo)
-        return db.query(models.Prediction).order_by(models.Prediction.timestamp.desc()).all()
+    filters = {
+        "predicted_class": predicted_class,
+        "date_from": date_from,
+        "date_to": date_to,
+        "min_confidence": min_confidence,
+    }
+    if not (all and admin):
+        filters["user_id"] = user_id
+    # Otherwise admin: all predictions
+
+    page_size = min(limit or HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE)
+
+    # Version first: rows read afterwards are at least as new as the ETag says
+    scope = filters.get("user_id")
+    version = await run_db(db, history_version, scope)
+    query = repr((page_size, cursor, predicted_class, date_from, date_to, min_confidence, include_total))
+    etag = f'"h{"all" if scope is None else scope}.{version}.{hashlib.sha256(query.encode()).hexdigest()[:16]}"'
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, **_CACHE_HEADERS})
+
+    cache_key = (scope, version, query)
+    cached = HISTORY_CACHE.get(cache_key)
+    if cached is None:
+        try:
+            rows, next_cursor = await run_db(db, list_predictions_page, page_size, cursor=cursor, **filters)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        headers = {"ETag": etag, **_CACHE_HEADERS}
+        if next_cursor is not None:
+            headers["X-Next-Cursor"] = next_cursor
+        if include_total:
+            headers["X-Total-Count"] = str(await run_db(db, count_predictions, **filters))
+        cached = (_page_body(rows), headers)
+        HISTORY_CACHE.put(cache_key, *cached)
+    body, headers = cached
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/stats", response_model=HistoryStats)
+async def get_history_stats(
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(require_admin),
+    weeks: int = Query(8, ge=1, le=52),
+):
+    """
+    Admin dashboard figures over all predictions: total, mean confidence,
+    counts per class and per week for the last ``weeks`` weeks. Aggregated in
+    the database, so the dashboard needs only this and one history page.
+    """
+    return await run_db(db, prediction_stats, weeks)
+
+
+async def _delete_for_user(db: Session, pred_ids, user_id: int, background_tasks: BackgroundTasks) -> list[int]:
+    # Ownership is part of the DELETE itself; files go once the response is sent
+    rows = await run_db(db, delete_predictions, pred_ids, user_id=user_id)
+    urls = list(dict.fromkeys(
+        url for row in rows for url in (row.image_url, row.heatmap_url, row.thumbnail_url) if url
+    ))
+    if urls:
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=sync_bind(db))
+        background_tasks.add_task(remove_unreferenced_files, session_factory, get_static_dir(), urls)
+    return [row.id for row in rows]
 
 
 @router.delete("/{pred_id}")
-def remove_record(pred_id: int, db: Session = Depends(get_db), user_id: int = Depends(get_current_user_id)):
-    # Basic authorization: ensure record belongs to user
-    recs = list_predictions_for_user(db, user_id)
-    if not any(r.id == pred_id for r in recs):
-        raise HTTPException(status_code=404, detail="Record not found")
-    ok = delete_prediction(db, pred_id)
-    if not ok:
+async def remove_record(pred_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db),
+                        user_id: int = Depends(get_current_user_id)):
+    if not await _delete_for_user(db, [pred_id], user_id, background_tasks):
         raise HTTPException(status_code=404, detail="Record not found")
     return {"status": "deleted"}
 
 
+@router.post("/bulk-delete")
+async def remove_records(body: BulkDeleteRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db),
+                         user_id: int = Depends(get_current_user_id)):
+    """
+    Delete several of the caller's predictions. Ids that do not exist or
+    belong to another user are skipped; the response lists the ids deleted.
+    """
+    if len(body.ids) > HISTORY_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {HISTORY_MAX_PAGE_SIZE} ids per request")
+    deleted = await _delete_for_user(db, set(body.ids), user_id, background_tasks)
+    return {"status": "deleted", "deleted": sorted(deleted)}
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends
+from . import history, predict
+from .. import database, passwords, security
+
+
+# Process internals (pid, socket path, errors, pool and cache state): admins only
+router = APIRouter(dependencies=[Depends(security.require_admin)])
+
+
+@router.get("/inference")
+def inference_metrics():
+    """Micro-batching and model metrics for this worker process."""
+    return predict.inference_stats()
+
+
+@router.get("/db")
+def db_metrics():
+    """Connection pool usage and checkout wait times for this worker process."""
+    return database.pool_stats()
+
+
+@router.get("/auth")
+def auth_metrics():
+    """Password hashing pool, argon2 parameters and verified-token cache for this worker process."""
+    return {**passwords.password_stats(), "token_cache": security.TOKEN_CACHE.stats()}
+
+
+@router.get("/history")
+def history_metrics():
+    """Serialized GET /history response cache for this worker process."""
+    return history.HISTORY_CACHE.stats()
@@ -1,8 +1,14 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Header
-from sqlalchemy.orm import Session
-from ..database import get_db
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse
+from sqlalchemy.orm import Session, sessionmaker
+from ..database import get_db, run_db, sync_bind
+from ..executor import BoundedExecutor, QueueFullError
 from ..schemas import PredictionCreate, PredictionOut
-from ..crud import create_prediction
+from ..crud import (claim_stale_heatmap, create_prediction, get_prediction, update_heatmap, find_prediction_by_hash,
+                    referenced_urls)
+from ..prediction_cache import PredictionCache
+from ..security import Principal, get_principal
 from .. import models
 import sys
 from pathlib import Path
@@ -16,13 +22,19 @@ if str(ROOT_DIR) not in sys.path:
 # Try to import from model package - allow graceful degradation
 MODEL_PACKAGE_AVAILABLE = False
 save_heatmap_overlay = None
+classify_and_explain = None
+thumbnail_path = None
 load_local_model = None
+optimize_model = None
+quantize_model = None
 get_preprocessing_transform = None
+MicroBatcher = None
 CLASS_NAMES = ["Melanoma", "Melanocytic_Nevus", "Basal_Cell_Carcinoma", "Actinic_Keratosis", "Benign_Keratosis", "Dermatofibroma", "Vascular_Lesion"]
 
 try:
-    from model.grad_cam import save_heatmap_overlay
-    from model.model_loader import load_local_model, get_preprocessing_transform, CLASS_NAMES
+    from model.grad_cam import save_heatmap_overlay, classify_and_explain, thumbnail_path
+    from model.model_loader import load_local_model, optimize_model, quantize_model, get_preprocessing_transform, process_memory_mb, CLASS_NAMES
+    from model.batching import MicroBatcher
     MODEL_PACKAGE_AVAILABLE = True
 except ImportError as e:
     # If import fails, try adding model directory directly
@@ -30,21 +42,24 @@ except ImportError as e:
     if str(model_dir) not in sys.path:
         sys.path.insert(0, str(model_dir))
     try:
-        from grad_cam import save_heatmap_overlay
-        from model_loader import load_local_model, get_preprocessing_transform, CLASS_NAMES
+        from grad_cam import save_heatmap_overlay, classify_and_explain, thumbnail_path
+        from model_loader import load_local_model, optimize_model, quantize_model, get_preprocessing_transform, process_memory_mb, CLASS_NAMES
+        from batching import MicroBatcher
         MODEL_PACKAGE_AVAILABLE = True
     except ImportError:
         # Model package not available - app will use fallback predictions
         print(f"⚠️  Warning: Model package not available. Using fallback predictions. Error: {e}")
         MODEL_PACKAGE_AVAILABLE = False
         # Define fallback functions
-        def save_heatmap_overlay(orig_path: str, out_dir: str, model=None, preprocessed_img=None) -> str:
-            """Fallback heatmap generation when model package is unavailable."""
+        def save_heatmap_overlay(orig_path: str, out_dir: str, model=None, preprocessed_img=None, heatmap=None,
+                                 image=None, **output_options) -> str:
+            """Fallback heatmap generation when model package is unavailable (output options are ignored)."""
             import os
             from PIL import Image
             os.makedirs(out_dir, exist_ok=True)
             # Create a simple center-focused gradient as fallback
-            image = Image.open(orig_path).convert("RGB")
+            if image is None:
+                image = Image.open(orig_path).convert("RGB")
             orig_size = image.size
             w, h = orig_size
             import numpy as np
@@ -73,6 +88,16 @@ except ImportError as e:
             """Fallback model loader - returns None when model package unavailable."""
             return None
         
+        def optimize_model(model, *args, **kwargs):
+            """Fallback optimizer - returns the model unchanged."""
+            return model
+        
+        quantize_model = optimize_model
+        
+        def process_memory_mb():
+            """Fallback memory report - unavailable without the model package."""
+            return {}
+        
         def get_preprocessing_transform():
             """Fallback preprocessing - returns identity transform."""
             try:
@@ -85,6 +110,31 @@ except ImportError as e:
                 # If torchvision not available, return None (will use numpy fallback)
                 return None
 
+try:
+    # Standard-library only, usable even when torch is not installed
+    from model.inference_client import InferenceClient, InferenceError
+except ImportError:
+    InferenceClient = None
+    InferenceError = OSError
+
+try:
+    # numpy + Pillow only: JPEG draft decode and fused resize/normalize
+    from model.preprocessing import (INPUT_SIZE, decode_and_preprocess, decode_image, image_to_nchw,
+                                     preprocess, preprocess_unit_nhwc, preprocessing_stats)
+except ImportError:
+    preprocess = None
+    decode_and_preprocess = None
+    decode_image = None
+
+try:
+    # numpy + onnxruntime only, so INFERENCE_BACKEND=onnx can classify without torch
+    from model.onnx_backend import OnnxClassifier, load_onnx_model, to_nchw
+    if MicroBatcher is None:
+        from model.batching import MicroBatcher
+except ImportError:
+    OnnxClassifier = None
+    load_onnx_model = None
+
 try:
     import torch
     import torch.nn.functional as F
@@ -95,27 +145,135 @@ except ImportError:
     torch = None
 
 import numpy as np
+import asyncio
+import hashlib
 import io
+import tempfile
 import os
-from jose import jwt, JWTError
+import shutil
+import threading
+import time
 
 
 router = APIRouter()
 
 MODEL = None
-ALGO = "HS256"
-SECRET = os.environ.get("JWT_SECRET", "devsecret")
 MODEL_DIR = ROOT_DIR / "model"
 DEFAULT_MODEL_PATH = os.environ.get("MODEL_PATH", str(MODEL_DIR / "efficientnet_b0_best.pth"))
 DEVICE = "cuda" if (TORCH_AVAILABLE and torch.cuda.is_available()) else "cpu"
 
+# Micro-batching: concurrent /predict calls are grouped for up to
+# BATCH_MAX_WAIT_MS, or until BATCH_MAX_SIZE images are queued.
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "5"))
+BATCHER = None
+_batcher_lock = threading.Lock()
+_model_lock = threading.Lock()
+
+# Classification backend: "torch" (default) or "onnx" (onnxruntime on CPU, see
+# `python -m model.onnx_backend` for the export). Grad-CAM heatmaps always use
+# the torch checkpoint, loaded separately when the backend is onnx.
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "torch").lower()
+ONNX_MODEL_PATH = os.environ.get("ONNX_MODEL_PATH", str(Path(DEFAULT_MODEL_PATH).with_suffix(".onnx")))
+ORT_INTRA_OP_THREADS = int(os.environ.get("ORT_INTRA_OP_THREADS", "0"))
+ORT_INTER_OP_THREADS = int(os.environ.get("ORT_INTER_OP_THREADS", "0"))
+ORT_GRAPH_OPTIMIZATION = os.environ.get("ORT_GRAPH_OPTIMIZATION", "all").lower()
+EXPLAIN_MODEL = None
+
+# Classify-only passes can use an optimized variant of the model
+# (MODEL_OPTIMIZE=trace|freeze|compile) or, on CPU, an INT8 one
+# (MODEL_QUANTIZE=dynamic|static, takes precedence); Grad-CAM always uses the
+# float MODEL.
+MODEL_OPTIMIZE = os.environ.get("MODEL_OPTIMIZE", "none").lower()
+MODEL_QUANTIZE = os.environ.get("MODEL_QUANTIZE", "none").lower()
+CLASSIFIER = None
+_classifier_source = None
+
+# Startup warm-up: the model is loaded and run MODEL_WARMUP_RUNS times (forward
+# and Grad-CAM) before /health/ready reports ready.
+MODEL_WARMUP_RUNS = int(os.environ.get("MODEL_WARMUP_RUNS", "2"))
+READINESS = {
+    "ready": False,
+    "model_loaded": False,
+    "load_ms": None,
+    "optimize_ms": None,
+    "model_variant": None,
+    "warmup_ms": None,
+    "warmup_runs": 0,
+    "error": None,
+    # Per-worker memory around model loading (see MODEL_MMAP for shared weights)
+    "memory_before_load": None,
+    "memory_after_load": None,
+    "memory_after_warmup": None,
+}
+_warmup_thread = None
+
+# Preprocessing, inference and Grad-CAM run on a bounded pool so the event
+# loop stays free; requests beyond INFERENCE_WORKERS + INFERENCE_QUEUE_LIMIT
+# get a 503 with Retry-After.
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "2"))
+INFERENCE_QUEUE_LIMIT = int(os.environ.get("INFERENCE_QUEUE_LIMIT", "32"))
+INFERENCE_RETRY_AFTER = int(os.environ.get("INFERENCE_RETRY_AFTER", "2"))
+EXECUTOR = None
+
+# Heatmap generation mode:
+#   sync      - heatmap is rendered before /predict returns (default)
+#   deferred  - /predict returns the classification, a background pool renders the heatmap
+#   on_demand - heatmap is only rendered when GET /predictions/{id}/heatmap is first called
+HEATMAP_MODE = os.environ.get("HEATMAP_MODE", "sync").lower()
+HEATMAP_WORKERS = int(os.environ.get("HEATMAP_WORKERS", "1"))
+# Jobs that may wait for a heatmap worker; beyond that GET /predictions/{id}/heatmap gets a 503
+HEATMAP_QUEUE_LIMIT = int(os.environ.get("HEATMAP_QUEUE_LIMIT", "64"))
+# Pending heatmaps queued longer ago than this (e.g. lost in a restart) are queued again when polled
+HEATMAP_STALE_SECONDS = float(os.environ.get("HEATMAP_STALE_SECONDS", "300"))
+HEATMAP_EXECUTOR = None
+_heatmap_jobs: set[int] = set()
+
+# Heatmap output: longer side capped at HEATMAP_MAX_DIM (0 = original size),
+# encoded as webp/jpeg/png ("original" keeps the upload's format) at
+# HEATMAP_QUALITY, plus a HEATMAP_THUMBNAIL_DIM thumbnail of the upload for the
+# history list (0 disables).
+HEATMAP_MAX_DIM = int(os.environ.get("HEATMAP_MAX_DIM", "2048"))
+HEATMAP_FORMAT = os.environ.get("HEATMAP_FORMAT", "webp").lower()
+if HEATMAP_FORMAT not in ("webp", "jpeg", "png", "original"):
+    print(f"⚠️  Unknown HEATMAP_FORMAT={HEATMAP_FORMAT!r}; using webp")
+    HEATMAP_FORMAT = "webp"
+HEATMAP_QUALITY = int(os.environ.get("HEATMAP_QUALITY", "80"))
+HEATMAP_THUMBNAIL_DIM = int(os.environ.get("HEATMAP_THUMBNAIL_DIM", "256"))
+
+# Out-of-process inference: when INFERENCE_SOCKET is set, API workers do not
+# load the model and send image bytes to `python -m model.inference_server`.
+INFERENCE_SOCKET = os.environ.get("INFERENCE_SOCKET")
+INFERENCE_TIMEOUT = float(os.environ.get("INFERENCE_TIMEOUT", "30"))
+INFERENCE_CLIENT = None
+_remote_model_version = None
+
+# Content-addressed prediction cache: results are keyed by the SHA-256 of the
+# uploaded bytes and the model version, so re-uploads skip the model entirely.
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "1024"))
+PREDICTION_CACHE_DB = os.environ.get("PREDICTION_CACHE_DB", "true").lower() in ("1", "true", "yes")
+PREDICTION_CACHE = PredictionCache(max_entries=PREDICTION_CACHE_SIZE)
+# Uploads are hashed in chunks from Starlette's spooled file and rejected with
+# 413 once they exceed MAX_UPLOAD_BYTES (main.py also stops reading the body there).
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Allowance for multipart boundaries and headers when checking Content-Length
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+ALLOWED_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff", ".webp"}
+
 
 def get_model():
-    """Load PyTorch model if available."""
+    """Load the classification model (PyTorch, or ONNX with INFERENCE_BACKEND=onnx) if available."""
     global MODEL
-    if not TORCH_AVAILABLE or not MODEL_PACKAGE_AVAILABLE:
+    if INFERENCE_BACKEND == "onnx" and not INFERENCE_SOCKET:
+        return _get_onnx_model()
+    if not TORCH_AVAILABLE or not MODEL_PACKAGE_AVAILABLE or INFERENCE_SOCKET:
         return None
-    if MODEL is None:
+    if MODEL is not None:
+        return MODEL
+    with _model_lock:
+        if MODEL is not None:
+            return MODEL
         model_path = Path(DEFAULT_MODEL_PATH)
         # Bug 2 Fix: Validate model path exists before attempting to load
         if not model_path.exists():
@@ -134,22 +292,85 @@ def get_model():
     return MODEL
 
 
-def preprocess_image(file_bytes: bytes):
+def _get_onnx_model():
+    global MODEL
+    if MODEL is None and load_onnx_model is not None:
+        with _model_lock:
+            if MODEL is None:
+                MODEL = load_onnx_model(
+                    ONNX_MODEL_PATH,
+                    intra_op_threads=ORT_INTRA_OP_THREADS,
+                    inter_op_threads=ORT_INTER_OP_THREADS,
+                    graph_optimization=ORT_GRAPH_OPTIMIZATION,
+                )
+    return MODEL
+
+
+def get_explain_model():
+    """Float PyTorch model for Grad-CAM: get_model(), or the checkpoint when INFERENCE_BACKEND=onnx."""
+    global EXPLAIN_MODEL
+    if INFERENCE_BACKEND != "onnx":
+        return get_model()
+    if not TORCH_AVAILABLE or not MODEL_PACKAGE_AVAILABLE or INFERENCE_SOCKET:
+        return None
+    if EXPLAIN_MODEL is None and Path(DEFAULT_MODEL_PATH).exists():
+        with _model_lock:
+            if EXPLAIN_MODEL is None:
+                EXPLAIN_MODEL = load_local_model(Path(DEFAULT_MODEL_PATH), device=DEVICE)
+    return EXPLAIN_MODEL
+
+
+def get_classifier():
+    """Model for classify-only forward passes: the MODEL_QUANTIZE / MODEL_OPTIMIZE variant of get_model()."""
+    global CLASSIFIER, _classifier_source
+    model = get_model()
+    if model is None or INFERENCE_BACKEND == "onnx":
+        return model
+    if _classifier_source is not model:
+        with _model_lock:
+            if _classifier_source is not model:
+                if MODEL_QUANTIZE != "none" and DEVICE == "cpu":
+                    CLASSIFIER = quantize_model(model, mode=MODEL_QUANTIZE, model_path=DEFAULT_MODEL_PATH)
+                else:
+                    CLASSIFIER = optimize_model(model, mode=MODEL_OPTIMIZE, model_path=DEFAULT_MODEL_PATH, device=DEVICE)
+                _classifier_source = model
+    return CLASSIFIER
+
+
+def _classifier_variant(model, classifier) -> str:
+    if INFERENCE_BACKEND == "onnx":
+        return "onnx"
+    if classifier is None or classifier is model:
+        return "eager"
+    if MODEL_QUANTIZE != "none" and DEVICE == "cpu":
+        return f"int8-{MODEL_QUANTIZE}"
+    return MODEL_OPTIMIZE
+
+
+def preprocess_image(file_bytes):
     """
-    Preprocess image for PyTorch model.
+    Preprocess image (upload bytes or a file path) for PyTorch model.
     Returns tensor in CHW format, normalized for EfficientNetB0.
     Falls back to numpy array if PyTorch is unavailable.
     """
     # Import PIL Image (available even without torch)
     from PIL import Image
     
+    if preprocess is not None:
+        if TORCH_AVAILABLE and MODEL_PACKAGE_AVAILABLE:
+            # Same values as get_preprocessing_transform(), without decoding full-size JPEGs
+            return torch.from_numpy(preprocess(file_bytes))
+        if OnnxClassifier is not None and INFERENCE_BACKEND == "onnx":
+            return preprocess(file_bytes)
+        return preprocess_unit_nhwc(file_bytes)
+
     if not TORCH_AVAILABLE or not MODEL_PACKAGE_AVAILABLE:
         # Fallback: return numpy array
-        image = Image.open(io.BytesIO(file_bytes)).convert("RGB").resize((224, 224))
+        image = Image.open(io.BytesIO(file_bytes) if isinstance(file_bytes, bytes) else file_bytes).convert("RGB").resize((224, 224))
         arr = np.array(image) / 255.0
         return np.expand_dims(arr, axis=0)
     
-    image = Image.open(io.BytesIO(file_bytes)).convert("RGB")
+    image = Image.open(io.BytesIO(file_bytes) if isinstance(file_bytes, bytes) else file_bytes).convert("RGB")
     transform = get_preprocessing_transform()
     
     # Check if transform is None (can happen if torchvision is unavailable)
@@ -162,121 +383,754 @@ def preprocess_image(file_bytes: bytes):
     return tensor.unsqueeze(0)  # Add batch dimension
 
 
-def predict_with_model(model, image_tensor) -> tuple[str, float]:
+def _to_model_input(image_tensor):
+    """Convert numpy fallback arrays (N, H, W, C in [0, 1]) to normalized NCHW tensors."""
+    if isinstance(image_tensor, np.ndarray):
+        image_tensor = torch.from_numpy(image_tensor).float()
+        if image_tensor.dim() == 4 and image_tensor.shape[-1] == 3:
+            image_tensor = image_tensor.permute(0, 3, 1, 2)
+        # Normalize for EfficientNet
+        mean = torch.tensor([0.485, 0.456, 0.406]).view(1, 3, 1, 1)
+        std = torch.tensor([0.229, 0.224, 0.225]).view(1, 3, 1, 1)
+        image_tensor = (image_tensor - mean) / std
+    return image_tensor
+
+
+def _stack_batch(tensors: list):
+    """Concatenate per-request inputs into one NCHW batch (numpy when torch is unavailable)."""
+    if not TORCH_AVAILABLE:
+        return np.concatenate([to_nchw(t) for t in tensors], axis=0)
+    return torch.cat([_to_model_input(t) for t in tensors], dim=0)
+
+
+def _decode_probabilities(probabilities) -> list[tuple[str, float]]:
+    """Map (N, num_classes) probabilities to (class_name, confidence) pairs."""
+    fallback_class = CLASS_NAMES[0] if CLASS_NAMES else "Melanoma"
+    results = []
+    for row in probabilities:
+        predicted_idx_val = int(row.argmax())
+        # Bug 3 Fix: Add bounds checking to prevent IndexError
+        if predicted_idx_val < 0 or predicted_idx_val >= len(CLASS_NAMES):
+            print(f"⚠️  Warning: Model predicted class index {predicted_idx_val} is out of range [0, {len(CLASS_NAMES)-1}]")
+            print(f"   Using fallback prediction. Model may have been trained with different number of classes.")
+            results.append((fallback_class, 0.92))
+        else:
+            results.append((CLASS_NAMES[predicted_idx_val], float(row[predicted_idx_val])))
+    return results
+
+
+def predict_batch_with_model(model, batch_tensor) -> list[tuple[str, float]]:
     """
-    Run prediction with PyTorch model.
-    
+    Run prediction for a batch of images in a single forward pass.
+
+    Args:
+        model: PyTorch model
+        batch_tensor: (N, 3, 224, 224) tensor or (N, 224, 224, 3) numpy array
+
     Returns:
-        (predicted_class_name, confidence_score)
+        List of (predicted_class_name, confidence_score), one per image
     """
+    if OnnxClassifier is not None and isinstance(model, OnnxClassifier):
+        return _decode_probabilities(model.predict_proba(batch_tensor))
+
     if not TORCH_AVAILABLE or model is None:
         # Bug 1 Fix: Use first class from CLASS_NAMES instead of hardcoded "Melanoma"
         fallback_class = CLASS_NAMES[0] if CLASS_NAMES else "Melanoma"
-        return fallback_class, 0.92  # Fallback prediction
-    
+        return [(fallback_class, 0.92)] * len(batch_tensor)
+
     model.eval()
     with torch.no_grad():
-        # Ensure tensor is on correct device
-        if isinstance(image_tensor, np.ndarray):
-            # Convert numpy to torch tensor
-            image_tensor = torch.from_numpy(image_tensor).float()
-            if image_tensor.dim() == 4 and image_tensor.shape[-1] == 3:
-                image_tensor = image_tensor.permute(0, 3, 1, 2)
-            # Normalize for EfficientNet
-            mean = torch.tensor([0.485, 0.456, 0.406]).view(1, 3, 1, 1)
-            std = torch.tensor([0.229, 0.224, 0.225]).view(1, 3, 1, 1)
-            image_tensor = (image_tensor - mean) / std
-        
-        outputs = model(image_tensor.to(DEVICE))
+        batch_tensor = _to_model_input(batch_tensor)
+        outputs = model(batch_tensor.to(DEVICE))
         probabilities = F.softmax(outputs, dim=1)
-        confidence, predicted_idx = torch.max(probabilities, 1)
-        
-        predicted_idx_val = predicted_idx.item()
-        # Bug 3 Fix: Add bounds checking to prevent IndexError
-        if predicted_idx_val < 0 or predicted_idx_val >= len(CLASS_NAMES):
-            print(f"⚠️  Warning: Model predicted class index {predicted_idx_val} is out of range [0, {len(CLASS_NAMES)-1}]")
-            print(f"   Using fallback prediction. Model may have been trained with different number of classes.")
-            fallback_class = CLASS_NAMES[0] if CLASS_NAMES else "Melanoma"
-            return fallback_class, 0.92
-        
-        predicted_class = CLASS_NAMES[predicted_idx_val]
-        confidence_score = confidence.item()
-        
-    return predicted_class, confidence_score
+    return _decode_probabilities(probabilities.cpu().numpy())
+
 
+def predict_with_model(model, image_tensor) -> tuple[str, float]:
+    """
+    Run prediction with PyTorch model.
+    
+    Returns:
+        (predicted_class_name, confidence_score)
+    """
+    return predict_batch_with_model(model, image_tensor)[0]
 
-def get_user_id_from_header(authorization: str | None = Header(default=None)) -> int | None:
-    if not authorization or not authorization.lower().startswith("bearer "):
+
+def _run_batch(tensors: list) -> list[tuple[str, float, np.ndarray | None]]:
+    """
+    Batch function for the micro-batcher: one (1, 3, 224, 224) tensor per request.
+
+    Classification and Grad-CAM share one forward pass; if Grad-CAM fails the
+    batch is still classified and the heatmap is left to the overlay fallback.
+    Outside the sync heatmap mode only the classification is computed. With
+    INFERENCE_BACKEND=onnx the ONNX model classifies first and the torch pass
+    explains the class it picked, so the heatmap always matches the reported
+    class (sync heatmaps still cost a torch forward and backward pass; the
+    deferred and on_demand modes keep /predict ONNX-only).
+    """
+    batch = _stack_batch(tensors)
+    explain_model = get_explain_model() if HEATMAP_MODE == "sync" else None
+    if explain_model is not None and classify_and_explain is not None:
+        try:
+            if INFERENCE_BACKEND == "onnx":
+                probabilities = get_classifier().predict_proba(batch)
+                _, heatmaps = classify_and_explain(explain_model, batch.to(DEVICE),
+                                                   class_idx=probabilities.argmax(axis=1).tolist())
+            else:
+                probabilities, heatmaps = classify_and_explain(explain_model, batch.to(DEVICE))
+            return [
+                (predicted, conf, heatmap)
+                for (predicted, conf), heatmap in zip(_decode_probabilities(probabilities), heatmaps)
+            ]
+        except Exception as e:
+            print(f"⚠️  Grad-CAM failed: {e}. Classifying without heatmap.")
+    return [(predicted, conf, None) for predicted, conf in predict_batch_with_model(get_classifier(), batch)]
+
+
+def get_batcher():
+    """Return the process-wide micro-batcher, creating it on first use."""
+    global BATCHER
+    if MicroBatcher is None or not (TORCH_AVAILABLE or OnnxClassifier is not None):
+        return None
+    if BATCHER is None:
+        with _batcher_lock:
+            if BATCHER is None:
+                BATCHER = MicroBatcher(
+                    _run_batch,
+                    max_batch_size=BATCH_MAX_SIZE,
+                    max_wait_ms=BATCH_MAX_WAIT_MS,
+                )
+    return BATCHER
+
+
+def get_inference_executor() -> BoundedExecutor:
+    """Return the process-wide inference executor, creating it on first use."""
+    global EXECUTOR
+    if EXECUTOR is None:
+        with _batcher_lock:
+            if EXECUTOR is None:
+                EXECUTOR = BoundedExecutor(
+                    max_workers=INFERENCE_WORKERS,
+                    max_queue=INFERENCE_QUEUE_LIMIT,
+                )
+    return EXECUTOR
+
+
+def get_inference_client():
+    """Client for the out-of-process inference server, or None when running in-process."""
+    global INFERENCE_CLIENT
+    if not INFERENCE_SOCKET or InferenceClient is None:
         return None
-    token = authorization.split(" ", 1)[1]
+    if INFERENCE_CLIENT is None or INFERENCE_CLIENT.socket_path != INFERENCE_SOCKET:
+        INFERENCE_CLIENT = InferenceClient(INFERENCE_SOCKET, timeout=INFERENCE_TIMEOUT)
+    return INFERENCE_CLIENT
+
+
+def _remote_predict(client, contents: bytes, explain: bool) -> tuple[str, float, np.ndarray | None]:
+    result = client.predict(contents, explain=explain)
+    heatmap = None
+    if result.heatmap is not None:
+        heatmap = np.frombuffer(result.heatmap, dtype=np.uint8).reshape(result.heatmap_shape).astype(np.float32) / 255.0
+    return result.predicted_class, result.confidence, heatmap
+
+
+def get_model_version() -> str:
+    """Identify the model that produced a result; part of the prediction cache key."""
+    global _remote_model_version
+    if os.environ.get("MODEL_VERSION"):
+        return os.environ["MODEL_VERSION"]
+    client = get_inference_client()
+    if client is not None:
+        if _remote_model_version is None:
+            try:
+                _remote_model_version = f"remote:{client.info()['model_version']}"
+            except InferenceError:
+                return "remote:unavailable"
+        return _remote_model_version
+    if MODEL is None:
+        return "fallback"
+    model_path = Path(ONNX_MODEL_PATH if INFERENCE_BACKEND == "onnx" else DEFAULT_MODEL_PATH)
+    try:
+        stat = model_path.stat()
+        return f"{model_path.name}:{stat.st_size}:{int(stat.st_mtime)}"
+    except OSError:
+        return "unknown"
+
+
+def get_heatmap_executor() -> BoundedExecutor:
+    """Return the background pool used for deferred / on-demand heatmaps."""
+    global HEATMAP_EXECUTOR
+    if HEATMAP_EXECUTOR is None:
+        with _batcher_lock:
+            if HEATMAP_EXECUTOR is None:
+                HEATMAP_EXECUTOR = BoundedExecutor(max_workers=HEATMAP_WORKERS, max_queue=HEATMAP_QUEUE_LIMIT,
+                                                   name="heatmap")
+    return HEATMAP_EXECUTOR
+
+
+def warm_up(runs: int | None = None) -> dict:
+    """
+    Load the model and run dummy forward and Grad-CAM passes so the first real
+    request does not pay for checkpoint loading and first-run kernel setup.
+
+    Records load and warm-up timings in READINESS and marks the worker ready.
+    """
+    runs = MODEL_WARMUP_RUNS if runs is None else runs
+    try:
+        READINESS["memory_before_load"] = process_memory_mb()
+        started = time.perf_counter()
+        model = get_model()
+        READINESS["load_ms"] = (time.perf_counter() - started) * 1000.0
+        READINESS["model_loaded"] = model is not None
+        started = time.perf_counter()
+        classifier = get_classifier()
+        READINESS["optimize_ms"] = (time.perf_counter() - started) * 1000.0
+        READINESS["model_variant"] = _classifier_variant(model, classifier)
+        READINESS["memory_after_load"] = process_memory_mb()
+        client = get_inference_client()
+        if client is not None:
+            try:
+                READINESS["inference_server"] = client.info()
+            except InferenceError as e:
+                READINESS["inference_server"] = {"error": str(e)}
+
+        started = time.perf_counter()
+        buf = io.BytesIO()
+        from PIL import Image
+        Image.new("RGB", (256, 256), (128, 128, 128)).save(buf, format="JPEG")
+        sample = preprocess_image(buf.getvalue())
+        completed = 0
+        if model is not None:
+            batch = _stack_batch([sample])
+            # Classify at the smallest and the largest micro-batch size: a compiled model
+            # recompiles for a new batch shape, which should not land on a request
+            batches = [_stack_batch([sample] * size) for size in sorted({1, BATCH_MAX_SIZE})]
+            explain_model = get_explain_model() if HEATMAP_MODE != "on_demand" else None
+            for _ in range(runs):
+                for classify_batch in batches:
+                    predict_batch_with_model(classifier, classify_batch)
+                if explain_model is not None and classify_and_explain is not None:
+                    classify_and_explain(explain_model, batch.to(DEVICE))
+                completed += 1
+        READINESS["warmup_ms"] = (time.perf_counter() - started) * 1000.0
+        READINESS["warmup_runs"] = completed
+        READINESS["memory_after_warmup"] = process_memory_mb()
+        READINESS["error"] = None
+    except Exception as e:
+        # A failed warm-up still leaves the fallback path serving requests
+        print(f"⚠️  Model warm-up failed: {e}")
+        READINESS["error"] = str(e)
+    READINESS["ready"] = True
+    print(f"✅ Warm-up finished: load {READINESS['load_ms'] or 0:.0f} ms, "
+          f"{READINESS['warmup_runs']} run(s) in {READINESS['warmup_ms'] or 0:.0f} ms")
+    return dict(READINESS)
+
+
+def start_warm_up() -> threading.Thread:
+    """Run warm_up() once per process on a background thread."""
+    global _warmup_thread
+    with _model_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=warm_up, name="model-warmup", daemon=True)
+            _warmup_thread.start()
+    return _warmup_thread
+
+
+def readiness() -> dict:
+    return dict(READINESS)
+
+
+def inference_stats() -> dict:
+    """Inference metrics exposed under /metrics/inference."""
+    batcher = BATCHER
+    executor = EXECUTOR
+    return {
+        "device": DEVICE,
+        "backend": INFERENCE_BACKEND,
+        "model_loaded": MODEL is not None,
+        "inference_socket": INFERENCE_SOCKET,
+        "warmup": readiness(),
+        "memory": process_memory_mb(),
+        "heatmap_mode": HEATMAP_MODE,
+        "pending_heatmaps": len(_heatmap_jobs),
+        "cache": PREDICTION_CACHE.stats(),
+        "preprocessing": preprocessing_stats() if preprocess is not None else None,
+        "batching": batcher.stats() if batcher is not None else None,
+        "executor": executor.stats() if executor is not None else None,
+        "heatmap_executor": HEATMAP_EXECUTOR.stats() if HEATMAP_EXECUTOR is not None else None,
+    }
+
+
+def upload_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File too large (limit {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)",
+    )
+
+
+def _hash_upload(upload, max_bytes: int) -> tuple[str, int]:
+    """
+    SHA-256 hex digest and size of an upload, read in fixed-size chunks
+    straight from Starlette's spooled file (no copy is made), so the file is
+    never held in memory as a whole. Raises 413 once it grows past max_bytes.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    upload.seek(0)
+    while True:
+        chunk = upload.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise upload_too_large()
+        digest.update(chunk)
+    return digest.hexdigest(), size
+
+
+def _store_upload(upload, image_path: str):
+    """
+    Write an upload to its content-addressed path unless it is already stored
+    (through a temp file and a rename, so readers never see a partial image).
+    """
+    if os.path.exists(image_path):
+        return
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(image_path), prefix=".upload-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            upload.seek(0)
+            shutil.copyfileobj(upload, out, UPLOAD_CHUNK_BYTES)
+        os.replace(tmp_path, image_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _decode_for_overlay(image_path: str):
+    """
+    Decode an upload once at the overlay size (JPEG draft mode, longer side
+    at least HEATMAP_MAX_DIM); returns (RGB image, model input) so
+    classification and the heatmap overlay share a single decode.
+    """
+    if decode_and_preprocess is None:
+        return None, preprocess_image(_read_file(image_path))
+    image, arr = decode_and_preprocess(image_path, max_dim=HEATMAP_MAX_DIM or None)
+    return image, torch.from_numpy(arr) if TORCH_AVAILABLE and MODEL_PACKAGE_AVAILABLE else arr
+
+
+def _upload_filename(image_hash: str, filename: str | None) -> str:
+    """Content-addressed name for an upload, keeping a known image extension."""
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext not in ALLOWED_IMAGE_EXTENSIONS:
+        ext = ".png"
+    return f"{image_hash}{ext}"
+
+
+def _static_file_exists(static_dir: str, url: str | None) -> bool:
+    return bool(url) and os.path.exists(os.path.join(static_dir, os.path.basename(url)))
+
+
+def remove_static_files(static_dir: str, urls):
+    """Delete the files behind /static/ URLs (used after history deletes; missing files are ignored)."""
+    for url in urls:
+        path = os.path.join(static_dir, os.path.basename(url))
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"⚠️  Could not remove {path}: {e}")
+
+
+def remove_unreferenced_files(session_factory, static_dir: str, urls):
+    """
+    Background task after history deletes: remove the files behind /static/
+    URLs that no prediction uses. References are checked here, right before
+    unlinking, so rows created since the delete (a cache hit on the same
+    image) keep their files.
+    """
+    db = session_factory()
     try:
-        payload = jwt.decode(token, SECRET, algorithms=[ALGO])
-        return int(payload.get("sub"))
-    except Exception:
+        in_use = referenced_urls(db, urls)
+    finally:
+        db.close()
+    remove_static_files(static_dir, [url for url in urls if url not in in_use])
+
+
+def lookup_cached_prediction(db: Session, image_hash: str, model_version: str, static_dir: str) -> dict | None:
+    """Look up a prior result in the in-process LRU, then (optionally) the database."""
+    key = (model_version, image_hash)
+    cached = PREDICTION_CACHE.get(key)
+    outcome = "memory"
+    if cached is None and PREDICTION_CACHE_DB:
+        row = find_prediction_by_hash(db, image_hash, model_version)
+        if row is not None:
+            cached = {
+                "image_url": row.image_url,
+                "predicted_class": row.predicted_class,
+                "confidence": row.confidence,
+                "heatmap_url": row.heatmap_url,
+                "thumbnail_url": row.thumbnail_url,
+            }
+            outcome = "db"
+    # Files may have been removed since the result was cached
+    if cached is not None and not (
+        _static_file_exists(static_dir, cached["image_url"]) and _static_file_exists(static_dir, cached["heatmap_url"])
+    ):
+        PREDICTION_CACHE.discard(key)
+        cached = None
+    if cached is None:
+        PREDICTION_CACHE.record("miss")
         return None
+    if cached.get("thumbnail_url") and not _static_file_exists(static_dir, cached["thumbnail_url"]):
+        cached = {**cached, "thumbnail_url": None}
+    PREDICTION_CACHE.record(outcome)
+    PREDICTION_CACHE.put(key, cached)
+    return cached
+
+
+def get_static_dir() -> str:
+    static_dir = os.environ.get("STATIC_DIR", os.path.join(os.path.dirname(__file__), "..", "static"))
+    os.makedirs(static_dir, exist_ok=True)
+    return static_dir
+
+
+def render_heatmap(image_path: str, static_dir: str, heatmap=None, image=None) -> tuple[str, str | None]:
+    """
+    Write the overlay (and the history thumbnail) with the HEATMAP_* output
+    settings; returns (heatmap_url, thumbnail_url or None).
+    """
+    fmt = None if HEATMAP_FORMAT == "original" else HEATMAP_FORMAT
+    heatmap_path = save_heatmap_overlay(
+        image_path, static_dir, heatmap=heatmap, image=image,
+        max_dim=HEATMAP_MAX_DIM or None, fmt=fmt, quality=HEATMAP_QUALITY,
+        thumbnail_dim=HEATMAP_THUMBNAIL_DIM or None,
+    )
+    thumbnail_url = None
+    if HEATMAP_THUMBNAIL_DIM and thumbnail_path is not None:
+        thumb = thumbnail_path(image_path, static_dir, fmt)
+        if os.path.exists(thumb):
+            thumbnail_url = f"/static/{os.path.basename(thumb)}"
+    return f"/static/{os.path.basename(heatmap_path)}", thumbnail_url
+
+
+def _compute_heatmap(image_path: str):
+    """
+    Grad-CAM heatmap for an image on disk, or None to use the overlay fallback.
+
+    Returns (heatmap, decoded RGB image or None); the image is reused for the overlay.
+    """
+    client = get_inference_client()
+    if client is not None:
+        return _remote_predict(client, _read_file(image_path), explain=True)[2], None
+    model = get_explain_model()
+    if model is None or classify_and_explain is None:
+        return None, None
+    image, image_tensor = _decode_for_overlay(image_path)
+    _, heatmaps = classify_and_explain(model, _to_model_input(image_tensor).to(DEVICE))
+    return heatmaps[0], image
+
+
+def _heatmap_job(session_factory, pred_id: int, image_path: str, static_dir: str):
+    """Background job: render the heatmap for a prediction and record the result."""
+    try:
+        try:
+            heatmap, image = _compute_heatmap(image_path)
+            heatmap_url, thumbnail_url = render_heatmap(image_path, static_dir, heatmap=heatmap, image=image)
+            status = "ready"
+        except Exception as e:
+            print(f"⚠️  Heatmap generation failed for prediction {pred_id}: {e}")
+            status, heatmap_url, thumbnail_url = "failed", None, None
+        db = session_factory()
+        try:
+            update_heatmap(db, pred_id, status, heatmap_url, thumbnail_url=thumbnail_url)
+        finally:
+            db.close()
+    finally:
+        _heatmap_jobs.discard(pred_id)
+
+
+def reprocess_heatmaps(db: Session, statuses=("failed", "pending", "not_requested"), batch_size: int = 16,
+                       limit: int | None = None, static_dir: str | None = None) -> dict:
+    """
+    Offline heatmap regeneration for stored predictions with the given
+    heatmap_status. Images go through Grad-CAM batch_size at a time (one
+    forward and one backward pass per batch), each explaining the class that
+    was recorded for it. Returns counts of ready / failed / skipped rows.
+    """
+    model = get_explain_model()
+    if model is None or classify_and_explain is None or decode_image is None:
+        raise RuntimeError("Grad-CAM needs the PyTorch model, which is not available in this process")
+    from PIL import Image
+
+    static_dir = static_dir or get_static_dir()
+    query = (
+        db.query(models.Prediction)
+        .filter(models.Prediction.heatmap_status.in_(list(statuses)))
+        .order_by(models.Prediction.id)
+    )
+    if limit:
+        query = query.limit(limit)
+    rows = query.all()
+    counts = {"ready": 0, "failed": 0, "skipped": 0}
+
+    for start in range(0, len(rows), batch_size):
+        batch = []
+        for row in rows[start:start + batch_size]:
+            image_path = os.path.join(static_dir, os.path.basename(row.image_url))
+            if row.predicted_class not in CLASS_NAMES or not os.path.exists(image_path):
+                counts["skipped"] += 1
+                continue
+            try:
+                image = decode_image(image_path, size=None, max_dim=HEATMAP_MAX_DIM or None)
+            except Exception as e:
+                print(f"⚠️  Could not decode {image_path}: {e}")
+                counts["skipped"] += 1
+                continue
+            if HEATMAP_MAX_DIM:
+                # Only the output size is kept in memory for the whole batch
+                image.thumbnail((HEATMAP_MAX_DIM, HEATMAP_MAX_DIM), Image.Resampling.BILINEAR, reducing_gap=2.0)
+            batch.append((row, image_path, image))
+        if not batch:
+            continue
+
+        inputs = np.empty((len(batch), 3, INPUT_SIZE[1], INPUT_SIZE[0]), dtype=np.float32)
+        for i, (_, _, image) in enumerate(batch):
+            image_to_nchw(image, out=inputs[i:i + 1])
+        inputs = torch.from_numpy(inputs)
+        targets = [CLASS_NAMES.index(row.predicted_class) for row, _, _ in batch]
+        try:
+            _, heatmaps = classify_and_explain(model, inputs.to(DEVICE), class_idx=targets)
+        except Exception as e:
+            print(f"⚠️  Grad-CAM failed for predictions {[row.id for row, _, _ in batch]}: {e}")
+            for row, _, _ in batch:
+                update_heatmap(db, row.id, "failed")
+            counts["failed"] += len(batch)
+            continue
+        for (row, image_path, image), heatmap in zip(batch, heatmaps):
+            try:
+                heatmap_url, thumbnail_url = render_heatmap(image_path, static_dir, heatmap=heatmap, image=image)
+                update_heatmap(db, row.id, "ready", heatmap_url, thumbnail_url=thumbnail_url)
+                counts["ready"] += 1
+            except Exception as e:
+                print(f"⚠️  Heatmap rendering failed for prediction {row.id}: {e}")
+                update_heatmap(db, row.id, "failed")
+                counts["failed"] += 1
+    return counts
+
+
+def schedule_heatmap(db: Session, pred_id: int, image_path: str, static_dir: str) -> bool:
+    """
+    Queue heatmap generation for a prediction; returns False if it is already
+    queued in this process. Raises QueueFullError when HEATMAP_WORKERS +
+    HEATMAP_QUEUE_LIMIT jobs are already in flight.
+    """
+    with _batcher_lock:
+        if pred_id in _heatmap_jobs:
+            return False
+        _heatmap_jobs.add(pred_id)
+    executor = get_heatmap_executor()
+    try:
+        executor.acquire()
+    except QueueFullError:
+        _heatmap_jobs.discard(pred_id)
+        raise
+    try:
+        # The job runs after this request's session is closed, so it opens its own
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=sync_bind(db))
+        future = executor.submit(_heatmap_job, session_factory, pred_id, image_path, static_dir)
+    except BaseException:
+        executor.release()
+        _heatmap_jobs.discard(pred_id)
+        raise
+    future.add_done_callback(lambda _: executor.release())
+    return True
+
+
+def heatmap_queue_full() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Heatmap queue is full, please retry shortly",
+        headers={"Retry-After": str(INFERENCE_RETRY_AFTER)},
+    )
 
 
 @router.post("/predict", response_model=PredictionOut)
 async def predict(
     file: UploadFile = File(...), 
     db: Session = Depends(get_db), 
-    user_id: int | None = Depends(get_user_id_from_header)
+    principal: Principal | None = Depends(get_principal)
 ):
-    contents = await file.read()
-    if not contents:
+    executor = get_inference_executor()
+    try:
+        executor.acquire()
+    except QueueFullError:
+        raise HTTPException(
+            status_code=503,
+            detail="Inference queue is full, please retry shortly",
+            headers={"Retry-After": str(INFERENCE_RETRY_AFTER)},
+        )
+    try:
+        # Anonymous uploads (no or invalid token) are stored without a user
+        return await _predict(file, db, principal.user_id if principal else None, executor)
+    finally:
+        executor.release()
+
+
+async def _predict(file: UploadFile, db: Session, user_id: int | None, executor: BoundedExecutor):
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise upload_too_large()
+    static_dir = get_static_dir()
+    # Starlette has already spooled the body (the size limit is enforced while it streams, see main.py)
+    image_hash, size = await run_in_threadpool(_hash_upload, file.file, MAX_UPLOAD_BYTES)
+    if size == 0:
         raise HTTPException(status_code=400, detail="Empty file")
+    return await _predict_spooled(file, image_hash, static_dir, db, user_id, executor)
 
-    # Save original image to static dir
-    static_dir = os.environ.get("STATIC_DIR", os.path.join(os.path.dirname(__file__), "..", "static"))
-    os.makedirs(static_dir, exist_ok=True)
-    image_path = os.path.join(static_dir, file.filename)
-    with open(image_path, "wb") as f:
-        f.write(contents)
 
-    model = get_model()
+async def _predict_spooled(file: UploadFile, image_hash: str, static_dir: str, db: Session,
+                           user_id: int | None, executor: BoundedExecutor):
+    model = await executor.run(get_model)
+    model_version = get_model_version()
+
+    cached = await run_db(db, lookup_cached_prediction, image_hash, model_version, static_dir)
+    if cached is not None:
+        data = PredictionCreate(
+            **cached,
+            heatmap_status="ready",
+            image_hash=image_hash,
+            model_version=model_version,
+        )
+        return await run_db(db, create_prediction, data, user_id=user_id)
+
+    # Keep the original image in the static dir under its content hash
+    image_path = os.path.join(static_dir, _upload_filename(image_hash, file.filename))
+    await run_in_threadpool(_store_upload, file.file, image_path)
+
     # Bug 1 Fix: Use first class from CLASS_NAMES instead of hardcoded "Melanoma"
     predicted = CLASS_NAMES[0] if CLASS_NAMES else "Melanoma"
     conf = 0.92
-    image_tensor = None
+    heatmap = None
+    image = None
+    cacheable = True
     
-    if model is not None and TORCH_AVAILABLE:
+    client = get_inference_client()
+    batcher = get_batcher()
+    if client is not None:
         try:
-            image_tensor = preprocess_image(contents)
-            predicted, conf = predict_with_model(model, image_tensor)
+            contents = await run_in_threadpool(_read_file, image_path)
+            predicted, conf, heatmap = await executor.run(_remote_predict, client, contents, HEATMAP_MODE == "sync")
+            print(f"✅ Prediction (inference server): {predicted} (confidence: {conf:.2%})")
+        except InferenceError as e:
+            print(f"⚠️  Inference server error: {e}. Using fallback.")
+            cacheable = False
+    elif model is not None and batcher is not None:
+        try:
+            if HEATMAP_MODE == "sync":
+                # One decode at the overlay size feeds both the model input and the overlay
+                image, image_tensor = await executor.run(_decode_for_overlay, image_path)
+            else:
+                image_tensor = await executor.run(preprocess_image, image_path)
+            predicted, conf, heatmap = await asyncio.wrap_future(batcher.submit(image_tensor))
             print(f"✅ Prediction: {predicted} (confidence: {conf:.2%})")
         except Exception as e:
             print(f"⚠️  Model prediction error: {e}. Using fallback.")
             # Bug 1 Fix: Use first class from CLASS_NAMES instead of hardcoded "Melanoma"
             predicted = CLASS_NAMES[0] if CLASS_NAMES else "Melanoma"
             conf = 0.92
+            cacheable = False
     else:
         print("⚠️  Model not available, using fallback prediction")
 
-    # Convert tensor to numpy for heatmap (if available)
-    preprocessed_np = None
-    if image_tensor is not None:
-        if isinstance(image_tensor, np.ndarray):
-            # Already a numpy array from fallback preprocessing
-            preprocessed_np = image_tensor
-        elif TORCH_AVAILABLE and hasattr(image_tensor, 'cpu'):
-            # PyTorch tensor - convert to numpy
-            # Convert CHW to HWC for heatmap visualization
-            img_np = image_tensor.squeeze(0).cpu().numpy()
-            # Denormalize for visualization
-            mean = np.array([0.485, 0.456, 0.406])
-            std = np.array([0.229, 0.224, 0.225])
-            img_np = img_np.transpose(1, 2, 0) * std + mean
-            img_np = np.clip(img_np, 0, 1)
-            preprocessed_np = np.expand_dims(img_np, axis=0)
-
-    heatmap_path = save_heatmap_overlay(image_path, static_dir, model=model, preprocessed_img=preprocessed_np)
+    if HEATMAP_MODE == "sync":
+        # Heatmap comes from the same forward pass as the prediction (or the fallback gradient)
+        heatmap_url, thumbnail_url = await executor.run(render_heatmap, image_path, static_dir, heatmap, image)
+        heatmap_status = "ready"
+    else:
+        heatmap_url = thumbnail_url = None
+        heatmap_status = "pending" if HEATMAP_MODE == "deferred" else "not_requested"
 
     data = PredictionCreate(
         image_url=f"/static/{os.path.basename(image_path)}",
         predicted_class=predicted,
         confidence=conf,
-        heatmap_url=f"/static/{os.path.basename(heatmap_path)}",
+        heatmap_url=heatmap_url,
+        heatmap_status=heatmap_status,
+        thumbnail_url=thumbnail_url,
+        image_hash=image_hash if cacheable else None,
+        model_version=model_version,
     )
-    pred = create_prediction(db, data, user_id=user_id)
+    # DB write is awaited (async session) or goes to the shared threadpool, not the inference pool
+    pred = await run_db(db, create_prediction, data, user_id=user_id)
+    if heatmap_status == "pending":
+        try:
+            schedule_heatmap(db, pred.id, image_path, static_dir)
+        except QueueFullError:
+            # Left for GET /predictions/{id}/heatmap to queue once the pool has room
+            await run_db(db, update_heatmap, pred.id, "not_requested")
+    elif heatmap_status == "ready" and cacheable:
+        PREDICTION_CACHE.put((model_version, image_hash), {
+            "image_url": data.image_url,
+            "predicted_class": predicted,
+            "confidence": conf,
+            "heatmap_url": heatmap_url,
+            "thumbnail_url": thumbnail_url,
+        })
     
     return pred
+
+
+async def _queue_heatmap(db: Session, pred, image_path: str, static_dir: str):
+    try:
+        schedule_heatmap(db, pred.id, image_path, static_dir)
+    except QueueFullError:
+        await run_db(db, update_heatmap, pred.id, "not_requested")
+        raise heatmap_queue_full()
+
+
+@router.get("/predictions/{pred_id}/heatmap")
+async def get_prediction_heatmap(pred_id: int, db: Session = Depends(get_db),
+                                 principal: Principal | None = Depends(get_principal)):
+    """
+    Serve the heatmap image once it is ready; otherwise report its status.
+    Only the prediction's owner (or an admin) may fetch it.
+
+    Returns 202 with {"id", "heatmap_status"} while the heatmap is pending. In
+    on_demand mode the first request queues the heatmap for generation, as
+    does a request for a heatmap that has been pending for more than
+    HEATMAP_STALE_SECONDS (its job was lost). 503 when the heatmap queue is full.
+    """
+    if principal is None:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    pred = await run_db(db, get_prediction, pred_id)
+    # Other users' predictions look the same as missing ones
+    if not pred or (pred.user_id != principal.user_id and not principal.is_admin):
+        raise HTTPException(status_code=404, detail="Prediction not found")
+
+    static_dir = get_static_dir()
+    if pred.heatmap_status == "ready" and pred.heatmap_url:
+        heatmap_path = os.path.join(static_dir, os.path.basename(pred.heatmap_url))
+        if os.path.exists(heatmap_path):
+            return FileResponse(heatmap_path)
+        raise HTTPException(status_code=404, detail="Heatmap file not found")
+
+    if pred.heatmap_status == "failed":
+        return JSONResponse(status_code=500, content={"id": pred.id, "heatmap_status": "failed"})
+
+    if pred.heatmap_status in ("not_requested", "pending") and pred.id not in _heatmap_jobs:
+        image_path = os.path.join(static_dir, os.path.basename(pred.image_url))
+        if not os.path.exists(image_path):
+            raise HTTPException(status_code=404, detail="Image file not found")
+        if pred.heatmap_status == "not_requested":
+            await run_db(db, update_heatmap, pred.id, "pending")
+            await _queue_heatmap(db, pred, image_path, static_dir)
+        elif await run_db(db, claim_stale_heatmap, pred.id, HEATMAP_STALE_SECONDS):
+            await _queue_heatmap(db, pred, image_path, static_dir)
+
+    return JSONResponse(status_code=202, content={"id": pred.id, "heatmap_status": "pending"})
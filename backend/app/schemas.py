@@ -1,13 +1,19 @@
 from pydantic import BaseModel, EmailStr, ConfigDict
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 
 class PredictionCreate(BaseModel):
+    model_config = ConfigDict(protected_namespaces=())
+
     image_url: str
     predicted_class: str
     confidence: float
     heatmap_url: Optional[str] = None
+    heatmap_status: str = "ready"
+    thumbnail_url: Optional[str] = None
+    image_hash: Optional[str] = None
+    model_version: Optional[str] = None
 
 
 class PredictionOut(BaseModel):
@@ -18,10 +24,24 @@ class PredictionOut(BaseModel):
     predicted_class: str
     confidence: float
     heatmap_url: Optional[str] = None
+    heatmap_status: str = "ready"
+    thumbnail_url: Optional[str] = None
     timestamp: datetime
     user_id: Optional[int] = None
 
 
+class HistoryStats(BaseModel):
+    total: int
+    avg_confidence: Optional[float] = None
+    by_class: Dict[str, int]
+    # Predictions per 7-day window, oldest first; the last window ends now
+    weekly: List[int]
+
+
+class BulkDeleteRequest(BaseModel):
+    ids: List[int]
+
+
 class UserCreate(BaseModel):  # optional
     email: EmailStr
     password: str
@@ -0,0 +1,163 @@
+"""
+Bearer token handling shared by the routers.
+
+``get_principal`` is the one auth dependency: it verifies the request's token
+once (FastAPI reuses a dependency's result within a request) and exposes the
+caller's ``user_id`` and ``role``. Verified claims are kept in a small LRU
+keyed by the token's SHA-256, so clients that send the same token on every
+request skip the HMAC check and JSON parsing; entries expire after
+AUTH_CACHE_TTL seconds or at the token's ``exp``, whichever comes first.
+"""
+import datetime as dt
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Depends, Header, HTTPException
+from jose import JWTError, jwt
+
+ALGO = "HS256"
+SECRET = os.environ.get("JWT_SECRET", "devsecret")
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "1024"))  # 0 disables
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", "300"))
+
+
+@dataclass(frozen=True)
+class Principal:
+    user_id: int
+    role: Optional[str] = None
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == "admin"
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+class TokenCache:
+    """LRU of verified tokens: SHA-256 of the token -> (Principal, monotonic deadline)."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Principal]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token: str, principal: Principal, exp: Optional[float] = None):
+        if self.max_entries == 0:
+            return
+        deadline = time.monotonic() + self.ttl
+        if exp is not None:
+            deadline = min(deadline, time.monotonic() + (exp - time.time()))
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (principal, deadline)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+TOKEN_CACHE = TokenCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+
+
+def create_access_token(sub: str, role: str, expires_minutes: int = 60) -> str:
+    now = dt.datetime.now(dt.timezone.utc)
+    payload = {
+        "sub": sub,
+        "role": role,
+        "exp": now + dt.timedelta(minutes=expires_minutes),
+        "iat": now,
+    }
+    return jwt.encode(payload, SECRET, algorithm=ALGO)
+
+
+def bearer_token(authorization: str | None) -> str | None:
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    return authorization.split(" ", 1)[1]
+
+
+def verify_token(token: str) -> Principal:
+    """Verified claims of a token (signature and exp), from the cache when possible."""
+    principal = TOKEN_CACHE.get(token)
+    if principal is not None:
+        return principal
+    try:
+        payload = jwt.decode(token, SECRET, algorithms=[ALGO])
+        principal = Principal(user_id=int(payload.get("sub")), role=payload.get("role"))
+    except (JWTError, ValueError, TypeError) as e:
+        raise InvalidToken(str(e)) from e
+    exp = payload.get("exp")
+    TOKEN_CACHE.put(token, principal, exp=float(exp) if isinstance(exp, (int, float)) else None)
+    return principal
+
+
+def get_principal(authorization: str | None = Header(default=None)) -> Principal | None:
+    """The authenticated caller, or None without a valid bearer token."""
+    token = bearer_token(authorization)
+    if token is None:
+        return None
+    try:
+        return verify_token(token)
+    except InvalidToken:
+        return None
+
+
+def get_current_user_id(authorization: str | None = Header(default=None),
+                        principal: Principal | None = Depends(get_principal)) -> int:
+    """Id of the authenticated caller; 401 without a valid bearer token."""
+    if principal is None:
+        detail = "Invalid token" if bearer_token(authorization) else "Not authenticated"
+        raise HTTPException(status_code=401, detail=detail)
+    return principal.user_id
+
+
+def require_admin(principal: Principal | None = Depends(get_principal)) -> Principal:
+    """The authenticated caller if they are an admin; 401 without a valid bearer token, 403 otherwise."""
+    if principal is None:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    if not principal.is_admin:
+        raise HTTPException(status_code=403, detail="Admin required")
+    return principal
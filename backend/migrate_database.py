@@ -10,6 +10,7 @@ import io
 from sqlalchemy import create_engine, text, inspect
 from app.database import DATABASE_URL, Base, engine
 from app.models import User, Prediction
+from app.migrations import apply_migrations
 
 # Fix Windows console encoding
 if sys.platform == 'win32':
@@ -87,6 +88,11 @@ def migrate_database():
     else:
         print("SUCCESS: Database is up to date. No migrations needed.")
     
+    # Versioned migrations (columns and indexes added since; also run at server startup)
+    applied = apply_migrations(engine)
+    if not applied:
+        print("SUCCESS: All versioned migrations already applied.")
+    
     # Verify schema
     print("\nCurrent schema:")
     inspector = inspect(engine)
@@ -0,0 +1,40 @@
+"""
+Reprocess Heatmaps Script
+Regenerates Grad-CAM heatmaps for stored predictions, N images per backward pass.
+
+Examples:
+    python reprocess_heatmaps.py                       # failed, pending and not_requested rows
+    python reprocess_heatmaps.py --status ready --batch-size 32   # re-render everything already done
+    python reprocess_heatmaps.py --status failed --limit 500
+
+Uses the same MODEL_PATH, STATIC_DIR and HEATMAP_* settings as the API.
+"""
+import argparse
+import time
+
+from app.database import DATABASE_URL, SessionLocal
+from app.routers import predict
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate heatmaps for stored predictions")
+    parser.add_argument("--status", nargs="+", default=["failed", "pending", "not_requested"],
+                        choices=["ready", "failed", "pending", "not_requested"])
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"Database: {DATABASE_URL}")
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        counts = predict.reprocess_heatmaps(db, statuses=args.status, batch_size=args.batch_size, limit=args.limit)
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+    print(f"✅ {counts['ready']} heatmaps regenerated, {counts['failed']} failed, "
+          f"{counts['skipped']} skipped (missing image or unknown class) in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
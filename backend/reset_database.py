@@ -30,7 +30,8 @@ def reset_database():
     print("✅ Database created successfully!")
     print("\n📋 Schema includes:")
     print("   - Users table: id, email, hashed_password, role")
-    print("   - Predictions table: id, image_url, predicted_class, confidence, heatmap_url, timestamp, user_id")
+    print("   - Predictions table: id, image_url, predicted_class, confidence, heatmap_url, heatmap_status, thumbnail_url, timestamp, user_id, image_hash, model_version")
+    print("   - History versions table: scope, version")
 
 if __name__ == "__main__":
     try:
@@ -1,14 +1,36 @@
+import io
 import os
 import tempfile
 import shutil
 import pytest
 from fastapi.testclient import TestClient
+from PIL import Image
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.main import app
 from app.database import Base, get_db
 
+try:
+    import torch
+except ImportError:  # model tests skip themselves through the tiny_model fixture
+    torch = None
+
+
+if torch is not None:
+    class TinyConvNet(torch.nn.Module):
+        """Two conv layers and a linear head: a classifier small enough for Grad-CAM tests (target layer conv2)."""
+
+        def __init__(self, num_classes: int = 7):
+            super().__init__()
+            self.conv1 = torch.nn.Conv2d(3, 4, 3, padding=1)
+            self.conv2 = torch.nn.Conv2d(4, 8, 3, padding=1)
+            self.fc = torch.nn.Linear(8, num_classes)
+
+        def forward(self, x):
+            x = torch.relu(self.conv2(torch.relu(self.conv1(x))))
+            return self.fc(x.mean(dim=(2, 3)))
+
 
 @pytest.fixture(scope="session")
 def test_engine():
@@ -66,3 +88,45 @@ def client(db_session):
             shutil.rmtree(temp_static_dir, ignore_errors=True)
 
 
+@pytest.fixture()
+def admin_headers():
+    """Authorization header with an admin bearer token (e.g. for /metrics/*)."""
+    from app.security import create_access_token
+
+    return {"Authorization": f"Bearer {create_access_token('1', 'admin')}"}
+
+
+@pytest.fixture()
+def image_bytes():
+    """Factory for solid-color PNG uploads; vary the color to get a distinct content hash."""
+
+    def make(width: int = 256, height: int = 256, color=(128, 128, 128)) -> bytes:
+        buf = io.BytesIO()
+        Image.new("RGB", (width, height), color).save(buf, format="PNG")
+        return buf.getvalue()
+
+    return make
+
+
+@pytest.fixture()
+def tiny_model():
+    """A seeded TinyConvNet in eval mode with one output per class in CLASS_NAMES."""
+    pytest.importorskip("torch")
+    from app.routers.predict import CLASS_NAMES
+
+    torch.manual_seed(0)
+    return TinyConvNet(num_classes=len(CLASS_NAMES)).eval()
+
+
+@pytest.fixture()
+def patched_model(monkeypatch, tiny_model):
+    """Serve /predict from tiny_model through a fresh micro-batcher, closed after the test."""
+    from app.routers import predict as predict_router
+
+    if predict_router.get_batcher() is None:
+        pytest.skip("model package unavailable")
+    monkeypatch.setattr(predict_router, "MODEL", tiny_model)
+    monkeypatch.setattr(predict_router, "BATCHER", None)
+    yield tiny_model
+    if predict_router.BATCHER is not None:
+        predict_router.BATCHER.close(timeout=5)
@@ -5,3 +5,45 @@ def test_root_healthy(client):
     assert data.get("message") == "SkinVision AI API is running"
 
 
+
+
+def test_ready_after_warm_up(client):
+    import time
+    deadline = time.time() + 30
+    resp = client.get("/health/ready")
+    while resp.status_code == 503 and time.time() < deadline:
+        time.sleep(0.05)
+        resp = client.get("/health/ready")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["ready"] is True
+    assert data["load_ms"] is not None
+    assert data["warmup_ms"] is not None
+
+
+def test_warm_up_runs_forward_and_gradcam_passes(monkeypatch, tiny_model):
+    import pytest
+    from app.routers import predict as predict_router
+    if predict_router.classify_and_explain is None:
+        pytest.skip("model package unavailable")
+
+    calls = {"forward": 0}
+    batch_sizes = set()
+
+    def count(module, inputs):
+        calls["forward"] += 1
+        batch_sizes.add(inputs[0].shape[0])
+
+    tiny_model.register_forward_pre_hook(count)
+    monkeypatch.setattr(predict_router, "MODEL", tiny_model)
+    monkeypatch.setattr(predict_router, "BATCH_MAX_SIZE", 4)
+    monkeypatch.setattr(predict_router, "READINESS", dict(predict_router.READINESS, ready=False))
+
+    state = predict_router.warm_up(runs=3)
+
+    assert state["ready"] is True
+    assert state["model_loaded"] is True
+    assert state["warmup_runs"] == 3
+    # Classification at batch sizes 1 and BATCH_MAX_SIZE plus one Grad-CAM pass per run
+    assert calls["forward"] == 9
+    assert batch_sizes == {1, 4}
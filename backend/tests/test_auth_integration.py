@@ -1,5 +1,4 @@
 """Integration tests for authentication flow."""
-import os
 
 
 def test_complete_auth_flow_signup_login_predict(client):
@@ -125,3 +124,40 @@ def test_missing_token_rejected(client):
     response = client.get("/history/")
     
     assert response.status_code == 401
+
+
+def test_login_rehashes_outdated_password_hash(client, db_session):
+    """A hash made with other argon2 parameters still logs in and is upgraded."""
+    from passlib.context import CryptContext
+    from app import models, passwords
+
+    old_context = CryptContext(schemes=["argon2"], argon2__rounds=1, argon2__memory_cost=8192,
+                               argon2__parallelism=1)
+    user = models.User(email="rehash@example.com", hashed_password=old_context.hash("OldParams1"), role="user")
+    db_session.add(user)
+    db_session.commit()
+
+    response = client.post("/auth/login", json={"email": "rehash@example.com", "password": "OldParams1"})
+    assert response.status_code == 200
+
+    db_session.refresh(user)
+    assert f"m={passwords.ARGON2_MEMORY_COST},t={passwords.ARGON2_TIME_COST}" in user.hashed_password
+    assert passwords.password_context().verify("OldParams1", user.hashed_password)
+
+
+def test_login_returns_503_when_password_pool_is_full(client, monkeypatch):
+    """Logins beyond the password pool's capacity are shed instead of queued."""
+    from app import passwords
+    from app.executor import BoundedExecutor
+
+    executor = BoundedExecutor(max_workers=1, max_queue=0, name="password")
+    monkeypatch.setattr(passwords, "_EXECUTOR", executor)
+    client.post("/auth/signup", json={"email": "busy@example.com", "password": "BusyPass1"})
+    executor.acquire()  # the only slot is taken
+    try:
+        response = client.post("/auth/login", json={"email": "busy@example.com", "password": "BusyPass1"})
+    finally:
+        executor.release()
+        executor.shutdown()
+    assert response.status_code == 503
+    assert response.headers["Retry-After"]
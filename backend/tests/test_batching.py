@@ -0,0 +1,111 @@
+"""Tests for the dynamic micro-batcher."""
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+from model.batching import MicroBatcher
+
+
+def test_concurrent_submissions_are_batched():
+    seen_sizes = []
+
+    def batch_fn(items):
+        seen_sizes.append(len(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=200)
+    try:
+        futures = [batcher.submit(i) for i in range(4)]
+        assert [f.result(timeout=5) for f in futures] == [0, 2, 4, 6]
+        assert seen_sizes == [4]
+
+        stats = batcher.stats()
+        assert stats["batches"] == 1
+        assert stats["items"] == 4
+        assert stats["batch_size_histogram"] == {"4": 1}
+        assert stats["mean_batch_size"] == 4.0
+    finally:
+        batcher.close(timeout=5)
+
+
+def test_batch_is_flushed_after_max_wait():
+    batcher = MicroBatcher(lambda items: items, max_batch_size=64, max_wait_ms=10)
+    try:
+        started = time.perf_counter()
+        assert batcher.submit("only").result(timeout=5) == "only"
+        assert time.perf_counter() - started < 2
+        assert batcher.stats()["batch_size_histogram"] == {"1": 1}
+    finally:
+        batcher.close(timeout=5)
+
+
+def test_batch_errors_propagate_to_every_caller():
+    def batch_fn(items):
+        raise ValueError("boom")
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=2, max_wait_ms=100)
+    try:
+        futures = [batcher.submit(i) for i in range(2)]
+        for f in futures:
+            with pytest.raises(ValueError):
+                f.result(timeout=5)
+        assert batcher.stats()["errors"] == 1
+    finally:
+        batcher.close(timeout=5)
+
+
+def test_cancelled_futures_do_not_stop_the_batcher():
+    """Callers cancelling while a batch runs (or before it is taken) leave the worker thread running."""
+    started, release = threading.Event(), threading.Event()
+    seen = []
+
+    def batch_fn(items):
+        seen.extend(items)
+        started.set()
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=1, max_wait_ms=0)
+    try:
+        running = batcher.submit("running")
+        assert started.wait(5)
+        # Already taken into a batch: too late to cancel, the result is still delivered
+        assert not running.cancel()
+        waiting = batcher.submit("waiting")
+        assert waiting.cancel()
+        release.set()
+        assert running.result(timeout=5) == "running"
+
+        assert batcher.submit("after").result(timeout=5) == "after"
+        assert "waiting" not in seen
+    finally:
+        release.set()
+        batcher.close(timeout=5)
+
+
+def test_predict_batch_with_model_returns_one_result_per_image(tiny_model):
+    import torch
+    from app.routers.predict import predict_batch_with_model, CLASS_NAMES
+
+    batch = torch.randn(3, 3, 224, 224)
+    results = predict_batch_with_model(tiny_model, batch)
+    assert len(results) == 3
+    with torch.no_grad():
+        expected = torch.softmax(tiny_model(batch), dim=1).argmax(dim=1).tolist()
+    assert [cls for cls, _ in results] == [CLASS_NAMES[i] for i in expected]
+    assert all(0.0 < conf <= 1.0 for _, conf in results)
+
+
+def test_inference_metrics_endpoint(client, admin_headers):
+    response = client.get("/metrics/inference", headers=admin_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert "model_loaded" in data
+    assert "batching" in data
@@ -0,0 +1,101 @@
+"""Tests for engine/pool configuration in app.database."""
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app import database
+
+
+def test_engine_options_configure_pool():
+    options = database._engine_options("sqlite:///./example.db")
+    assert options["poolclass"] is database.InstrumentedQueuePool
+    assert options["pool_size"] == database.DB_POOL_SIZE
+    assert options["max_overflow"] == database.DB_MAX_OVERFLOW
+    assert options["pool_pre_ping"] is database.DB_POOL_PRE_PING
+
+    # In-memory SQLite keeps SQLAlchemy's single-connection pool
+    assert "poolclass" not in database._engine_options("sqlite:///:memory:")
+
+    pg = database._engine_options("postgresql+psycopg2://u:p@db/skinvision")
+    assert pg["connect_args"]["connect_timeout"] == database.DB_CONNECT_TIMEOUT
+
+
+def test_sqlite_connections_use_wal():
+    with database.engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == database.SQLITE_JOURNAL_MODE
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == database.SQLITE_BUSY_TIMEOUT_MS
+
+
+def test_pool_timeouts_are_recorded():
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    os.close(db_fd)
+    engine = create_engine(f"sqlite:///{db_path}", poolclass=database.InstrumentedQueuePool,
+                           pool_size=1, max_overflow=0, pool_timeout=0.05)
+    before = database.POOL_WAITS.stats()
+    try:
+        with engine.connect():
+            with pytest.raises(PoolTimeoutError):
+                engine.connect()
+    finally:
+        engine.dispose()
+        os.remove(db_path)
+    after = database.POOL_WAITS.stats()
+    assert after["timeouts"] == before["timeouts"] + 1
+    assert after["checkouts"] == before["checkouts"] + 1
+    assert after["wait_ms"]["max"] >= 50
+
+
+def test_db_metrics_endpoint(client, admin_headers):
+    response = client.get("/metrics/db", headers=admin_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["pid"] == os.getpid()
+    assert {"checked_out", "overflow", "timeouts", "wait_ms"} <= data.keys()
+
+
+def test_async_database_url_maps_drivers():
+    assert database.async_database_url("sqlite:///./skinvision.db") == "sqlite+aiosqlite:///./skinvision.db"
+    assert (database.async_database_url("postgresql+psycopg2://u:p@db:5432/skinvision")
+            == "postgresql+asyncpg://u:p@db:5432/skinvision")
+
+
+def test_run_db_with_sync_session_uses_worker_thread(db_session):
+    import asyncio
+    import threading
+
+    def which_thread(session):
+        assert session is db_session
+        return threading.get_ident()
+
+    assert asyncio.run(database.run_db(db_session, which_thread)) != threading.get_ident()
+
+
+def test_run_db_with_async_session_runs_crud():
+    import asyncio
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from app import crud, schemas
+
+    pytest.importorskip("aiosqlite")
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    os.close(db_fd)
+
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        async with engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.create_all)
+        async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+            data = schemas.PredictionCreate(image_url="/static/async.png", predicted_class="Melanoma", confidence=0.5)
+            pred = await database.run_db(db, crud.create_prediction, data, user_id=3)
+            rows, _ = await database.run_db(db, crud.list_predictions_page, 10, user_id=3)
+        await engine.dispose()
+        return pred, rows
+
+    try:
+        pred, rows = asyncio.run(scenario())
+    finally:
+        os.remove(db_path)
+    assert [row.id for row in rows] == [pred.id]
@@ -3,6 +3,7 @@ import os
 import io
 from PIL import Image
 from jose import jwt
+from sqlalchemy import select
 
 
 def _make_test_image() -> bytes:
@@ -150,3 +151,286 @@ def test_history_pagination_and_ordering(client):
     # Check ordering (newest first)
     timestamps = [p["timestamp"] for p in history if p["id"] in pred_ids]
     assert timestamps == sorted(timestamps, reverse=True)
+
+
+def _seed_predictions(db_session, user_id, rows):
+    from app import crud, schemas
+    return [
+        crud.create_prediction(db_session, schemas.PredictionCreate(
+            image_url=f"/static/page_{user_id}_{i}.png", predicted_class=cls, confidence=conf), user_id=user_id).id
+        for i, (cls, conf) in enumerate(rows)
+    ]
+
+
+def test_history_keyset_pagination(client, db_session):
+    """Pages follow X-Next-Cursor without gaps or duplicates, even for equal timestamps."""
+    ids = _seed_predictions(db_session, 301, [("Melanoma", 0.5 + i / 100) for i in range(7)])
+    headers = {"Authorization": _get_token(user_id=301)}
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/history/", headers=headers, params=params)
+        assert response.status_code == 200
+        assert "X-Total-Count" not in response.headers
+        page = response.json()
+        assert len(page) <= 3
+        seen.extend(p["id"] for p in page)
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert seen == sorted(ids, reverse=True)  # same-second timestamps fall back to id order
+
+
+def test_history_filters_and_total(client, db_session):
+    _seed_predictions(db_session, 302, [("Melanoma", 0.9), ("Melanoma", 0.4), ("Dermatofibroma", 0.95)])
+    headers = {"Authorization": _get_token(user_id=302)}
+
+    response = client.get("/history/", headers=headers, params={
+        "predicted_class": "Melanoma", "min_confidence": 0.5, "include_total": "true"})
+    assert response.status_code == 200
+    assert [(p["predicted_class"], p["confidence"]) for p in response.json()] == [("Melanoma", 0.9)]
+    assert response.headers["X-Total-Count"] == "1"
+
+    all_rows = client.get("/history/", headers=headers, params={"include_total": "true", "limit": 1})
+    assert len(all_rows.json()) == 1
+    assert all_rows.headers["X-Total-Count"] == "3"
+
+    newest = client.get("/history/", headers=headers).json()[0]["timestamp"]
+    assert client.get("/history/", headers=headers, params={"date_from": newest}).json()
+    assert client.get("/history/", headers=headers, params={"date_to": "2000-01-01T00:00:00"}).json() == []
+
+
+def test_prediction_stats_aggregates_in_the_database(db_session):
+    from datetime import datetime, timedelta, timezone
+
+    from app import crud
+
+    _seed_predictions(db_session, 304, [("Melanoma", 0.9), ("Melanoma", 0.5), ("Dermatofibroma", 0.7)])
+    stats = crud.prediction_stats(db_session, weeks=4, user_id=304)
+    assert stats["total"] == 3
+    assert abs(stats["avg_confidence"] - 0.7) < 1e-9
+    assert stats["by_class"] == {"Melanoma": 2, "Dermatofibroma": 1}
+    assert stats["weekly"] == [0, 0, 0, 3]
+
+    later = crud.prediction_stats(db_session, weeks=2, now=datetime.now(timezone.utc) + timedelta(days=8),
+                                  user_id=304)
+    assert later["weekly"] == [3, 0]
+    assert crud.prediction_stats(db_session, user_id=305) == {
+        "total": 0, "avg_confidence": None, "by_class": {}, "weekly": [0] * 8}
+
+
+def test_history_stats_requires_admin(client):
+    assert client.get("/history/stats").status_code == 401
+    user = {"Authorization": _get_token(user_id=306)}
+    assert client.get("/history/stats", headers=user).status_code == 403
+
+    admin = {"Authorization": _get_token(user_id=307, role="admin")}
+    response = client.get("/history/stats", headers=admin, params={"weeks": 3})
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["total"] == sum(stats["by_class"].values())
+    assert len(stats["weekly"]) == 3
+
+
+def test_history_rejects_bad_cursor(client):
+    headers = {"Authorization": _get_token(user_id=303)}
+    response = client.get("/history/", headers=headers, params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def _static_path(url):
+    return os.path.join(os.environ["STATIC_DIR"], os.path.basename(url))
+
+
+def _solid_image(color) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_bulk_delete_only_removes_own_predictions(client):
+    """Bulk delete skips other users' and unknown ids and removes the deleted rows' files."""
+    owner = {"Authorization": _get_token(user_id=60)}
+    other = {"Authorization": _get_token(user_id=61)}
+    own = [
+        client.post("/predict", files={"file": (f"bulk{i}.png", _solid_image((i, 60, 60)), "image/png")},
+                    headers=owner).json()
+        for i in range(2)
+    ]
+    foreign = client.post("/predict", files={"file": ("bulk_other.png", _solid_image((61, 61, 61)), "image/png")},
+                          headers=other).json()
+
+    ids = [p["id"] for p in own] + [foreign["id"], 999999]
+    response = client.post("/history/bulk-delete", json={"ids": ids}, headers=owner)
+    assert response.status_code == 200
+    assert response.json()["deleted"] == sorted(p["id"] for p in own)
+
+    remaining = {p["id"] for p in client.get("/history/", headers=other).json()}
+    assert foreign["id"] in remaining
+    assert all(not os.path.exists(_static_path(p["image_url"])) for p in own)
+    assert os.path.exists(_static_path(foreign["image_url"]))
+
+
+def test_delete_keeps_files_shared_with_other_predictions(client):
+    """Repeat uploads share stored files; they are removed with the last prediction using them."""
+    headers = {"Authorization": _get_token(user_id=62)}
+    image = _solid_image((62, 10, 200))
+    first, second = (
+        client.post("/predict", files={"file": ("shared.png", image, "image/png")}, headers=headers).json()
+        for _ in range(2)
+    )
+    assert first["image_url"] == second["image_url"]
+
+    assert client.delete(f"/history/{first['id']}", headers=headers).status_code == 200
+    assert os.path.exists(_static_path(second["image_url"]))
+
+    assert client.delete(f"/history/{second['id']}", headers=headers).status_code == 200
+    assert not os.path.exists(_static_path(second["image_url"]))
+    assert client.delete(f"/history/{second['id']}", headers=headers).status_code == 404
+
+
+def test_delete_hashless_prediction_keeps_shared_files(client, db_session):
+    """Fallback predictions are stored without image_hash but can still share files with later ones."""
+    from app import crud, schemas
+
+    headers = {"Authorization": _get_token(user_id=63)}
+    live = client.post("/predict", files={"file": ("hashless.png", _solid_image((63, 20, 20)), "image/png")},
+                       headers=headers).json()
+    fallback = crud.create_prediction(db_session, schemas.PredictionCreate(
+        image_url=live["image_url"],
+        predicted_class=live["predicted_class"],
+        confidence=0.92,
+        heatmap_url=live["heatmap_url"],
+        thumbnail_url=live["thumbnail_url"],
+        image_hash=None,
+    ), user_id=63)
+
+    assert client.delete(f"/history/{fallback.id}", headers=headers).status_code == 200
+    for url in (live["image_url"], live["heatmap_url"], live["thumbnail_url"]):
+        if url:
+            assert os.path.exists(_static_path(url))
+
+    assert client.delete(f"/history/{live['id']}", headers=headers).status_code == 200
+    assert not os.path.exists(_static_path(live["image_url"]))
+
+
+def test_file_removal_rechecks_references(client, db_session):
+    """Files picked up by a prediction created after the delete (e.g. a cache hit) are kept."""
+    from sqlalchemy.orm import sessionmaker
+
+    from app import crud, schemas
+    from app.routers.predict import remove_unreferenced_files
+
+    urls = ["/static/recheck_kept.png", "/static/recheck_gone.png"]
+    for url in urls:
+        with open(_static_path(url), "wb") as f:
+            f.write(b"x")
+    crud.create_prediction(db_session, schemas.PredictionCreate(
+        image_url=urls[0], predicted_class="Melanoma", confidence=0.9), user_id=64)
+
+    remove_unreferenced_files(sessionmaker(bind=db_session.get_bind()), os.environ["STATIC_DIR"], urls)
+    assert os.path.exists(_static_path(urls[0]))
+    assert not os.path.exists(_static_path(urls[1]))
+
+
+def test_history_etag_revalidation(client, monkeypatch):
+    """Unchanged lists answer If-None-Match with 304; the user's own writes change the ETag."""
+    from app.routers import history as history_router
+
+    headers = {"Authorization": _get_token(user_id=70)}
+    other = {"Authorization": _get_token(user_id=71)}
+    client.post("/predict", files={"file": ("etag.png", _solid_image((70, 1, 1)), "image/png")}, headers=headers)
+
+    first = client.get("/history/", headers=headers)
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    # Neither the 304 nor a repeat of the same page touches the rows
+    def no_row_queries(*args, **kwargs):
+        raise AssertionError("rows were queried")
+
+    monkeypatch.setattr(history_router, "list_predictions_page", no_row_queries)
+    not_modified = client.get("/history/", headers={**headers, "If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    again = client.get("/history/", headers=headers)
+    assert again.json() == first.json()
+    assert again.headers["ETag"] == etag
+    monkeypatch.undo()
+
+    # Another user's prediction leaves this list's version alone
+    client.post("/predict", files={"file": ("etag_other.png", _solid_image((71, 1, 1)), "image/png")}, headers=other)
+    assert client.get("/history/", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    # Different query parameters are a different representation
+    assert client.get("/history/?limit=1", headers={**headers, "If-None-Match": etag}).status_code == 200
+
+    pred = client.post("/predict", files={"file": ("etag2.png", _solid_image((70, 2, 2)), "image/png")},
+                       headers=headers).json()
+    changed = client.get("/history/", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()[0]["id"] == pred["id"]
+
+    client.delete(f"/history/{pred['id']}", headers=headers)
+    after_delete = client.get("/history/", headers={**headers, "If-None-Match": changed.headers["ETag"]})
+    assert after_delete.status_code == 200
+    assert all(p["id"] != pred["id"] for p in after_delete.json())
+
+
+def test_admin_etag_follows_every_write_without_a_shared_version(client, db_session):
+    """Writes bump only their own scope; the all-predictions ETag still changes with each of them."""
+    from app import crud, models
+
+    admin = {"Authorization": _get_token(user_id=73, role="admin")}
+    user = {"Authorization": _get_token(user_id=74)}
+    pred = client.post("/predict", files={"file": ("admin_etag.png", _solid_image((74, 1, 1)), "image/png")},
+                       headers=user).json()
+    def other_versions():
+        V = models.HistoryVersion
+        return dict(db_session.execute(select(V.scope, V.version).where(V.scope != 74)).all())
+
+    before = other_versions()
+    etag = client.get("/history/?all=true", headers=admin).headers["ETag"]
+    assert client.get("/history/?all=true", headers={**admin, "If-None-Match": etag}).status_code == 304
+
+    crud.update_heatmap(db_session, pred["id"], "failed")
+    updated = client.get("/history/?all=true", headers={**admin, "If-None-Match": etag})
+    assert updated.status_code == 200
+    assert next(p for p in updated.json() if p["id"] == pred["id"])["heatmap_status"] == "failed"
+
+    client.delete(f"/history/{pred['id']}", headers=user)
+    deleted = client.get("/history/?all=true", headers={**admin, "If-None-Match": updated.headers["ETag"]})
+    assert deleted.status_code == 200
+    assert all(p["id"] != pred["id"] for p in deleted.json())
+    # Only user 74's version moved; there is no shared all-predictions row to lock
+    assert other_versions() == before
+
+
+def test_history_body_matches_response_model(client, db_session):
+    """Cached page bodies are the PredictionOut serialization, also for expired ORM instances."""
+    import json
+
+    from app import crud
+    from app.routers import history as history_router
+    from app.schemas import PredictionOut
+
+    headers = {"Authorization": _get_token(user_id=72)}
+    for i in range(2):
+        client.post("/predict", files={"file": (f"body{i}.png", _solid_image((72, i, 3)), "image/png")},
+                    headers=headers)
+
+    rows, _ = crud.list_predictions_page(db_session, 50, user_id=72)
+    expected = json.dumps(
+        [PredictionOut.model_validate(row).model_dump(mode="json") for row in rows],
+        ensure_ascii=False, separators=(",", ":"),
+    ).encode()
+    assert client.get("/history/", headers=headers).content == expected
+
+    for row in rows:
+        db_session.expire(row)
+    assert history_router._page_body(rows) == expected
@@ -0,0 +1,66 @@
+"""Tests for the bounded inference executor and /predict backpressure."""
+import asyncio
+import threading
+
+import pytest
+
+from app.executor import BoundedExecutor, QueueFullError
+from app.routers import predict as predict_router
+
+
+def test_executor_rejects_when_full():
+    executor = BoundedExecutor(max_workers=1, max_queue=1)
+    try:
+        executor.acquire()
+        executor.acquire()
+        with pytest.raises(QueueFullError):
+            executor.acquire()
+        executor.release()
+        with executor.admit():
+            assert executor.stats()["in_flight"] == 2
+        stats = executor.stats()
+        assert stats["rejected"] == 1
+        assert stats["admitted"] == 3
+    finally:
+        executor.shutdown()
+
+
+def test_executor_runs_off_the_event_loop():
+    executor = BoundedExecutor(max_workers=1, max_queue=0)
+
+    async def main():
+        loop_thread = threading.get_ident()
+        worker_thread = await executor.run(threading.get_ident)
+        return loop_thread, worker_thread
+
+    try:
+        loop_thread, worker_thread = asyncio.run(main())
+        assert loop_thread != worker_thread
+    finally:
+        executor.shutdown()
+
+
+def test_predict_returns_503_when_queue_is_full(client, monkeypatch, image_bytes):
+    executor = BoundedExecutor(max_workers=1, max_queue=0)
+    monkeypatch.setattr(predict_router, "EXECUTOR", executor)
+    executor.acquire()
+    try:
+        files = {"file": ("busy.png", image_bytes(64, 64, (10, 20, 30)), "image/png")}
+        response = client.post("/predict", files=files)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == str(predict_router.INFERENCE_RETRY_AFTER)
+    finally:
+        executor.release()
+        executor.shutdown()
+
+
+def test_predict_releases_slot_after_request(client, monkeypatch, image_bytes):
+    executor = BoundedExecutor(max_workers=1, max_queue=0)
+    monkeypatch.setattr(predict_router, "EXECUTOR", executor)
+    try:
+        for name in ("first.png", "second.png"):
+            files = {"file": (name, image_bytes(64, 64, (10, 20, 30)), "image/png")}
+            assert client.post("/predict", files=files).status_code == 200
+        assert executor.stats()["in_flight"] == 0
+    finally:
+        executor.shutdown()
@@ -0,0 +1,201 @@
+"""Tests for the out-of-process inference server and its client."""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+from model.inference_client import InferenceClient, InferenceError
+from model.inference_server import InferencePipeline, InferenceServer
+from app.routers import predict as predict_router
+
+
+@pytest.fixture()
+def socket_dir():
+    # Unix socket paths are length-limited, so keep them short
+    path = tempfile.mkdtemp(prefix="sv-")
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+@pytest.fixture()
+def stub_server(socket_dir):
+    server = InferenceServer(os.path.join(socket_dir, "inference.sock"), InferencePipeline(stub=True))
+    server.start_in_thread()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_client_round_trip_with_heatmap(stub_server, image_bytes):
+    client = InferenceClient(stub_server.socket_path, timeout=5)
+    try:
+        result = client.predict(image_bytes(), explain=True)
+        assert result.predicted_class == "Melanoma"
+        assert result.confidence == pytest.approx(0.92)
+        assert result.heatmap_shape == (224, 224)
+        assert len(result.heatmap) == 224 * 224
+
+        no_heatmap = client.predict(image_bytes(), explain=False)
+        assert no_heatmap.heatmap is None and no_heatmap.heatmap_shape is None
+        assert client.info()["model_version"] == "stub"
+    finally:
+        client.close()
+
+
+def test_server_reports_invalid_image(stub_server, image_bytes):
+    client = InferenceClient(stub_server.socket_path, timeout=5)
+    try:
+        with pytest.raises(InferenceError):
+            client.predict(b"not an image")
+        # The connection stays usable after an error response
+        assert client.predict(image_bytes(), explain=False).confidence > 0
+    finally:
+        client.close()
+
+
+def test_client_raises_when_server_is_down(socket_dir):
+    client = InferenceClient(os.path.join(socket_dir, "missing.sock"), timeout=1)
+    with pytest.raises(InferenceError):
+        client.info()
+
+
+def test_client_reconnects_when_connection_was_dropped(stub_server):
+    import socket
+
+    client = InferenceClient(stub_server.socket_path, timeout=5)
+    stale, peer = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    peer.close()
+    client._local.sock = stale
+    try:
+        assert client.info()["model_version"] == "stub"
+    finally:
+        client.close()
+
+
+def test_client_does_not_resend_after_timeout(socket_dir, image_bytes):
+    """A request that timed out waiting for its response may still be running; it is not sent twice."""
+    import socket
+
+    from model.inference_client import recv_frame
+
+    path = os.path.join(socket_dir, "slow.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen()
+    received, done = [], threading.Event()
+
+    def never_answer():
+        listener.settimeout(0.1)
+        while not done.is_set():
+            try:
+                conn, _ = listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            received.append(recv_frame(conn)[0]["op"])
+
+    server = threading.Thread(target=never_answer, daemon=True)
+    server.start()
+    client = InferenceClient(path, timeout=0.2)
+    try:
+        with pytest.raises(InferenceError):
+            client.predict(image_bytes())
+        assert received == ["predict"]
+    finally:
+        done.set()
+        client.close()
+        listener.close()
+        server.join(5)
+
+
+@pytest.mark.parametrize("reply", [b"{not json", b"[1, 2]"])
+def test_client_raises_inference_error_on_garbled_response(socket_dir, reply, image_bytes):
+    """A malformed response frame becomes InferenceError, so /predict falls back instead of failing."""
+    import socket
+
+    from model.inference_client import _HEADER_LEN, recv_frame
+
+    path = os.path.join(socket_dir, "garbled.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen()
+
+    def answer_garbage():
+        conn, _ = listener.accept()
+        with conn:
+            recv_frame(conn)
+            conn.sendall(_HEADER_LEN.pack(len(reply)) + reply)
+
+    server = threading.Thread(target=answer_garbage, daemon=True)
+    server.start()
+    client = InferenceClient(path, timeout=5)
+    try:
+        with pytest.raises(InferenceError):
+            client.predict(image_bytes())
+    finally:
+        client.close()
+        listener.close()
+        server.join(5)
+
+
+def test_concurrent_clients_share_one_batcher(socket_dir, tiny_model, image_bytes):
+    pipeline = InferencePipeline(model=tiny_model, max_batch_size=4, max_wait_ms=50)
+    server = InferenceServer(os.path.join(socket_dir, "inference.sock"), pipeline)
+    server.start_in_thread()
+    client = InferenceClient(server.socket_path, timeout=10)
+    results, errors = [], []
+
+    def worker(i):
+        try:
+            results.append(client.predict(image_bytes(color=(i * 40, 90, 120)), explain=True))
+        except Exception as e:  # pragma: no cover - surfaced by the assertion below
+            errors.append(e)
+        finally:
+            client.close()
+
+    try:
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not errors
+        assert len(results) == 4
+        for result in results:
+            heatmap = np.frombuffer(result.heatmap, dtype=np.uint8).reshape(result.heatmap_shape)
+            assert heatmap.shape == (224, 224)
+        assert pipeline.batcher.stats()["items"] == 4
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_predict_endpoint_uses_inference_server(client, monkeypatch, stub_server, image_bytes):
+    monkeypatch.setattr(predict_router, "INFERENCE_SOCKET", stub_server.socket_path)
+    monkeypatch.setattr(predict_router, "INFERENCE_CLIENT", None)
+    monkeypatch.setattr(predict_router, "_remote_model_version", None)
+    monkeypatch.setattr(predict_router, "HEATMAP_MODE", "sync")
+
+    files = {"file": ("remote.png", image_bytes(color=(12, 34, 56)), "image/png")}
+    response = client.post("/predict", files=files)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["predicted_class"] == "Melanoma"
+    assert data["heatmap_url"].startswith("/static/")
+    assert predict_router.get_model_version() == "remote:stub"
+    predict_router.INFERENCE_CLIENT.close()
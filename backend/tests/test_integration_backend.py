@@ -1,16 +1,7 @@
-import io
-from PIL import Image
 from jose import jwt
 import os
 
 
-def _make_image_bytes(color=(0, 128, 255)) -> bytes:
-    img = Image.new("RGB", (256, 256), color)
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    return buf.getvalue()
-
-
 def _auth_header_for(user_id: int, role: str = "user") -> dict:
     # Mirror the app's signing defaults
     secret = os.environ.get("JWT_SECRET", "devsecret")
@@ -32,8 +23,8 @@ def test_signup_and_login_flow(client):
     assert token
 
 
-def test_predict_creates_record_without_real_model(client):
-    img_bytes = _make_image_bytes()
+def test_predict_creates_record_without_real_model(client, image_bytes):
+    img_bytes = image_bytes(color=(0, 128, 255))
     files = {"file": ("test.png", img_bytes, "image/png")}
     headers = _auth_header_for(1)
     # Ensure model load fails and falls back to stub path
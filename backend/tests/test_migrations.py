@@ -0,0 +1,115 @@
+import os
+import tempfile
+
+from sqlalchemy import create_engine, inspect, select
+
+from app.database import Base
+from app.migrations import MIGRATIONS, apply_migrations, applied_versions, schema_migrations
+
+
+def _fresh_engine():
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    os.close(db_fd)
+    return create_engine(f"sqlite:///{db_path}"), db_path
+
+
+def test_apply_migrations_creates_history_indexes_once():
+    engine, db_path = _fresh_engine()
+    try:
+        Base.metadata.create_all(bind=engine)
+        assert apply_migrations(engine) == [version for version, _, _ in MIGRATIONS]
+
+        indexes = {ix["name"]: ix["column_names"] for ix in inspect(engine).get_indexes("predictions")}
+        assert indexes["ix_predictions_user_timestamp_id"] == ["user_id", "timestamp", "id"]
+        assert indexes["ix_predictions_timestamp_id"] == ["timestamp", "id"]
+        assert applied_versions(engine) == {version for version, _, _ in MIGRATIONS}
+
+        # Second run is a no-op and does not duplicate the bookkeeping rows
+        assert apply_migrations(engine) == []
+        with engine.connect() as conn:
+            assert len(conn.execute(select(schema_migrations)).all()) == len(MIGRATIONS)
+    finally:
+        engine.dispose()
+        os.remove(db_path)
+
+
+def test_history_query_uses_composite_index(db_session):
+    from app import crud
+
+    query = crud.history_page_query(db_session, 50, user_id=1)
+    compiled = query.statement.compile(dialect=db_session.bind.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    plan = db_session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params).fetchall()
+    assert "ix_predictions_user_timestamp_id" in " ".join(str(row[-1]) for row in plan)
+
+
+def test_apply_migrations_upgrades_first_release_schema():
+    """Startup migrations bring a database created before the heatmap and cache columns up to date."""
+    from sqlalchemy import text
+    from sqlalchemy.orm import Session
+
+    from app import crud
+
+    engine, db_path = _fresh_engine()
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR NOT NULL UNIQUE, "
+                "hashed_password VARCHAR NOT NULL, role VARCHAR NOT NULL)"
+            ))
+            conn.execute(text(
+                "CREATE TABLE predictions (id INTEGER PRIMARY KEY, image_url VARCHAR NOT NULL, "
+                "predicted_class VARCHAR NOT NULL, confidence FLOAT NOT NULL, heatmap_url VARCHAR, "
+                "timestamp DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL, user_id INTEGER REFERENCES users (id))"
+            ))
+            conn.execute(text(
+                "INSERT INTO predictions (image_url, predicted_class, confidence, user_id) "
+                "VALUES ('/static/old.png', 'Melanoma', 0.9, 1)"
+            ))
+        Base.metadata.create_all(bind=engine)
+        apply_migrations(engine)
+
+        columns = {column["name"] for column in inspect(engine).get_columns("predictions")}
+        assert {"heatmap_status", "heatmap_requested_at", "thumbnail_url", "image_hash", "model_version"} <= columns
+        indexes = {ix["name"] for ix in inspect(engine).get_indexes("predictions")}
+        assert {"ix_predictions_image_hash", "ix_predictions_image_url", "ix_predictions_heatmap_url",
+                "ix_predictions_thumbnail_url"} <= indexes
+        with Session(engine) as db:
+            rows, _ = crud.list_predictions_page(db, 50, user_id=1)
+            assert [(row.image_url, row.heatmap_status) for row in rows] == [("/static/old.png", "ready")]
+    finally:
+        engine.dispose()
+        os.remove(db_path)
+
+
+def test_concurrent_workers_apply_each_migration_once():
+    """Workers starting together serialize on the migration lock instead of failing on duplicate DDL."""
+    import threading
+
+    _, db_path = _fresh_engine()
+    engines = [create_engine(f"sqlite:///{db_path}") for _ in range(4)]
+    barrier = threading.Barrier(len(engines))
+    results, errors = [], []
+
+    def worker(engine):
+        barrier.wait()
+        try:
+            results.append(apply_migrations(engine, Base.metadata))
+        except Exception as e:
+            errors.append(e)
+
+    try:
+        threads = [threading.Thread(target=worker, args=(engine,)) for engine in engines]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert sorted(version for applied in results for version in applied) == [v for v, _, _ in MIGRATIONS]
+        with engines[0].connect() as conn:
+            assert len(conn.execute(select(schema_migrations)).all()) == len(MIGRATIONS)
+    finally:
+        for engine in engines:
+            engine.dispose()
+        os.remove(db_path)
@@ -90,3 +90,225 @@ def test_heatmap_overlay_handles_different_image_sizes():
         os.remove(output_path)
     
     os.rmdir(temp_dir)
+
+
+def _reference_gradcam(torch, model, image, layer):
+    """Textbook two-pass Grad-CAM: full backward pass with temporary hooks."""
+    import torch.nn.functional as F
+    captured = {}
+    forward = layer.register_forward_hook(lambda m, i, o: captured.__setitem__("acts", o))
+    backward = layer.register_full_backward_hook(lambda m, gi, go: captured.__setitem__("grads", go[0]))
+    try:
+        output = model(image)
+        model.zero_grad()
+        output[0, output.argmax(dim=1)].backward()
+    finally:
+        forward.remove()
+        backward.remove()
+    weights = captured["grads"].mean(dim=(2, 3), keepdim=True)
+    cam = F.relu((captured["acts"] * weights).sum(dim=1, keepdim=True)).detach()
+    if cam.max() > 0:
+        cam = cam / cam.max()
+    return F.interpolate(cam, size=(224, 224), mode="bilinear", align_corners=False)[0, 0].numpy()
+
+
+def test_classify_and_explain_matches_two_pass_gradcam():
+    """Single-pass classify+explain agrees with the two-pass Grad-CAM path."""
+    import pytest
+    torch = pytest.importorskip("torch")
+    from model.grad_cam import classify_and_explain, generate_gradcam_heatmap_pytorch, get_gradcam
+    from model.model_loader import EfficientNetB0Classifier
+
+    torch.manual_seed(0)
+    model = EfficientNetB0Classifier(num_classes=7).eval()
+    batch = torch.randn(2, 3, 224, 224)
+
+    probabilities, heatmaps = classify_and_explain(model, batch)
+
+    assert probabilities.shape == (2, 7)
+    assert np.allclose(probabilities.sum(axis=1), 1.0, atol=1e-5)
+    assert heatmaps.shape == (2, 224, 224)
+    assert 0.0 <= heatmaps.min() <= heatmaps.max() <= 1.0
+
+    with torch.no_grad():
+        expected = torch.softmax(model(batch), dim=1).numpy()
+    assert np.allclose(probabilities, expected, atol=1e-5)
+
+    layer = get_gradcam(model).target_layer
+    for i in range(2):
+        reference = _reference_gradcam(torch, model, batch[i:i + 1], layer)
+        assert np.allclose(heatmaps[i], reference, atol=1e-4)
+        assert np.allclose(generate_gradcam_heatmap_pytorch(model, batch[i:i + 1]), reference, atol=1e-4)
+
+    # One persistent hook, however many calls were made; close() removes it
+    assert sum(len(m._forward_hooks) for m in model.modules()) == 1
+    get_gradcam(model).close()
+    assert all(not m._forward_hooks for m in model.modules())
+
+
+def test_gradcam_is_cached_per_model_and_thread_safe(tiny_model):
+    from concurrent.futures import ThreadPoolExecutor
+    import torch
+    from model.grad_cam import GradCAM, get_gradcam
+
+    model = tiny_model
+    gradcam = get_gradcam(model)
+    assert isinstance(gradcam, GradCAM)
+    assert gradcam is get_gradcam(model)
+    assert gradcam.layer_name == "conv2"
+    assert get_gradcam(model, "conv1").target_layer is model.conv1
+
+    images = torch.randn(8, 3, 32, 32)
+    _, batched = gradcam(images)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        singles = list(pool.map(lambda i: gradcam(images[i:i + 1])[1][0], range(8)))
+    # N images in one pass give the same heatmaps as N separate calls from concurrent threads
+    assert np.allclose(batched, np.stack(singles), atol=1e-5)
+
+    # Plain inference through the hooked model does not accumulate activations
+    with torch.no_grad():
+        model(images)
+    assert getattr(gradcam._local, "activations", None) is None
+
+
+def test_gradcam_cache_does_not_keep_models_alive():
+    import gc
+    import weakref
+    import pytest
+    torch = pytest.importorskip("torch")
+    from model.grad_cam import _GRADCAMS, get_gradcam
+
+    model = torch.nn.Sequential(torch.nn.Conv2d(3, 4, 3), torch.nn.Flatten(), torch.nn.LazyLinear(2))
+    model(torch.randn(1, 3, 8, 8))
+    get_gradcam(model)
+    assert model in _GRADCAMS
+
+    ref = weakref.ref(model)
+    del model
+    gc.collect()
+    assert ref() is None
+
+
+def test_save_heatmap_overlay_uses_precomputed_heatmap():
+    temp_dir = tempfile.mkdtemp()
+    test_image_path = os.path.join(temp_dir, "precomputed.png")
+    Image.new("RGB", (320, 240), (0, 0, 0)).save(test_image_path)
+
+    heatmap = np.zeros((224, 224), dtype=np.float32)
+    heatmap[:, :112] = 1.0
+    output_path = save_heatmap_overlay(test_image_path, temp_dir, heatmap=heatmap)
+
+    output = np.array(Image.open(output_path))
+    assert output.shape == (240, 320, 3)
+    # Hot half is tinted red, cold half stays black
+    assert output[120, 40, 0] > 100
+    assert output[120, 280].sum() == 0
+
+    os.remove(test_image_path)
+    os.remove(output_path)
+    os.rmdir(temp_dir)
+
+
+def test_colorize_and_blend_matches_float_colormap():
+    """The lookup-table blend reproduces the float colormap + alpha_composite result."""
+    from model.grad_cam import colorize_and_blend
+
+    rng = np.random.default_rng(0)
+    image = Image.fromarray(rng.integers(0, 255, (48, 64, 3), dtype=np.uint8))
+    heatmap = Image.fromarray(rng.integers(0, 255, (48, 64), dtype=np.uint8))
+
+    heatmap_arr = np.array(heatmap).astype(np.float32) / 255.0
+    colored = np.stack([(heatmap_arr * c).astype(np.uint8) for c in (255, 200, 50)], axis=-1)
+    overlay = Image.fromarray(colored).convert("RGBA")
+    overlay.putalpha(Image.fromarray((heatmap_arr * 180).astype(np.uint8)))
+    expected = np.asarray(Image.alpha_composite(image.convert("RGBA"), overlay).convert("RGB"), dtype=np.int16)
+
+    actual = colorize_and_blend(image, heatmap)
+    assert actual.mode == "RGB"
+    assert np.abs(np.asarray(actual, dtype=np.int16) - expected).max() <= 1
+
+
+def test_fallback_gradient_is_cached_per_size():
+    from model.grad_cam import _center_gradient
+
+    gradient = _center_gradient(320, 240)
+    assert gradient is _center_gradient(320, 240)
+    assert gradient.size == (320, 240)
+    arr = np.asarray(gradient)
+    assert arr[120, 160] == 255 and arr[0, 0] == 0
+    assert _center_gradient(1, 1).size == (1, 1)
+
+
+def test_large_fallback_gradients_are_resized_from_a_bounded_cache():
+    from model.grad_cam import _GRADIENT_MAX_DIM, _bounded_center_gradient, _center_gradient
+
+    _bounded_center_gradient.cache_clear()
+    gradient = _center_gradient(6000, 4000)
+    assert gradient.size == (6000, 4000)
+    # Only the bounded-size copy is cached, not the 24 MP image
+    assert _bounded_center_gradient.cache_info().currsize == 1
+    cached = _bounded_center_gradient(_GRADIENT_MAX_DIM, round(4000 * _GRADIENT_MAX_DIM / 6000))
+    assert _bounded_center_gradient.cache_info().hits == 1
+    assert cached.size == (512, 341)
+
+    arr = np.asarray(gradient, dtype=np.int16)
+    assert arr[2000, 3000] >= 254 and arr[0, 0] <= 1
+    y, x = np.ogrid[:4000:97, :6000:97]
+    exact = (1 - np.clip(np.sqrt((x - 3000) ** 2 + (y - 2000) ** 2) / np.sqrt(3000 ** 2 + 2000 ** 2), 0, 1)) * 255
+    assert np.abs(arr[::97, ::97] - exact).max() <= 3
+
+
+def test_save_heatmap_overlay_output_options(tmp_path):
+    """max_dim caps the output size, fmt picks the encoder, thumbnail_dim adds a thumbnail."""
+    from model.grad_cam import thumbnail_path
+
+    test_image_path = str(tmp_path / "large.png")
+    Image.new("RGB", (1200, 800), (30, 60, 90)).save(test_image_path)
+
+    output_path = save_heatmap_overlay(test_image_path, str(tmp_path), max_dim=600, fmt="webp", quality=70,
+                                       thumbnail_dim=96)
+
+    assert output_path.endswith("heatmap_large.webp")
+    with Image.open(output_path) as output:
+        assert output.format == "WEBP"
+        assert output.size == (600, 400)
+    with Image.open(thumbnail_path(test_image_path, str(tmp_path), "webp")) as thumb:
+        assert thumb.size == (96, 64)
+
+    jpeg_path = save_heatmap_overlay(test_image_path, str(tmp_path), max_dim=2000, fmt="jpeg")
+    with Image.open(jpeg_path) as output:
+        assert output.format == "JPEG"
+        assert output.size == (1200, 800)  # never upscaled
+
+
+def test_save_heatmap_overlay_rejects_unknown_format(tmp_path):
+    import pytest
+
+    test_image_path = str(tmp_path / "img.png")
+    Image.new("RGB", (32, 32)).save(test_image_path)
+    with pytest.raises(ValueError):
+        save_heatmap_overlay(test_image_path, str(tmp_path), fmt="gif")
+
+
+def test_batched_heatmaps_explain_requested_classes(tiny_model):
+    """N heatmaps from one pass; class_idx selects which class each one explains."""
+    import pytest
+    import torch
+    from model.grad_cam import classify_and_explain, generate_gradcam_heatmaps_pytorch
+
+    model = tiny_model
+    num_classes = model.fc.out_features
+    images = torch.randn(5, 3, 32, 32)
+
+    probabilities, top = classify_and_explain(model, images)
+    assert np.allclose(generate_gradcam_heatmaps_pytorch(model, images), top)
+
+    targets = [(int(i) + 1) % num_classes for i in probabilities.argmax(axis=1)]
+    heatmaps = generate_gradcam_heatmaps_pytorch(model, images, class_idx=targets)
+    assert heatmaps.shape == (5, 224, 224)
+    for i, target in enumerate(targets):
+        single = generate_gradcam_heatmaps_pytorch(model, images[i:i + 1], class_idx=[target])[0]
+        assert np.allclose(heatmaps[i], single, atol=1e-5)
+
+    with pytest.raises(ValueError):
+        classify_and_explain(model, images, class_idx=[0, 1])
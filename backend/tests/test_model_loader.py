@@ -0,0 +1,199 @@
+"""Tests for model loading options in model/model_loader.py."""
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+torch = pytest.importorskip("torch")
+
+from model.model_loader import (
+    CLASS_NAMES,
+    HAM10000_METADATA,
+    EfficientNetB0Classifier,
+    load_ham10000_samples,
+    load_local_model,
+    optimize_model,
+    optimized_artifact_path,
+    process_memory_mb,
+    quantize_model,
+)
+
+
+@pytest.fixture(scope="module")
+def checkpoint(tmp_path_factory):
+    torch.manual_seed(0)
+    model = EfficientNetB0Classifier(num_classes=7).eval()
+    path = tmp_path_factory.mktemp("ckpt") / "efficientnet_b0_best.pth"
+    torch.save({"model_state_dict": model.state_dict()}, path)
+    return model, path
+
+
+def test_mmap_load_matches_regular_load(checkpoint):
+    reference, path = checkpoint
+    mapped = load_local_model(path, mmap=True)
+
+    assert mapped is not None
+    assert not mapped.training
+    assert not any(t.is_meta for t in list(mapped.parameters()) + list(mapped.buffers()))
+
+    x = torch.randn(2, 3, 224, 224)
+    with torch.no_grad():
+        assert torch.allclose(mapped(x), reference(x), atol=1e-6)
+
+
+def test_mmap_falls_back_for_legacy_checkpoints(checkpoint, tmp_path):
+    reference, _ = checkpoint
+    legacy = tmp_path / "legacy.pth"
+    torch.save(reference.state_dict(), legacy, _use_new_zipfile_serialization=False)
+
+    model = load_local_model(legacy, mmap=True)
+    assert model is not None
+
+
+def test_mmap_load_refuses_pickled_modules(checkpoint, tmp_path):
+    """The mmap path only unpickles tensors; whole-module checkpoints are left to the regular path."""
+    import pickle
+
+    from model.model_loader import _load_mmap_model
+
+    reference, _ = checkpoint
+    pickled = tmp_path / "module.pth"
+    torch.save(reference, pickled)
+
+    with pytest.raises(pickle.UnpicklingError):
+        _load_mmap_model(pickled)
+
+
+def test_process_memory_reports_rss():
+    usage = process_memory_mb()
+    if sys.platform.startswith("linux"):
+        assert usage["rss_mb"] > 0
+        assert usage["pss_mb"] > 0
+
+
+@pytest.mark.parametrize("mode", ["trace", "freeze"])
+def test_optimized_model_is_cached_next_to_checkpoint(checkpoint, tmp_path, monkeypatch, mode):
+    reference, source = checkpoint
+    path = tmp_path / source.name
+    path.write_bytes(source.read_bytes())
+
+    optimized = optimize_model(reference, mode=mode, model_path=path)
+    assert optimized is not reference
+    artifact = optimized_artifact_path(path, mode)
+    assert artifact.exists()
+    assert torch.__version__.replace("+", "_") in artifact.name
+
+    # A second start loads the cached artifact instead of re-tracing
+    monkeypatch.setattr(torch.jit, "trace", None)
+    reloaded = optimize_model(reference, mode=mode, model_path=path)
+    assert reloaded is not reference
+    x = torch.randn(3, 3, 224, 224)
+    with torch.no_grad():
+        assert torch.allclose(reloaded(x), reference(x), rtol=1e-3, atol=1e-4)
+
+
+def test_optimized_model_is_cached_in_model_cache_dir(checkpoint, tmp_path, monkeypatch):
+    """A read-only model directory still gets its artifact cached, in MODEL_CACHE_DIR."""
+    reference, source = checkpoint
+    model_dir = tmp_path / "model"
+    model_dir.mkdir()
+    path = model_dir / source.name
+    path.write_bytes(source.read_bytes())
+    model_dir.chmod(0o555)
+    cache_dir = tmp_path / "cache" / "models"
+    monkeypatch.setenv("MODEL_CACHE_DIR", str(cache_dir))
+    try:
+        optimize_model(reference, mode="trace", model_path=path)
+        artifact = optimized_artifact_path(path, "trace")
+        assert artifact.parent == cache_dir
+        assert artifact.exists()
+        assert list(model_dir.iterdir()) == [path]
+    finally:
+        model_dir.chmod(0o755)
+
+
+def test_optimize_falls_back_to_eager(checkpoint, monkeypatch):
+    reference, _ = checkpoint
+    assert optimize_model(reference, mode="none") is reference
+    assert optimize_model(reference, mode="bogus") is reference
+
+    def broken_trace(*args, **kwargs):
+        raise RuntimeError("tracing not supported")
+
+    monkeypatch.setattr(torch.jit, "trace", broken_trace)
+    assert optimize_model(reference, mode="trace") is reference
+
+
+@pytest.fixture(scope="module")
+def ham_images(tmp_path_factory):
+    """Two synthetic images per HAM10000 class, named after real metadata rows."""
+    import csv
+    import numpy as np
+    from PIL import Image
+
+    image_dir = tmp_path_factory.mktemp("ham") / "HAM10000_images_part_1"
+    image_dir.mkdir()
+    per_dx = {}
+    with open(HAM10000_METADATA, newline="") as f:
+        for row in csv.DictReader(f):
+            ids = per_dx.setdefault(row["dx"], [])
+            if len(ids) < 2:
+                ids.append(row["image_id"])
+    rng = np.random.default_rng(0)
+    for ids in per_dx.values():
+        for image_id in ids:
+            pixels = rng.integers(0, 255, (60, 80, 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(image_dir / f"{image_id}.jpg")
+    return image_dir.parent
+
+
+def test_ham10000_samples_are_class_balanced(ham_images):
+    samples = load_ham10000_samples(ham_images, limit=7)
+    assert sorted(label for _, label in samples) == sorted(CLASS_NAMES)
+    assert all(path.exists() for path, _ in samples)
+    assert len(load_ham10000_samples(ham_images)) == 14
+    assert load_ham10000_samples(ham_images / "missing") == []
+
+
+def test_dynamic_quantization_keeps_float_model(checkpoint):
+    reference, _ = checkpoint
+    quantized = quantize_model(reference, mode="dynamic")
+    assert quantized is not reference
+    assert isinstance(reference.classifier[1], torch.nn.Linear)
+
+    x = torch.randn(2, 3, 224, 224)
+    with torch.no_grad():
+        assert torch.allclose(quantized(x), reference(x), atol=0.05)
+
+
+def test_static_quantization_without_images_falls_back_to_dynamic(checkpoint, monkeypatch):
+    reference, _ = checkpoint
+    monkeypatch.delenv("QUANT_CALIBRATION_DIR", raising=False)
+    quantized = quantize_model(reference, mode="static")
+    assert quantized is not reference
+    assert not isinstance(quantized, torch.jit.ScriptModule)
+
+
+def test_static_quantization_is_calibrated_and_cached(checkpoint, ham_images, tmp_path, monkeypatch):
+    reference, source = checkpoint
+    path = tmp_path / source.name
+    path.write_bytes(source.read_bytes())
+
+    quantized = quantize_model(reference, mode="static", model_path=path, calibration_dir=ham_images,
+                               calibration_samples=7)
+    assert isinstance(quantized, torch.jit.ScriptModule)
+    assert len(list(tmp_path.glob(f"{path.stem}.int8-*.pt"))) == 1
+
+    x = torch.randn(2, 3, 224, 224)
+    with torch.no_grad():
+        expected = torch.softmax(reference(x), dim=1)
+        # Second start loads the artifact instead of recalibrating
+        monkeypatch.setattr("model.model_loader._quantize_static", None)
+        cached = quantize_model(reference, mode="static", model_path=path, calibration_dir=ham_images,
+                                calibration_samples=7)
+        assert isinstance(cached, torch.jit.ScriptModule)
+        assert torch.allclose(torch.softmax(cached(x), dim=1), expected, atol=0.05)
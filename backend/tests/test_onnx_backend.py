@@ -0,0 +1,107 @@
+"""Tests for the ONNX Runtime backend (model/onnx_backend.py)."""
+import io
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("onnxruntime")
+
+from model.model_loader import EfficientNetB0Classifier, get_preprocessing_transform
+from model.onnx_backend import OnnxClassifier, export_onnx, preprocess_image
+from app.routers import predict as predict_router
+
+
+@pytest.fixture(scope="module")
+def exported(tmp_path_factory):
+    torch.manual_seed(0)
+    model = EfficientNetB0Classifier(num_classes=7).eval()
+    path = export_onnx(model, tmp_path_factory.mktemp("onnx") / "efficientnet_b0_best.onnx")
+    return model, path
+
+
+def test_onnx_logits_match_torch(exported):
+    model, path = exported
+    batch = torch.randn(3, 3, 224, 224)
+    with torch.no_grad():
+        expected = model(batch).numpy()
+
+    for level in ("disable", "all"):
+        classifier = OnnxClassifier(path, intra_op_threads=1, inter_op_threads=1, graph_optimization=level)
+        logits = classifier(batch)
+        assert logits.shape == (3, 7)
+        np.testing.assert_allclose(logits, expected, rtol=1e-3, atol=1e-4)
+        np.testing.assert_allclose(classifier.predict_proba(batch.numpy()).sum(axis=1), 1.0, rtol=1e-5)
+
+
+def test_onnx_preprocessing_matches_torchvision():
+    image = Image.fromarray(np.random.default_rng(0).integers(0, 255, (300, 400, 3), dtype=np.uint8))
+    expected = get_preprocessing_transform()(image).unsqueeze(0).numpy()
+    actual = preprocess_image(image)
+    assert actual.shape == (1, 3, 224, 224)
+    # torchvision antialiases when downscaling; PIL bilinear is close but not identical
+    assert np.abs(actual - expected).mean() < 0.05
+
+
+def test_invalid_graph_optimization_level(exported):
+    _, path = exported
+    with pytest.raises(ValueError):
+        OnnxClassifier(path, graph_optimization="maximum")
+
+
+def test_predict_endpoint_with_onnx_backend(client, monkeypatch, exported):
+    model, path = exported
+    monkeypatch.setattr(predict_router, "INFERENCE_BACKEND", "onnx")
+    monkeypatch.setattr(predict_router, "ONNX_MODEL_PATH", str(path))
+    monkeypatch.setattr(predict_router, "HEATMAP_MODE", "on_demand")
+    monkeypatch.setattr(predict_router, "MODEL", None)
+    monkeypatch.setattr(predict_router, "BATCHER", None)
+
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), (90, 40, 160)).save(buf, format="PNG")
+    response = client.post("/predict", files={"file": ("onnx.png", buf.getvalue(), "image/png")})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert isinstance(predict_router.MODEL, OnnxClassifier)
+    assert data["predicted_class"] in predict_router.CLASS_NAMES
+    assert 0.0 < data["confidence"] <= 1.0
+    assert predict_router.get_model_version().startswith("efficientnet_b0_best.onnx:")
+
+    # Same (class, confidence) contract as the torch path
+    image_tensor = predict_router.preprocess_image(buf.getvalue())
+    with torch.no_grad():
+        probs = torch.softmax(model(image_tensor), dim=1)[0]
+    assert data["predicted_class"] == predict_router.CLASS_NAMES[int(probs.argmax())]
+    assert data["confidence"] == pytest.approx(float(probs.max()), abs=1e-4)
+    predict_router.BATCHER.close(timeout=5)
+
+
+def test_sync_heatmaps_explain_the_onnx_class(monkeypatch, exported, tiny_model):
+    """The torch pass explains the class ONNX reported, even when torch alone would pick another."""
+    from model.grad_cam import classify_and_explain
+
+    _, path = exported
+    monkeypatch.setattr(predict_router, "INFERENCE_BACKEND", "onnx")
+    monkeypatch.setattr(predict_router, "ONNX_MODEL_PATH", str(path))
+    monkeypatch.setattr(predict_router, "HEATMAP_MODE", "sync")
+    monkeypatch.setattr(predict_router, "MODEL", None)
+    monkeypatch.setattr(predict_router, "EXPLAIN_MODEL", tiny_model)
+
+    torch.manual_seed(1)
+    tensors = [torch.randn(1, 3, 224, 224) for _ in range(3)]
+    results = predict_router._run_batch(tensors)
+
+    batch = torch.cat(tensors)
+    onnx_idx = predict_router.MODEL.predict_proba(batch.numpy()).argmax(axis=1).tolist()
+    _, expected = classify_and_explain(tiny_model, batch, class_idx=onnx_idx)
+    assert [predicted for predicted, _, _ in results] == [predict_router.CLASS_NAMES[i] for i in onnx_idx]
+    for (_, _, heatmap), want in zip(results, expected):
+        assert np.allclose(heatmap, want, atol=1e-6)
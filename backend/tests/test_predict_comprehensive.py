@@ -5,14 +5,6 @@ from PIL import Image
 from jose import jwt
 
 
-def _make_test_image_bytes(width=256, height=256, color=(128, 128, 128)) -> bytes:
-    """Helper to create test image bytes."""
-    img = Image.new("RGB", (width, height), color)
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    return buf.getvalue()
-
-
 def _get_auth_token(user_id=1, role="user"):
     """Helper to create auth token."""
     secret = os.environ.get("JWT_SECRET", "devsecret")
@@ -24,9 +16,9 @@ def _get_auth_token(user_id=1, role="user"):
     return f"Bearer {token}"
 
 
-def test_predict_without_authentication(client):
+def test_predict_without_authentication(client, image_bytes):
     """Test prediction works without authentication (anonymous)."""
-    img_bytes = _make_test_image_bytes()
+    img_bytes = image_bytes()
     files = {"file": ("test.png", img_bytes, "image/png")}
     
     response = client.post("/predict", files=files)
@@ -40,9 +32,9 @@ def test_predict_without_authentication(client):
     assert data["confidence"] >= 0.0 and data["confidence"] <= 1.0
 
 
-def test_predict_with_authentication(client):
+def test_predict_with_authentication(client, image_bytes):
     """Test prediction with authentication saves user_id."""
-    img_bytes = _make_test_image_bytes()
+    img_bytes = image_bytes()
     files = {"file": ("auth_test.png", img_bytes, "image/png")}
     headers = {"Authorization": _get_auth_token(user_id=42)}
     
@@ -93,9 +85,9 @@ def test_predict_handles_large_images(client):
     assert "image_url" in data
 
 
-def test_predict_creates_static_files(client):
+def test_predict_creates_static_files(client, image_bytes):
     """Test that uploaded images and heatmaps are saved."""
-    img_bytes = _make_test_image_bytes()
+    img_bytes = image_bytes()
     files = {"file": ("saved_test.png", img_bytes, "image/png")}
     
     response = client.post("/predict", files=files)
@@ -108,9 +100,9 @@ def test_predict_creates_static_files(client):
     assert data["heatmap_url"].startswith("/static/")
 
 
-def test_predict_returns_consistent_structure(client):
+def test_predict_returns_consistent_structure(client, image_bytes):
     """Test that prediction response has consistent structure."""
-    img_bytes = _make_test_image_bytes()
+    img_bytes = image_bytes()
     files = {"file": ("consistent.png", img_bytes, "image/png")}
     
     response = client.post("/predict", files=files)
@@ -139,15 +131,349 @@ def test_predict_handles_empty_file(client):
     assert response.status_code == 400
 
 
-def test_preprocess_image_function():
+def test_preprocess_image_function(image_bytes):
     """Test the image preprocessing function."""
     from app.routers.predict import preprocess_image
     import numpy as np
     
-    img_bytes = _make_test_image_bytes(300, 200)
+    img_bytes = image_bytes(300, 200)
     processed = preprocess_image(img_bytes)
     
     assert isinstance(processed, np.ndarray)
     assert processed.shape == (1, 224, 224, 3)
     assert processed.dtype in [np.float32, np.float64]
     assert 0.0 <= processed.min() and processed.max() <= 1.0
+
+
+def test_predict_with_model_uses_single_pass_heatmap(client, patched_model, image_bytes):
+    """With a model loaded, class, confidence and heatmap come from one batched pass."""
+    from app.routers import predict as predict_router
+
+    files = {"file": ("tiny_model.png", image_bytes(), "image/png")}
+    response = client.post("/predict", files=files)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["predicted_class"] in predict_router.CLASS_NAMES
+    assert 0.0 < data["confidence"] <= 1.0
+    assert predict_router.BATCHER.stats()["items"] == 1
+
+
+def _wait_for_heatmap(client, pred_id, headers, timeout=10.0):
+    import time
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        response = client.get(f"/predictions/{pred_id}/heatmap", headers=headers)
+        if response.status_code != 202:
+            return response
+        time.sleep(0.05)
+    raise AssertionError("heatmap was not generated in time")
+
+
+def test_deferred_heatmap_mode(client, monkeypatch, image_bytes):
+    """Deferred mode returns the class right away and renders the heatmap in the background."""
+    from app.routers import predict as predict_router
+    monkeypatch.setattr(predict_router, "HEATMAP_MODE", "deferred")
+
+    headers = {"Authorization": _get_auth_token(user_id=80)}
+    files = {"file": ("deferred.png", image_bytes(), "image/png")}
+    response = client.post("/predict", files=files, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["heatmap_status"] == "pending"
+    assert data["heatmap_url"] is None
+
+    heatmap_response = _wait_for_heatmap(client, data["id"], headers)
+    assert heatmap_response.status_code == 200
+    assert heatmap_response.headers["content-type"].startswith("image/")
+
+
+def test_on_demand_heatmap_mode(client, monkeypatch, image_bytes):
+    """On-demand mode only renders the heatmap once it is requested."""
+    from app.routers import predict as predict_router
+    monkeypatch.setattr(predict_router, "HEATMAP_MODE", "on_demand")
+
+    headers = {"Authorization": _get_auth_token(user_id=81)}
+    files = {"file": ("on_demand.png", image_bytes(), "image/png")}
+    data = client.post("/predict", files=files, headers=headers).json()
+    assert data["heatmap_status"] == "not_requested"
+
+    first = client.get(f"/predictions/{data['id']}/heatmap", headers=headers)
+    assert first.status_code in (200, 202)
+    assert _wait_for_heatmap(client, data["id"], headers).status_code == 200
+
+
+def test_heatmap_endpoint_unknown_prediction(client):
+    headers = {"Authorization": _get_auth_token(user_id=82)}
+    assert client.get("/predictions/999999/heatmap", headers=headers).status_code == 404
+
+
+def test_heatmap_endpoint_requires_owner_or_admin(client, monkeypatch, image_bytes):
+    """Heatmaps are only served to the prediction's owner or an admin, and anonymous requests queue nothing."""
+    from app.routers import predict as predict_router
+    monkeypatch.setattr(predict_router, "HEATMAP_MODE", "on_demand")
+
+    owner = {"Authorization": _get_auth_token(user_id=83)}
+    files = {"file": ("owned.png", image_bytes(color=(83, 1, 1)), "image/png")}
+    pred_id = client.post("/predict", files=files, headers=owner).json()["id"]
+
+    assert client.get(f"/predictions/{pred_id}/heatmap").status_code == 401
+    other = {"Authorization": _get_auth_token(user_id=84)}
+    assert client.get(f"/predictions/{pred_id}/heatmap", headers=other).status_code == 404
+    assert pred_id not in predict_router._heatmap_jobs
+
+    admin = {"Authorization": _get_auth_token(user_id=85, role="admin")}
+    assert _wait_for_heatmap(client, pred_id, admin).status_code == 200
+    assert client.get(f"/predictions/{pred_id}/heatmap", headers=owner).status_code == 200
+
+
+def test_heatmap_queue_full_returns_503(client, monkeypatch, image_bytes):
+    """A full heatmap pool rejects new jobs with 503 and leaves the heatmap to be requested again."""
+    from app.executor import BoundedExecutor
+    from app.routers import predict as predict_router
+    monkeypatch.setattr(predict_router, "HEATMAP_MODE", "on_demand")
+    busy = BoundedExecutor(max_workers=1, max_queue=0, name="heatmap")
+    monkeypatch.setattr(predict_router, "HEATMAP_EXECUTOR", busy)
+
+    headers = {"Authorization": _get_auth_token(user_id=86)}
+    files = {"file": ("queue_full.png", image_bytes(color=(86, 1, 1)), "image/png")}
+    pred_id = client.post("/predict", files=files, headers=headers).json()["id"]
+
+    busy.acquire()
+    try:
+        response = client.get(f"/predictions/{pred_id}/heatmap", headers=headers)
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+        history = client.get("/history/", headers=headers).json()
+        assert history[0]["heatmap_status"] == "not_requested"
+    finally:
+        busy.release()
+    assert _wait_for_heatmap(client, pred_id, headers).status_code == 200
+    busy.shutdown()
+
+
+def test_stale_pending_heatmap_is_requeued(client, db_session, monkeypatch, image_bytes):
+    """A pending heatmap whose job was lost (e.g. a worker restart) is queued again once stale."""
+    from app import models
+    from app.routers import predict as predict_router
+    monkeypatch.setattr(predict_router, "HEATMAP_MODE", "deferred")
+    # The job is lost: nothing is queued when the prediction is made
+    monkeypatch.setattr(predict_router, "schedule_heatmap", lambda *args: True)
+
+    headers = {"Authorization": _get_auth_token(user_id=87)}
+    files = {"file": ("stale.png", image_bytes(color=(87, 1, 1)), "image/png")}
+    pred_id = client.post("/predict", files=files, headers=headers).json()["id"]
+    monkeypatch.undo()
+    monkeypatch.setattr(predict_router, "HEATMAP_MODE", "deferred")
+
+    # Recently queued: left alone
+    assert client.get(f"/predictions/{pred_id}/heatmap", headers=headers).status_code == 202
+    assert pred_id not in predict_router._heatmap_jobs
+
+    db_session.query(models.Prediction).filter(models.Prediction.id == pred_id).update(
+        {"heatmap_requested_at": None})
+    db_session.commit()
+    assert _wait_for_heatmap(client, pred_id, headers).status_code == 200
+
+
+def test_predict_rejects_oversized_upload(client, monkeypatch, image_bytes):
+    """Uploads over MAX_UPLOAD_BYTES get 413 and leave no temp files behind."""
+    from app.routers import predict as predict_router
+
+    monkeypatch.setattr(predict_router, "MAX_UPLOAD_BYTES", 1024)
+    monkeypatch.setattr(predict_router, "MULTIPART_OVERHEAD_BYTES", 1 << 20)
+    files = {"file": ("big.png", image_bytes(512, 512, (10, 200, 30)), "image/png")}
+
+    response = client.post("/predict", files=files)
+
+    assert response.status_code == 413
+    static_dir = predict_router.get_static_dir()
+    assert not [name for name in os.listdir(static_dir) if name.startswith(".upload-")]
+
+
+def test_predict_rejects_declared_oversized_body_early(client, monkeypatch, image_bytes):
+    """A Content-Length over the limit is refused before the body is parsed."""
+    from app.routers import predict as predict_router
+
+    monkeypatch.setattr(predict_router, "MAX_UPLOAD_BYTES", 1024)
+    monkeypatch.setattr(predict_router, "MULTIPART_OVERHEAD_BYTES", 0)
+    files = {"file": ("big.png", image_bytes(512, 512, (10, 200, 30)), "image/png")}
+
+    response = client.post("/predict", files=files)
+
+    assert response.status_code == 413
+    assert "too large" in response.json()["detail"]
+
+
+def test_hash_upload_reads_the_spooled_file_in_chunks(tmp_path, monkeypatch):
+    """The streamed hash matches hashing the whole file; storing writes it once, atomically."""
+    import hashlib
+    from app.routers import predict as predict_router
+
+    monkeypatch.setattr(predict_router, "UPLOAD_CHUNK_BYTES", 1000)
+    payload = os.urandom(4500)
+    upload = io.BytesIO(payload)
+    digest, size = predict_router._hash_upload(upload, 10_000)
+
+    assert size == len(payload)
+    assert digest == hashlib.sha256(payload).hexdigest()
+    assert os.listdir(tmp_path) == []
+
+    image_path = str(tmp_path / f"{digest}.png")
+    predict_router._store_upload(upload, image_path)
+    with open(image_path, "rb") as f:
+        assert f.read() == payload
+    assert os.listdir(tmp_path) == [f"{digest}.png"]
+
+
+def test_predict_rejects_chunked_oversized_body_while_streaming(client, monkeypatch):
+    """Without Content-Length the body is cut off at the limit, before the endpoint runs."""
+    from app.routers import predict as predict_router
+
+    def not_reached(*args, **kwargs):
+        raise AssertionError("the endpoint ran")
+
+    monkeypatch.setattr(predict_router, "MAX_UPLOAD_BYTES", 1024)
+    monkeypatch.setattr(predict_router, "MULTIPART_OVERHEAD_BYTES", 0)
+    monkeypatch.setattr(predict_router, "_predict", not_reached)
+    boundary = "sv-boundary"
+    head = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.png\"\r\n"
+            "Content-Type: image/png\r\n\r\n").encode()
+
+    def body():
+        yield head
+        for _ in range(8):
+            yield b"\0" * 512
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    response = client.post("/predict", content=body(),
+                           headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+
+    assert response.status_code == 413
+    assert "too large" in response.json()["detail"]
+
+
+def test_upload_limit_stops_reading_a_streamed_body(monkeypatch):
+    """The body is not read past the chunk that crosses the limit."""
+    import asyncio
+    import pytest
+    from fastapi import HTTPException
+    from app.main import UploadSizeLimit
+    from app.routers import predict as predict_router
+
+    monkeypatch.setattr(predict_router, "MAX_UPLOAD_BYTES", 1024)
+    monkeypatch.setattr(predict_router, "MULTIPART_OVERHEAD_BYTES", 0)
+    chunks = [b"\0" * 512] * 8
+    consumed = []
+
+    async def receive():
+        consumed.append(chunks[len(consumed)])
+        return {"type": "http.request", "body": consumed[-1], "more_body": len(consumed) < len(chunks)}
+
+    async def read_body(scope, receive, send):
+        while (await receive()).get("more_body"):
+            pass
+
+    scope = {"type": "http", "method": "POST", "path": "/predict", "headers": []}
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(UploadSizeLimit(read_body)(scope, receive, None))
+    assert exc.value.status_code == 413
+    assert len(consumed) == 3
+
+
+def test_sync_heatmap_reuses_decoded_image(client, monkeypatch, patched_model, image_bytes):
+    """Classification and the overlay share one decode of the upload."""
+    import pytest
+    from app.routers import predict as predict_router
+
+    if predict_router.decode_and_preprocess is None:
+        pytest.skip("model package unavailable")
+    seen = {}
+    original = predict_router.save_heatmap_overlay
+
+    def spy(orig_path, out_dir, **kwargs):
+        seen.update(kwargs)
+        return original(orig_path, out_dir, **kwargs)
+
+    monkeypatch.setattr(predict_router, "save_heatmap_overlay", spy)
+    monkeypatch.setattr(predict_router, "HEATMAP_MODE", "sync")
+
+    files = {"file": ("overlay.png", image_bytes(320, 240, (1, 2, 3)), "image/png")}
+    response = client.post("/predict", files=files)
+
+    assert response.status_code == 200
+    assert response.json()["heatmap_url"]
+    assert seen["image"].size == (320, 240)
+
+
+def test_predict_heatmap_output_settings(client, monkeypatch, image_bytes):
+    """/predict applies HEATMAP_MAX_DIM / HEATMAP_FORMAT and returns a history thumbnail."""
+    from app.routers import predict as predict_router
+
+    if predict_router.thumbnail_path is None:
+        import pytest
+        pytest.skip("model package unavailable")
+    monkeypatch.setattr(predict_router, "HEATMAP_MODE", "sync")
+    monkeypatch.setattr(predict_router, "HEATMAP_MAX_DIM", 300)
+    monkeypatch.setattr(predict_router, "HEATMAP_FORMAT", "jpeg")
+    monkeypatch.setattr(predict_router, "HEATMAP_THUMBNAIL_DIM", 64)
+
+    files = {"file": ("settings.png", image_bytes(600, 450, (200, 120, 90)), "image/png")}
+    response = client.post("/predict", files=files)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["heatmap_url"].endswith(".jpg")
+    static_dir = predict_router.get_static_dir()
+    with Image.open(os.path.join(static_dir, os.path.basename(data["heatmap_url"]))) as heatmap:
+        assert heatmap.size == (300, 225)
+    with Image.open(os.path.join(static_dir, os.path.basename(data["thumbnail_url"]))) as thumb:
+        assert max(thumb.size) == 64
+
+    # The cached result carries the thumbnail too
+    again = client.post("/predict", files=files).json()
+    assert again["thumbnail_url"] == data["thumbnail_url"]
+
+
+def test_reprocess_heatmaps_in_batches(client, db_session, monkeypatch, tiny_model):
+    """Stored predictions without heatmaps are rendered in batches, explaining the recorded class."""
+    import pytest
+    from app import crud, schemas
+    from app.routers import predict as predict_router
+
+    if predict_router.classify_and_explain is None or predict_router.decode_image is None:
+        pytest.skip("model package unavailable")
+    calls = []
+    original = predict_router.classify_and_explain
+
+    def spy(model, batch, **kwargs):
+        calls.append((batch.shape[0], kwargs.get("class_idx")))
+        return original(model, batch, **kwargs)
+
+    monkeypatch.setattr(predict_router, "classify_and_explain", spy)
+    monkeypatch.setattr(predict_router, "MODEL", tiny_model)
+    static_dir = predict_router.get_static_dir()
+
+    ids = []
+    for i, name in enumerate(["Melanoma", "Dermatofibroma", "Vascular_Lesion"]):
+        Image.new("RGB", (300, 200), (40 * i, 90, 120)).save(os.path.join(static_dir, f"reprocess_{i}.png"))
+        pred = crud.create_prediction(db_session, schemas.PredictionCreate(
+            image_url=f"/static/reprocess_{i}.png", predicted_class=name, confidence=0.5,
+            heatmap_status="not_requested"))
+        ids.append(pred.id)
+    missing = crud.create_prediction(db_session, schemas.PredictionCreate(
+        image_url="/static/gone.png", predicted_class="Melanoma", confidence=0.5, heatmap_status="failed"))
+
+    counts = predict_router.reprocess_heatmaps(db_session, batch_size=2, static_dir=static_dir)
+
+    assert counts["ready"] == 3 and counts["skipped"] >= 1
+    # Rows left by other tests have no image file and are skipped, so only check totals
+    assert sum(n for n, _ in calls) == 3 and max(n for n, _ in calls) <= 2
+    assert [target for _, targets in calls for target in targets] == [
+        predict_router.CLASS_NAMES.index(name) for name in ["Melanoma", "Dermatofibroma", "Vascular_Lesion"]
+    ]
+    for pred_id in ids:
+        pred = crud.get_prediction(db_session, pred_id)
+        assert pred.heatmap_status == "ready"
+        assert os.path.exists(os.path.join(static_dir, os.path.basename(pred.heatmap_url)))
+    assert crud.get_prediction(db_session, missing.id).heatmap_status == "failed"
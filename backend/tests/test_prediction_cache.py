@@ -0,0 +1,58 @@
+"""Tests for the content-addressed prediction cache."""
+from app.prediction_cache import PredictionCache
+from app.routers import predict as predict_router
+
+
+def test_lru_evicts_least_recently_used():
+    cache = PredictionCache(max_entries=2)
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})
+    assert cache.get("a") == {"v": 1}
+    cache.put("c", {"v": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.stats()["entries"] == 2
+
+
+def test_zero_size_cache_stores_nothing():
+    cache = PredictionCache(max_entries=0)
+    cache.put("a", {"v": 1})
+    assert cache.get("a") is None
+
+
+def test_reupload_is_served_from_cache(client, monkeypatch, image_bytes):
+    monkeypatch.setattr(predict_router, "PREDICTION_CACHE", PredictionCache(max_entries=16))
+    img_bytes = image_bytes(color=(12, 34, 56))
+
+    first = client.post("/predict", files={"file": ("lesion.png", img_bytes, "image/png")}).json()
+    second = client.post("/predict", files={"file": ("retry.png", img_bytes, "image/png")}).json()
+
+    assert second["id"] != first["id"]
+    assert second["image_url"] == first["image_url"]
+    assert second["heatmap_url"] == first["heatmap_url"]
+    assert second["predicted_class"] == first["predicted_class"]
+    assert second["confidence"] == first["confidence"]
+
+    stats = predict_router.PREDICTION_CACHE.stats()
+    assert stats["misses"] == 1
+    assert stats["memory_hits"] == 1
+
+
+def test_database_tier_serves_results_after_restart(client, monkeypatch, image_bytes):
+    monkeypatch.setattr(predict_router, "PREDICTION_CACHE", PredictionCache(max_entries=16))
+    img_bytes = image_bytes(color=(99, 1, 2))
+    first = client.post("/predict", files={"file": ("a.png", img_bytes, "image/png")}).json()
+
+    # Fresh in-process cache, as after a worker restart
+    monkeypatch.setattr(predict_router, "PREDICTION_CACHE", PredictionCache(max_entries=16))
+    second = client.post("/predict", files={"file": ("b.png", img_bytes, "image/png")}).json()
+
+    assert second["heatmap_url"] == first["heatmap_url"]
+    assert predict_router.PREDICTION_CACHE.stats()["db_hits"] == 1
+
+
+def test_uploads_are_stored_under_content_hash(client, image_bytes):
+    img_bytes = image_bytes(color=(1, 2, 3))
+    data = client.post("/predict", files={"file": ("../../evil name.png", img_bytes, "image/png")}).json()
+    import hashlib
+    assert data["image_url"] == f"/static/{hashlib.sha256(img_bytes).hexdigest()}.png"
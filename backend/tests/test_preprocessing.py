@@ -0,0 +1,92 @@
+"""Tests for the fast upload preprocessing pipeline (model/preprocessing.py)."""
+import io
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+from model.preprocessing import decode_and_preprocess, decode_image, preprocess, preprocess_unit_nhwc, preprocessing_stats
+
+
+def _photo(size=(1600, 1200)) -> Image.Image:
+    base = np.random.default_rng(0).integers(0, 255, (30, 40, 3), dtype=np.uint8)
+    return Image.fromarray(base).resize(size, Image.BICUBIC)
+
+
+def _encode(image: Image.Image, fmt: str) -> bytes:
+    buf = io.BytesIO()
+    image.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def test_matches_torchvision_transform_for_png():
+    torch = pytest.importorskip("torch")
+    from model.model_loader import get_preprocessing_transform
+
+    data = _encode(_photo((640, 480)), "PNG")
+    expected = get_preprocessing_transform()(Image.open(io.BytesIO(data)).convert("RGB")).unsqueeze(0)
+    actual = torch.from_numpy(preprocess(data))
+    assert actual.shape == (1, 3, 224, 224)
+    assert actual.dtype == torch.float32
+    assert torch.allclose(actual, expected, atol=1e-5)
+
+
+def test_jpeg_is_decoded_at_reduced_scale():
+    data = _encode(_photo((1600, 1200)), "JPEG")
+    image = decode_image(data)
+    assert image.mode == "RGB"
+    assert image.size == (200 * 2, 150 * 2)  # 1/4 scale: smallest that still covers 224x224
+    assert min(image.size) >= 224
+
+
+def test_overlay_decode_is_capped_at_max_dim():
+    """The sync heatmap path decodes only as much of a JPEG as an overlay capped at max_dim needs."""
+    data = _encode(_photo((3200, 2400)), "JPEG")
+    image, arr = decode_and_preprocess(data, max_dim=800)
+    assert image.size == (800, 600)  # 1/4 scale still covers an 800 px overlay
+    assert arr.shape == (1, 3, 224, 224)
+    assert np.abs(arr - preprocess(data)).mean() < 0.05
+
+    # Smaller than max_dim, or no cap: decoded at full size
+    assert decode_and_preprocess(data, max_dim=4000)[0].size == (3200, 2400)
+    assert decode_and_preprocess(data)[0].size == (3200, 2400)
+
+
+def test_jpeg_draft_output_stays_close_to_full_decode():
+    pytest.importorskip("torch")
+    from model.model_loader import get_preprocessing_transform
+
+    data = _encode(_photo((1600, 1200)), "JPEG")
+    expected = get_preprocessing_transform()(Image.open(io.BytesIO(data)).convert("RGB")).unsqueeze(0).numpy()
+    assert np.abs(preprocess(data) - expected).mean() < 0.05
+
+
+def test_writes_into_preallocated_buffer():
+    data = _encode(_photo((300, 300)), "PNG")
+    out = np.zeros((1, 3, 224, 224), dtype=np.float32)
+    result = preprocess(data, out=out)
+    assert result is out
+    assert out.any()
+
+
+def test_numpy_fallback_layout():
+    data = _encode(_photo((300, 200)).convert("L"), "PNG")
+    arr = preprocess_unit_nhwc(data)
+    assert arr.shape == (1, 224, 224, 3)
+    assert arr.dtype == np.float32
+    assert 0.0 <= arr.min() and arr.max() <= 1.0
+
+
+def test_stage_timings_are_recorded():
+    before = preprocessing_stats()
+    preprocess(_encode(_photo((300, 300)), "JPEG"))
+    after = preprocessing_stats()
+    for stage in ("decode", "resize", "normalize"):
+        assert after[stage]["count"] == before[stage]["count"] + 1
+        assert after[stage]["p50"] >= 0.0
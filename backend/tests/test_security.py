@@ -0,0 +1,91 @@
+"""Tests for the shared bearer-token dependency and its verified-token cache."""
+import time
+
+import pytest
+from jose import jwt
+
+from app import security
+from app.security import InvalidToken, Principal, TokenCache
+
+
+def _token(user_id=1, role="user", **claims):
+    return jwt.encode({"sub": str(user_id), "role": role, **claims}, security.SECRET, algorithm=security.ALGO)
+
+
+@pytest.fixture()
+def count_decodes(monkeypatch):
+    security.TOKEN_CACHE.clear()
+    calls = []
+    real_decode = security.jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        calls.append(args[0])
+        return real_decode(*args, **kwargs)
+
+    monkeypatch.setattr(security.jwt, "decode", counting_decode)
+    yield calls
+    security.TOKEN_CACHE.clear()
+
+
+def test_verify_token_decodes_once_then_hits_cache(count_decodes):
+    token = _token(user_id=41, role="admin")
+    first = security.verify_token(token)
+    second = security.verify_token(token)
+    assert first == second == Principal(user_id=41, role="admin")
+    assert second.is_admin
+    assert len(count_decodes) == 1
+
+
+def test_expired_and_tampered_tokens_are_rejected(count_decodes):
+    with pytest.raises(InvalidToken):
+        security.verify_token(_token(exp=int(time.time()) - 10))
+    token = _token(user_id=42)
+    security.verify_token(token)
+    with pytest.raises(InvalidToken):
+        security.verify_token(token[:-2] + ("AA" if not token.endswith("AA") else "BB"))
+
+
+def test_cache_entries_expire_at_token_exp():
+    cache = TokenCache(max_entries=4, ttl=300.0)
+    principal = Principal(user_id=1)
+    cache.put("expired", principal, exp=time.time() - 1)
+    cache.put("short", principal, exp=time.time() + 0.05)
+    cache.put("no-exp", principal)
+    assert cache.get("expired") is None
+    assert cache.get("short") == principal
+    time.sleep(0.1)
+    assert cache.get("short") is None
+    assert cache.get("no-exp") == principal
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TokenCache(max_entries=2, ttl=300.0)
+    for i in range(3):
+        cache.put(f"t{i}", Principal(user_id=i))
+    assert cache.get("t0") is None
+    assert cache.get("t2") == Principal(user_id=2)
+
+
+def test_history_request_verifies_token_once(client, count_decodes):
+    headers = {"Authorization": f"Bearer {_token(user_id=43, role='admin')}"}
+    assert client.get("/history/?all=true", headers=headers).status_code == 200
+    assert len(count_decodes) == 1
+    assert client.get("/history/", headers=headers).status_code == 200
+    assert len(count_decodes) == 1
+
+
+def test_history_rejects_missing_and_invalid_tokens(client):
+    assert client.get("/history/").status_code == 401
+    assert client.get("/history/", headers={"Authorization": "Bearer not-a-jwt"}).status_code == 401
+    user = {"Authorization": f"Bearer {_token(user_id=44)}"}
+    assert client.get("/history/?all=true", headers=user).status_code == 403
+    assert client.delete("/history/1", headers={"Authorization": "Bearer not-a-jwt"}).json()["detail"] == "Invalid token"
+
+
+@pytest.mark.parametrize("path", ["/metrics/inference", "/metrics/db", "/metrics/auth", "/metrics/history"])
+def test_metrics_require_admin(client, path):
+    assert client.get(path).status_code == 401
+    user = {"Authorization": f"Bearer {_token(user_id=45)}"}
+    assert client.get(path, headers=user).status_code == 403
+    admin = {"Authorization": f"Bearer {_token(user_id=46, role='admin')}"}
+    assert client.get(path, headers=admin).status_code == 200
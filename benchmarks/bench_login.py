@@ -0,0 +1,100 @@
+"""
+Login throughput benchmark: argon2 verification cost per parameter set.
+
+Usage:
+    python benchmarks/bench_login.py
+    python benchmarks/bench_login.py --costs 3:65536:4 2:19456:1 --workers 2 --requests 64
+
+For each time_cost:memory_cost(KiB):parallelism set, hashes one password and
+then verifies it --requests times concurrently from an asyncio loop, either
+on the loop's default thread pool (shared with every other blocking call in
+the worker, like the threadpool FastAPI runs sync handlers and DB calls on)
+or on the password BoundedExecutor with --workers processes. Reports hash
+time, logins/s, time for each login to complete from the start of the burst,
+and the longest a trivial job probing the shared thread pool every 10 ms had
+to wait for a thread while the logins ran.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+BACKEND_DIR = ROOT_DIR / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.append(str(BACKEND_DIR))
+
+from app.executor import BoundedExecutor
+from app.passwords import hash_password_sync, verify_and_update_sync
+
+PASSWORD = "correct horse battery staple"
+
+
+async def _probe(stop: asyncio.Event, waits: list):
+    # How long other blocking work (DB calls, sync handlers) waits for a shared pool thread
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        submitted = time.perf_counter()
+        started = await loop.run_in_executor(None, time.perf_counter)
+        waits.append((started - submitted) * 1000.0)
+        await asyncio.sleep(0.01)
+
+
+async def _logins(hashed: str, params: tuple, requests: int, executor) -> tuple[float, list, float]:
+    loop = asyncio.get_running_loop()
+    latencies = []
+
+    async def login():
+        # Completion time from the start of the burst, queueing included
+        if executor is None:
+            ok, _ = await loop.run_in_executor(None, verify_and_update_sync, PASSWORD, hashed, params)
+        else:
+            ok, _ = await executor.run(verify_and_update_sync, PASSWORD, hashed, params)
+        assert ok
+        latencies.append((time.perf_counter() - burst_started) * 1000.0)
+
+    stop, waits = asyncio.Event(), []
+    probe = asyncio.create_task(_probe(stop, waits))
+    await asyncio.sleep(0.02)
+    burst_started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(requests)))
+    elapsed = time.perf_counter() - burst_started
+    stop.set()
+    await probe
+    return elapsed, latencies, max(waits, default=0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--costs", nargs="+", default=["3:65536:4", "2:19456:1", "1:47104:1"],
+                        help="time_cost:memory_cost_kib:parallelism")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=32)
+    args = parser.parse_args()
+
+    executor = BoundedExecutor(max_workers=args.workers, max_queue=args.requests, name="password", processes=True)
+    # Start the worker processes before timing
+    asyncio.run(executor.run(hash_password_sync, "warm-up", (1, 8192, 1)))
+    print(f"{args.requests} concurrent logins, password pool: {args.workers} processes")
+    print(f"{'t:m:p':>14} {'hash ms':>8} {'mode':>7} {'logins/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'probe wait ms':>14}")
+    try:
+        for cost in args.costs:
+            params = tuple(int(v) for v in cost.split(":"))
+            started = time.perf_counter()
+            hashed = hash_password_sync(PASSWORD, params)
+            hash_ms = (time.perf_counter() - started) * 1000.0
+            for mode, pool in (("shared", None), ("pool", executor)):
+                elapsed, latencies, wait = asyncio.run(_logins(hashed, params, args.requests, pool))
+                p50, p99 = np.percentile(latencies, [50, 99])
+                print(f"{cost:>14} {hash_ms:>8.1f} {mode:>7} {args.requests / elapsed:>9.1f} {p50:>8.1f} "
+                      f"{p99:>8.1f} {wait:>14.1f}")
+    finally:
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
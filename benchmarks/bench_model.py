@@ -0,0 +1,93 @@
+"""
+CPU latency benchmark: eager model vs. the MODEL_OPTIMIZE variants.
+
+Usage:
+    python benchmarks/bench_model.py
+    python benchmarks/bench_model.py --model model/efficientnet_b0_best.pth --modes trace freeze --batch-sizes 1 8
+
+Without --model the benchmark uses randomly initialised weights (latency does
+not depend on the weight values) and a temporary checkpoint for the artifact
+cache. Reported times exclude the one-off build/compile, which is printed
+separately.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+from model.model_loader import EfficientNetB0Classifier, OPTIMIZE_MODES, load_local_model, optimize_model
+
+
+def _time_forward(model, batch, iterations: int, warmup: int) -> np.ndarray:
+    timings = []
+    with torch.no_grad():
+        for i in range(warmup + iterations):
+            started = time.perf_counter()
+            model(batch)
+            if i >= warmup:
+                timings.append((time.perf_counter() - started) * 1000.0)
+    return np.array(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", help="Checkpoint to benchmark (default: random weights)")
+    parser.add_argument("--modes", nargs="+", default=["trace", "freeze", "compile"],
+                        choices=[m for m in OPTIMIZE_MODES if m != "none"])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    tmp_dir = None
+    if args.model:
+        model_path = Path(args.model)
+        model = load_local_model(model_path)
+        if model is None:
+            sys.exit(f"Could not load {model_path}")
+    else:
+        tmp_dir = tempfile.TemporaryDirectory()
+        model_path = Path(tmp_dir.name) / "random_weights.pth"
+        model = EfficientNetB0Classifier().eval()
+        torch.save(model.state_dict(), model_path)
+
+    variants = {"eager": model}
+    for mode in args.modes:
+        started = time.perf_counter()
+        optimized = optimize_model(model, mode=mode, model_path=model_path)
+        build_s = time.perf_counter() - started
+        if optimized is model:
+            print(f"{mode}: optimization failed, skipped")
+            continue
+        print(f"{mode}: built in {build_s:.1f}s")
+        variants[mode] = optimized
+
+    print(f"\ntorch {torch.__version__}, {torch.get_num_threads()} threads, {args.iterations} iterations")
+    print(f"{'variant':<10}{'batch':>6}{'p50 ms':>10}{'p99 ms':>10}{'speedup':>9}")
+    for batch_size in args.batch_sizes:
+        batch = torch.randn(batch_size, 3, 224, 224)
+        eager_p50 = None
+        for name, variant in variants.items():
+            p50, p99 = np.percentile(_time_forward(variant, batch, args.iterations, args.warmup), [50, 99])
+            eager_p50 = eager_p50 or p50
+            print(f"{name:<10}{batch_size:>6}{p50:>10.1f}{p99:>10.1f}{eager_p50 / p50:>8.2f}x")
+
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
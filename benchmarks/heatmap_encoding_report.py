@@ -0,0 +1,91 @@
+"""
+Heatmap encoding report: output bytes and encode time per format and size.
+
+Usage:
+    python benchmarks/heatmap_encoding_report.py
+    python benchmarks/heatmap_encoding_report.py --image photo.jpg --max-dims 0 2048 1024 --quality 80
+
+Renders one overlay (grad_cam.colorize_and_blend with a smooth Grad-CAM-like
+heatmap) and encodes it with each HEATMAP_FORMAT at each HEATMAP_MAX_DIM
+(0 = original size), reporting file size and the median time of the
+downscale + blend + encode step. Without --image a synthetic 12 MP
+photo-like image is used; real photos compress differently, so pass one for
+numbers that matter.
+"""
+
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+from model.grad_cam import OUTPUT_FORMATS, _fit_within, colorize_and_blend, save_image
+
+
+def _synthetic_photo(size=(4000, 3000)) -> Image.Image:
+    # Smooth low-frequency structure plus mild sensor-like noise
+    rng = np.random.default_rng(0)
+    base = Image.fromarray(rng.integers(0, 255, (24, 32, 3), dtype=np.uint8)).resize(size, Image.BICUBIC)
+    noise = rng.normal(0, 4, (size[1], size[0], 3))
+    return Image.fromarray(np.clip(np.asarray(base) + noise, 0, 255).astype(np.uint8))
+
+
+def _cam() -> Image.Image:
+    y, x = np.mgrid[:224, :224]
+    cam = np.exp(-((x - 140) ** 2 + (y - 100) ** 2) / (2 * 40 ** 2))
+    return Image.fromarray((cam * 255).astype(np.uint8))
+
+
+def _render(image: Image.Image, cam: Image.Image, max_dim: int) -> Image.Image:
+    size = _fit_within(image.size, max_dim or None)
+    if size != image.size:
+        image = image.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return colorize_and_blend(image, cam.resize(size, Image.Resampling.LANCZOS))
+
+
+def _encode(image: Image.Image, fmt: str, quality: int) -> int:
+    buf = io.BytesIO()
+    save_image(image, buf, fmt, quality)
+    return buf.tell()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--image", help="Photo to use (default: synthetic 12 MP image)")
+    parser.add_argument("--formats", nargs="+", default=list(OUTPUT_FORMATS), choices=list(OUTPUT_FORMATS))
+    parser.add_argument("--max-dims", nargs="+", type=int, default=[0, 2048, 1024])
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--iterations", type=int, default=3)
+    args = parser.parse_args()
+
+    image = Image.open(args.image).convert("RGB") if args.image else _synthetic_photo()
+    cam = _cam()
+    print(f"source {image.size[0]}x{image.size[1]}, quality {args.quality}")
+    print(f"{'max_dim':>8} {'format':>6} {'output':>11} {'bytes':>12} {'render ms':>10} {'encode ms':>10}")
+    for max_dim in args.max_dims:
+        timings = []
+        for _ in range(args.iterations):
+            started = time.perf_counter()
+            overlay = _render(image, cam, max_dim)
+            timings.append((time.perf_counter() - started) * 1000.0)
+        render_ms = float(np.median(timings))
+        for fmt in args.formats:
+            timings = []
+            for _ in range(args.iterations):
+                started = time.perf_counter()
+                size = _encode(overlay, fmt, args.quality)
+                timings.append((time.perf_counter() - started) * 1000.0)
+            dims = f"{overlay.size[0]}x{overlay.size[1]}"
+            print(f"{max_dim or 'orig':>8} {fmt:>6} {dims:>11} {size:>12,d} {render_ms:>10.1f} "
+                  f"{float(np.median(timings)):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Accuracy-delta report: INT8 (MODEL_QUANTIZE) vs. the fp32 model on HAM10000.
+
+Usage:
+    python benchmarks/quantization_report.py --model model/efficientnet_b0_best.pth \
+        --images /data/HAM10000 --calibration-samples 128 --eval-samples 1000
+
+Calibration and evaluation images are drawn from data/HAM10000_metadata.csv
+(class-balanced, disjoint sets). The report lists top-1 accuracy of both
+models against the dx labels, per-class accuracy, how often the INT8 model
+agrees with fp32, the mean absolute change in softmax probabilities, and
+CPU latency at batch size 1.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+from model.model_loader import CLASS_NAMES, iter_sample_batches, load_ham10000_samples, load_local_model, quantize_model
+
+
+def _latency_ms(model, iterations: int = 30) -> dict:
+    batch = torch.randn(1, 3, 224, 224)
+    timings = []
+    with torch.no_grad():
+        for i in range(iterations + 5):
+            started = time.perf_counter()
+            model(batch)
+            if i >= 5:
+                timings.append((time.perf_counter() - started) * 1000.0)
+    p50, p99 = np.percentile(timings, [50, 99])
+    return {"p50": float(p50), "p99": float(p99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default=str(ROOT_DIR / "model" / "efficientnet_b0_best.pth"))
+    parser.add_argument("--images", required=True, help="Directory containing the HAM10000 images")
+    parser.add_argument("--mode", default="static", choices=["dynamic", "static"])
+    parser.add_argument("--calibration-samples", type=int, default=128)
+    parser.add_argument("--eval-samples", type=int, default=1000)
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    model = load_local_model(args.model)
+    if model is None:
+        sys.exit(f"Could not load {args.model}")
+    samples = load_ham10000_samples(args.images, limit=args.calibration_samples + args.eval_samples)
+    if len(samples) <= args.calibration_samples:
+        sys.exit(f"Found only {len(samples)} HAM10000 images under {args.images}")
+    # quantize_model calibrates on the same deterministic prefix, so the
+    # evaluation slice never overlaps the calibration images
+    calibration, evaluation = samples[:args.calibration_samples], samples[args.calibration_samples:]
+
+    # No model_path: the report never reads or writes the on-disk artifact cache
+    quantized = quantize_model(model, mode=args.mode, calibration_dir=args.images,
+                               calibration_samples=args.calibration_samples)
+    if quantized is model:
+        sys.exit("Quantization failed")
+
+    labels, fp32_probs, int8_probs = [], [], []
+    with torch.no_grad():
+        for batch, batch_labels in iter_sample_batches(evaluation, batch_size=16):
+            labels.extend(CLASS_NAMES.index(label) for label in batch_labels)
+            fp32_probs.append(torch.softmax(model(batch), dim=1).numpy())
+            int8_probs.append(torch.softmax(quantized(batch), dim=1).numpy())
+    labels = np.array(labels)
+    fp32_probs, int8_probs = np.concatenate(fp32_probs), np.concatenate(int8_probs)
+    fp32_pred, int8_pred = fp32_probs.argmax(1), int8_probs.argmax(1)
+
+    report = {
+        "mode": args.mode,
+        "calibration_images": len(calibration),
+        "eval_images": len(evaluation),
+        "fp32_accuracy": float((fp32_pred == labels).mean()),
+        "int8_accuracy": float((int8_pred == labels).mean()),
+        "top1_agreement": float((fp32_pred == int8_pred).mean()),
+        "mean_abs_prob_delta": float(np.abs(fp32_probs - int8_probs).mean()),
+        "max_abs_prob_delta": float(np.abs(fp32_probs - int8_probs).max()),
+        "per_class": {},
+        "latency_ms": {"fp32": _latency_ms(model), "int8": _latency_ms(quantized)},
+    }
+    report["accuracy_delta"] = report["int8_accuracy"] - report["fp32_accuracy"]
+    for idx, name in enumerate(CLASS_NAMES):
+        mask = labels == idx
+        if mask.any():
+            report["per_class"][name] = {
+                "n": int(mask.sum()),
+                "fp32_accuracy": float((fp32_pred[mask] == idx).mean()),
+                "int8_accuracy": float((int8_pred[mask] == idx).mean()),
+            }
+
+    print(f"\n{args.mode} INT8 vs fp32 on {len(evaluation)} HAM10000 images "
+          f"(calibrated on {len(calibration)})")
+    print(f"  top-1 accuracy: fp32 {report['fp32_accuracy']:.2%}, int8 {report['int8_accuracy']:.2%} "
+          f"(delta {report['accuracy_delta']:+.2%})")
+    print(f"  top-1 agreement: {report['top1_agreement']:.2%}, "
+          f"mean |dp| {report['mean_abs_prob_delta']:.4f}")
+    for name, row in report["per_class"].items():
+        print(f"  {name:<22}{row['n']:>6}  fp32 {row['fp32_accuracy']:.2%}  int8 {row['int8_accuracy']:.2%}")
+    latency = report["latency_ms"]
+    print(f"  latency p50: fp32 {latency['fp32']['p50']:.1f} ms, int8 {latency['int8']['p50']:.1f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
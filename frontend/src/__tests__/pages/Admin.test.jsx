@@ -23,6 +23,19 @@ const mockHistoryData = [
   }
 ]
 
+const mockStats = {
+  total: 1200,
+  avg_confidence: 0.85,
+  by_class: { Melanoma: 700, Nevus: 500 },
+  weekly: [100, 150, 120, 90, 110, 130, 160, 140]
+}
+
+function mockApi(history = mockHistoryData, stats = mockStats) {
+  axios.get.mockImplementation((url) =>
+    Promise.resolve({ data: url.includes('/history/stats') ? stats : history, headers: {} })
+  )
+}
+
 describe('Admin Page', () => {
   beforeEach(() => {
     vi.clearAllMocks()
@@ -30,7 +43,7 @@ describe('Admin Page', () => {
   })
 
   it('renders admin dashboard', async () => {
-    axios.get.mockResolvedValueOnce({ data: mockHistoryData })
+    mockApi()
     
     render(
       <BrowserRouter>
@@ -44,7 +57,7 @@ describe('Admin Page', () => {
   })
 
   it('loads and displays prediction history', async () => {
-    axios.get.mockResolvedValueOnce({ data: mockHistoryData })
+    mockApi()
     
     render(
       <BrowserRouter>
@@ -59,7 +72,7 @@ describe('Admin Page', () => {
   })
 
   it('displays statistics cards', async () => {
-    axios.get.mockResolvedValueOnce({ data: mockHistoryData })
+    mockApi()
     
     render(
       <BrowserRouter>
@@ -74,7 +87,7 @@ describe('Admin Page', () => {
   })
 
   it('handles delete action', async () => {
-    axios.get.mockResolvedValueOnce({ data: mockHistoryData })
+    mockApi()
     axios.delete.mockResolvedValueOnce({ status: 200 })
     
     render(
@@ -89,6 +102,24 @@ describe('Admin Page', () => {
     })
   })
 
+  it('shows server-side totals and fetches a single history page', async () => {
+    mockApi()
+
+    render(
+      <BrowserRouter>
+        <Admin />
+      </BrowserRouter>
+    )
+
+    await waitFor(() => {
+      expect(screen.getAllByText('1200').length).toBeGreaterThan(0)
+      expect(screen.getByText('85.0%')).toBeInTheDocument()
+      expect(screen.getByText(/Latest 2 of 1200 records/)).toBeInTheDocument()
+    })
+    expect(axios.get).toHaveBeenCalledTimes(2)
+    expect(axios.get.mock.calls.map(([url]) => url).some((url) => url.includes('cursor='))).toBe(false)
+  })
+
   it('shows loading state', () => {
     axios.get.mockImplementation(() => new Promise(() => {})) // Never resolves
     
@@ -17,7 +17,7 @@ export default function HistoryTable({ rows = [], onDelete }) {
           {rows.map(r => (
             <tr key={r.id} className="odd:bg-white even:bg-background/50">
               <td className="px-4 py-3 text-text/90">{new Date(r.timestamp).toLocaleString()}</td>
-              <td className="px-4 py-3"><img src={r.image_url} alt="thumb" className="w-12 h-12 rounded" /></td>
+              <td className="px-4 py-3"><img src={r.thumbnail_url || r.image_url} alt="thumb" className="w-12 h-12 rounded" /></td>
               <td className="px-4 py-3 text-text">{r.predicted_class}</td>
               <td className="px-4 py-3 text-text">{(r.confidence * 100).toFixed(0)}%</td>
               <td className="px-4 py-3">
@@ -4,6 +4,7 @@ import HistoryTable from '../components/HistoryTable'
 import axios from 'axios'
 
 const API = import.meta.env.VITE_API_BASE || 'http://localhost:8000'
+const EMPTY_STATS = { total: 0, avg_confidence: null, by_class: {}, weekly: [] }
 
 // Simple SVG Bar Chart Component
 function BarChart({ data, title }) {
@@ -101,6 +102,7 @@ function LineChart({ data, title }) {
 
 export default function Admin() {
   const [rows, setRows] = React.useState([])
+  const [stats, setStats] = React.useState(EMPTY_STATS)
   const [loading, setLoading] = React.useState(true)
 
   async function load() {
@@ -111,10 +113,14 @@ export default function Admin() {
         window.location.href = '/login'
         return
       }
-      const { data } = await axios.get(`${API}/history/?all=true`, { 
-        headers: { Authorization: `Bearer ${token}` } 
-      })
-      setRows(data)
+      // Totals and charts are aggregated by the server; the table shows the newest page only
+      const headers = { Authorization: `Bearer ${token}` }
+      const [statsResponse, historyResponse] = await Promise.all([
+        axios.get(`${API}/history/stats`, { headers }),
+        axios.get(`${API}/history/?all=true`, { headers })
+      ])
+      setStats(statsResponse.data)
+      setRows(historyResponse.data)
     } catch (error) {
       console.error('Failed to load history:', error)
       if (error.response?.status === 401) {
@@ -138,22 +144,8 @@ export default function Admin() {
 
   React.useEffect(() => { load() }, [])
 
-  // Calculate chart data
-  const diseaseCount = rows.reduce((acc, row) => {
-    acc[row.predicted_class] = (acc[row.predicted_class] || 0) + 1
-    return acc
-  }, {})
-
-  // Group by week
-  const weeklyData = React.useMemo(() => {
-    const weeks = {}
-    rows.forEach(row => {
-      const date = new Date(row.timestamp)
-      const week = `${date.getFullYear()}-W${Math.ceil(date.getDate() / 7)}`
-      weeks[week] = (weeks[week] || 0) + 1
-    })
-    return Object.values(weeks).slice(-8) // Last 8 weeks
-  }, [rows])
+  const diseaseCount = stats.by_class
+  const weeklyData = stats.weekly
 
   if (loading) {
     return (
@@ -184,7 +176,7 @@ export default function Admin() {
         <div className="grid md:grid-cols-4 gap-4">
           <div className="bg-white dark:bg-dark-card rounded-2xl shadow-card border border-accent dark:border-dark-border p-4">
             <div className="text-sm text-text/70 dark:text-dark-text/70 mb-1">Total Predictions</div>
-            <div className="text-2xl font-bold text-primary">{rows.length}</div>
+            <div className="text-2xl font-bold text-primary">{stats.total}</div>
           </div>
           <div className="bg-white dark:bg-dark-card rounded-2xl shadow-card border border-accent dark:border-dark-border p-4">
             <div className="text-sm text-text/70 dark:text-dark-text/70 mb-1">Disease Classes</div>
@@ -193,9 +185,7 @@ export default function Admin() {
           <div className="bg-white dark:bg-dark-card rounded-2xl shadow-card border border-accent dark:border-dark-border p-4">
             <div className="text-sm text-text/70 dark:text-dark-text/70 mb-1">Avg Confidence</div>
             <div className="text-2xl font-bold text-primary">
-              {rows.length > 0 
-                ? ((rows.reduce((sum, r) => sum + r.confidence, 0) / rows.length) * 100).toFixed(1)
-                : 0}%
+              {stats.avg_confidence != null ? (stats.avg_confidence * 100).toFixed(1) : 0}%
             </div>
           </div>
           <div className="bg-white dark:bg-dark-card rounded-2xl shadow-card border border-accent dark:border-dark-border p-4">
@@ -211,7 +201,7 @@ export default function Admin() {
           <div className="bg-white dark:bg-dark-card rounded-2xl shadow-card border border-accent dark:border-dark-border p-5">
             <div className="flex items-center justify-between mb-4">
               <h3 className="text-lg font-semibold text-text dark:text-dark-text">Prediction History</h3>
-              <span className="text-sm text-text/60 dark:text-dark-text/60">{rows.length} records</span>
+              <span className="text-sm text-text/60 dark:text-dark-text/60">Latest {rows.length} of {stats.total} records</span>
             </div>
             <div className="overflow-x-auto max-h-96">
               <HistoryTable rows={rows} onDelete={remove} />
@@ -6,11 +6,15 @@ import HeatmapSlider from '../components/HeatmapSlider'
 import axios from 'axios'
 
 const API = import.meta.env.VITE_API_BASE || 'http://localhost:8000'
+// Give up on a heatmap that is not ready after about a minute
+const HEATMAP_POLL_MS = 1500
+const HEATMAP_MAX_POLLS = 40
 
 export default function Result() {
   const location = useLocation()
   const navigate = useNavigate()
   const [result, setResult] = React.useState(null)
+  const [readyHeatmapUrl, setReadyHeatmapUrl] = React.useState(null)
 
   React.useEffect(() => {
     // Get result from location state or sessionStorage
@@ -31,6 +35,44 @@ export default function Result() {
     }
   }, [location.state, navigate])
 
+  // Deferred / on-demand heatmaps: poll until the backend has rendered it
+  React.useEffect(() => {
+    if (!result || result.heatmap_url || !result.id) return
+    const token = localStorage.getItem('token')
+    if (!token) return
+    const url = `${API.replace('/predict', '')}/predictions/${result.id}/heatmap`
+    let cancelled = false
+    let timer
+    let objectUrl
+    let tries = 0
+    const poll = async () => {
+      tries += 1
+      try {
+        // The endpoint needs the bearer token, so the image is fetched here rather than by <img>
+        const res = await fetch(url, { headers: { Authorization: `Bearer ${token}` } })
+        if (cancelled) return
+        if (res.status === 200) {
+          const blob = await res.blob()
+          if (cancelled) return
+          objectUrl = URL.createObjectURL(blob)
+          setReadyHeatmapUrl(objectUrl)
+          return
+        }
+        // 202: still rendering; 503: heatmap queue full, ask again
+        if (res.status !== 202 && res.status !== 503) return
+      } catch (e) {
+        if (cancelled) return
+      }
+      if (tries < HEATMAP_MAX_POLLS) timer = setTimeout(poll, HEATMAP_POLL_MS)
+    }
+    poll()
+    return () => {
+      cancelled = true
+      clearTimeout(timer)
+      if (objectUrl) URL.revokeObjectURL(objectUrl)
+    }
+  }, [result])
+
   if (!result) {
     return (
       <div className="min-h-screen bg-accent dark:bg-dark-bg">
@@ -45,7 +87,9 @@ export default function Result() {
   const { predicted_class: disease, confidence, image_url, heatmap_url } = result
   const apiBase = API.replace('/predict', '')
   const imageUrl = image_url?.startsWith('http') ? image_url : `${apiBase}${image_url}`
-  const heatmapImageUrl = heatmap_url?.startsWith('http') ? heatmap_url : `${apiBase}${heatmap_url}`
+  const heatmapImageUrl = heatmap_url
+    ? (heatmap_url.startsWith('http') ? heatmap_url : `${apiBase}${heatmap_url}`)
+    : readyHeatmapUrl
 
   const severity = confidence >= 0.8 ? 'High' : confidence >= 0.5 ? 'Medium' : 'Low'
   const getAdvice = (severity) => {
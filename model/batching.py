@@ -0,0 +1,149 @@
+"""
+Dynamic micro-batching for model inference.
+
+Concurrent callers submit one preprocessed image each. A background thread
+collects submissions for up to ``max_wait_ms`` (or until ``max_batch_size``
+items are queued), runs them through the model as a single batch and hands
+each result back to the caller that submitted it.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+
+
+class MicroBatcher:
+    """Collects single-item requests into batches for ``batch_fn``.
+
+    ``batch_fn`` receives a list of submitted items and must return a list of
+    results of the same length, in the same order.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        name: str = "inference",
+        latency_window: int = 1000,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.name = name
+
+        self._queue: "queue.Queue[tuple[Any, Future, float]]" = queue.Queue()
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+        self._batch_sizes: Counter = Counter()
+        self._items = 0
+        self._batches = 0
+        self._errors = 0
+        self._queue_wait_ms: deque = deque(maxlen=latency_window)
+        self._batch_ms: deque = deque(maxlen=latency_window)
+
+        self._thread = threading.Thread(target=self._run, name=f"{name}-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue ``item`` for the next batch and return a future for its result."""
+        if self._closed.is_set():
+            raise RuntimeError(f"{self.name} batcher is closed")
+        fut: Future = Future()
+        self._queue.put((item, fut, time.perf_counter()))
+        return fut
+
+    def close(self, timeout: Optional[float] = None):
+        """Stop the worker thread after the queue drains."""
+        self._closed.set()
+        self._thread.join(timeout)
+
+    def _collect(self) -> list:
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                # Still take anything that is already waiting
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._closed.is_set() and self._queue.empty()):
+            # Callers that already gave up are dropped; the rest can no longer be cancelled
+            batch = [entry for entry in self._collect() if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"batch_fn returned {len(results)} results for {len(items)} items"
+                    )
+            except Exception as e:
+                with self._lock:
+                    self._errors += 1
+                for _, fut, _ in batch:
+                    fut.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._batch_sizes[len(batch)] += 1
+                self._batch_ms.append((finished - started) * 1000.0)
+                for _, _, queued_at in batch:
+                    self._queue_wait_ms.append((started - queued_at) * 1000.0)
+
+            for (_, fut, _), result in zip(batch, results):
+                fut.set_result(result)
+
+    def stats(self) -> dict:
+        """Batch-size distribution and queue-wait / batch-time percentiles."""
+        with self._lock:
+            waits = np.array(self._queue_wait_ms, dtype=np.float64)
+            batch_times = np.array(self._batch_ms, dtype=np.float64)
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "batches": self._batches,
+                "items": self._items,
+                "errors": self._errors,
+                "queue_depth": self._queue.qsize(),
+                "mean_batch_size": (self._items / self._batches) if self._batches else 0.0,
+                "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                "queue_wait_ms": _percentiles(waits),
+                "batch_ms": _percentiles(batch_times),
+            }
+
+
+def _percentiles(values: np.ndarray) -> dict:
+    if values.size == 0:
+        return {"p50": 0.0, "p90": 0.0, "p99": 0.0}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {"p50": float(p50), "p90": float(p90), "p99": float(p99)}
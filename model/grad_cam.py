@@ -1,6 +1,9 @@
+import functools
 import os
+import threading
+import weakref
 import numpy as np
-from typing import Tuple, Optional
+from typing import Optional, Sequence, Tuple
 from PIL import Image
 
 # Try importing PyTorch (primary) and TensorFlow (fallback)
@@ -38,73 +41,9 @@ def generate_gradcam_heatmap_pytorch(model, image_tensor: torch.Tensor, layer_na
         raise ValueError("PyTorch or model not available")
     
     try:
-        model.eval()
-        
-        # Find the last convolutional layer if not specified
-        if layer_name is None:
-            for name, module in reversed(list(model.named_modules())):
-                if isinstance(module, torch.nn.Conv2d):
-                    layer_name = name
-                    break
-        
-        if layer_name is None:
-            raise ValueError("No convolutional layer found")
-        
-        # Get the target layer
-        target_layer = dict(model.named_modules())[layer_name]
-        
-        # Hook to capture gradients and activations
-        gradients = []
-        activations = []
-        
-        def backward_hook(module, grad_input, grad_output):
-            gradients.append(grad_output[0])
-        
-        def forward_hook(module, input, output):
-            activations.append(output)
-        
-        handle_backward = target_layer.register_full_backward_hook(backward_hook)
-        handle_forward = target_layer.register_forward_hook(forward_hook)
-        
-        # Forward pass
-        output = model(image_tensor)
-        
-        # Get the predicted class
-        class_idx = output.argmax(dim=1)
-        
-        # Backward pass
-        model.zero_grad()
-        output[0, class_idx].backward()
-        
-        # Get gradients and activations
-        grads = gradients[0]
-        acts = activations[0]
-        
-        # Global average pooling of gradients
-        pooled_grads = torch.mean(grads, dim=[2, 3], keepdim=True)
-        
-        # Weight the activations by gradients
-        heatmap = torch.sum(acts * pooled_grads, dim=1, keepdim=True)
-        heatmap = F.relu(heatmap)  # ReLU to get positive values only
-        
-        # Normalize
-        heatmap = heatmap.squeeze().cpu().numpy()
-        heatmap = np.maximum(heatmap, 0)
-        if heatmap.max() > 0:
-            heatmap /= heatmap.max()
-        
-        # Resize to original image size (224x224)
-        from torchvision.transforms import functional as F_t
-        heatmap_tensor = torch.from_numpy(heatmap).unsqueeze(0).unsqueeze(0)
-        heatmap_resized = F_t.resize(heatmap_tensor, (224, 224), interpolation=Image.Resampling.BILINEAR)
-        heatmap = heatmap_resized.squeeze().numpy()
-        
-        # Cleanup hooks
-        handle_backward.remove()
-        handle_forward.remove()
-        
-        return heatmap
-        
+        # Cached per model: no layer search or hook registration per call
+        _, heatmaps = get_gradcam(model, layer_name)(image_tensor[:1])
+        return heatmaps[0]
     except Exception as e:
         print(f"PyTorch Grad-CAM failed: {e}. Using fallback visualization.")
         # Fallback: center-focused gradient
@@ -118,6 +57,155 @@ def generate_gradcam_heatmap_pytorch(model, image_tensor: torch.Tensor, layer_na
         return heatmap
 
 
+def _find_last_conv_layer(model) -> Optional[str]:
+    for name, module in reversed(list(model.named_modules())):
+        if isinstance(module, torch.nn.Conv2d):
+            return name
+    return None
+
+
+class GradCAM:
+    """
+    Grad-CAM for one model, set up once and reused for every call.
+
+    The target layer (the last Conv2d unless layer_name is given) is resolved
+    when the object is created, and a single forward hook stays registered
+    on it. The hook only records activations for threads that are inside
+    __call__ (thread-local), so plain inference through the same model is
+    unaffected and concurrent calls from several threads do not mix
+    activations.
+
+    Calling it with an (N, C, H, W) batch returns class probabilities and
+    heatmaps for all N images from one forward and one backward pass. The
+    backward pass stops at the target layer.
+    """
+
+    def __init__(self, model, layer_name: Optional[str] = None, output_size: Tuple[int, int] = (224, 224)):
+        if not TORCH_AVAILABLE or model is None:
+            raise ValueError("PyTorch or model not available")
+        if layer_name is None:
+            layer_name = _find_last_conv_layer(model)
+        if layer_name is None:
+            raise ValueError("No convolutional layer found")
+        # Weak, so the per-model cache below does not keep the model alive
+        self._model = weakref.ref(model)
+        self.layer_name = layer_name
+        self.output_size = output_size
+        self.target_layer = dict(model.named_modules())[layer_name]
+        self._local = threading.local()
+        self._handle = self.target_layer.register_forward_hook(self._capture)
+
+    @property
+    def model(self):
+        model = self._model()
+        if model is None:
+            raise ReferenceError("The model of this GradCAM has been garbage collected")
+        return model
+
+    def _capture(self, module, inputs, output):
+        activations = getattr(self._local, "activations", None)
+        if activations is not None:
+            activations.append(output)
+
+    def __call__(self, image_tensor: "torch.Tensor", output_size: Optional[Tuple[int, int]] = None,
+                 class_idx: Optional[Sequence[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (probabilities (N, num_classes), heatmaps (N, H, W) in [0, 1]) for a
+        normalized batch. Heatmaps explain each image's top class, or the
+        classes given in class_idx (one per image).
+        """
+        model = self.model
+        model.eval()
+        device = next(model.parameters()).device
+        x = image_tensor.to(device)
+        if not any(p.requires_grad for p in model.parameters()):
+            # Frozen weights: make the input carry the graph instead
+            x = x.detach().requires_grad_(True)
+
+        self._local.activations = []
+        try:
+            with torch.enable_grad():
+                logits = model(x)
+                acts = self._local.activations[-1]
+                if class_idx is None:
+                    targets = logits.argmax(dim=1, keepdim=True)
+                else:
+                    targets = torch.as_tensor(class_idx, dtype=torch.long, device=logits.device).view(-1, 1)
+                    if targets.shape[0] != logits.shape[0]:
+                        raise ValueError(f"class_idx has {targets.shape[0]} entries for {logits.shape[0]} images")
+                # Samples are independent in eval mode, so the gradient of the summed
+                # target-class scores gives each sample its own gradient.
+                score = logits.gather(1, targets).sum()
+                grads, = torch.autograd.grad(score, acts)
+        finally:
+            self._local.activations = None
+
+        with torch.no_grad():
+            probabilities = F.softmax(logits.detach(), dim=1)
+            weights = grads.mean(dim=(2, 3), keepdim=True)
+            cam = F.relu((acts.detach() * weights).sum(dim=1, keepdim=True))
+            cam_max = cam.amax(dim=(2, 3), keepdim=True)
+            cam = cam / torch.where(cam_max > 0, cam_max, torch.ones_like(cam_max))
+            cam = F.interpolate(cam, size=output_size or self.output_size, mode="bilinear", align_corners=False)
+            heatmaps = cam.squeeze(1).clamp_(0, 1)
+
+        return probabilities.cpu().numpy(), heatmaps.cpu().numpy()
+
+    def close(self):
+        """Remove the hook from the model."""
+        self._handle.remove()
+
+
+# model -> {layer_name: GradCAM}; GradCAM holds the model weakly, so entries go away with the model
+_GRADCAMS = weakref.WeakKeyDictionary()
+_GRADCAMS_LOCK = threading.Lock()
+
+
+def get_gradcam(model, layer_name: Optional[str] = None) -> GradCAM:
+    """The shared GradCAM for a model and target layer, created on first use."""
+    with _GRADCAMS_LOCK:
+        per_model = _GRADCAMS.setdefault(model, {})
+        gradcam = per_model.get(layer_name)
+        if gradcam is None:
+            gradcam = per_model[layer_name] = GradCAM(model, layer_name)
+        return gradcam
+
+
+def classify_and_explain(model, image_tensor: "torch.Tensor", layer_name: Optional[str] = None,
+                         output_size: Tuple[int, int] = (224, 224),
+                         class_idx: Optional[Sequence[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Classify images and compute their Grad-CAM heatmaps from a single forward pass.
+
+    The class probabilities come from the same forward pass that records the
+    target layer's activations, and gradients are taken only with respect to
+    those activations, so the backward pass stops at the target layer instead
+    of running through the whole network. Uses the model's cached GradCAM.
+
+    Args:
+        model: PyTorch model
+        image_tensor: Normalized image tensor (N, C, H, W)
+        layer_name: Optional layer name (defaults to last conv layer)
+        output_size: Size (H, W) of the returned heatmaps
+        class_idx: Optional class to explain per image (default: predicted class)
+
+    Returns:
+        (probabilities (N, num_classes), heatmaps (N, H, W) in [0, 1])
+    """
+    if not TORCH_AVAILABLE or model is None:
+        raise ValueError("PyTorch or model not available")
+    return get_gradcam(model, layer_name)(image_tensor, output_size, class_idx)
+
+
+def generate_gradcam_heatmaps_pytorch(model, image_tensor: "torch.Tensor", layer_name: Optional[str] = None,
+                                      class_idx: Optional[Sequence[int]] = None) -> np.ndarray:
+    """
+    Batched generate_gradcam_heatmap_pytorch: (N, C, H, W) -> (N, 224, 224)
+    heatmaps from one forward and one backward pass.
+    """
+    return classify_and_explain(model, image_tensor, layer_name, class_idx=class_idx)[1]
+
+
 def generate_gradcam_heatmap(model, image_array: np.ndarray, layer_name: Optional[str] = None) -> np.ndarray:
     """
     Generate Grad-CAM heatmap (supports both PyTorch and TensorFlow).
@@ -200,7 +288,108 @@ def generate_gradcam_heatmap(model, image_array: np.ndarray, layer_name: Optiona
     return heatmap
 
 
-def save_heatmap_overlay(orig_path: str, out_dir: str, model=None, preprocessed_img: Optional[np.ndarray] = None) -> str:
+# Red-yellow colormap as a 256-entry RGBA table indexed by heatmap intensity:
+# R = v, G = 200/255 v, B = 50/255 v, alpha = 180/255 v (semi-transparent)
+_HEATMAP_LUT = (np.arange(256, dtype=np.uint32)[:, None] * np.array([255, 200, 50, 180], dtype=np.uint32)
+                // 255).astype(np.uint8)
+# The same table in Image.point() layout: 768 RGB entries for the colors, 256 for alpha
+_HEATMAP_RGB_POINT = _HEATMAP_LUT[:, :3].T.ravel().tolist()
+_HEATMAP_ALPHA_POINT = _HEATMAP_LUT[:, 3].tolist()
+
+
+# Largest side the fallback gradient is computed and cached at; bigger sizes are
+# upscaled from it (the gradient is smooth), so the cache stays small
+_GRADIENT_MAX_DIM = 512
+
+
+@functools.lru_cache(maxsize=16)
+def _bounded_center_gradient(w: int, h: int) -> Image.Image:
+    center_y, center_x = h // 2, w // 2
+    y, x = np.ogrid[:h, :w]
+    dist = np.sqrt((x - center_x)**2 + (y - center_y)**2)
+    max_dist = np.sqrt(center_x**2 + center_y**2)
+    arr = 1 - np.clip(dist / max(max_dist, 1e-6), 0, 1)
+    return Image.fromarray((arr * 255).astype(np.uint8))
+
+
+def _center_gradient(w: int, h: int) -> Image.Image:
+    """
+    Center-focused fallback heatmap (mode "L") for a given image size.
+    Cached per size up to _GRADIENT_MAX_DIM and resized from the cached copy
+    above it; callers must not modify the returned image.
+    """
+    scale = _GRADIENT_MAX_DIM / max(w, h)
+    if scale >= 1:
+        return _bounded_center_gradient(w, h)
+    small = _bounded_center_gradient(max(1, round(w * scale)), max(1, round(h * scale)))
+    return small.resize((w, h), Image.BILINEAR)
+
+
+def colorize_and_blend(image: Image.Image, heatmap: Image.Image) -> Image.Image:
+    """
+    Tint an RGB image with a mode "L" heatmap of the same size.
+
+    The colormap is a single table lookup (Image.point with _HEATMAP_LUT)
+    and the blend is a uint8 Image.composite with the alpha channel as mask,
+    so no float or RGBA copies of the full-resolution image are made.
+    """
+    colored = heatmap.convert("RGB").point(_HEATMAP_RGB_POINT)
+    return Image.composite(colored, image, heatmap.point(_HEATMAP_ALPHA_POINT))
+
+
+# Output encoders: name -> (Pillow format, file extension)
+OUTPUT_FORMATS = {
+    "png": ("PNG", ".png"),
+    "jpeg": ("JPEG", ".jpg"),
+    "webp": ("WEBP", ".webp"),
+}
+
+
+def _fit_within(size: Tuple[int, int], max_dim: Optional[int]) -> Tuple[int, int]:
+    """Scale (w, h) down so the longer side is at most max_dim (never up)."""
+    w, h = size
+    if not max_dim or max(w, h) <= max_dim:
+        return size
+    scale = max_dim / max(w, h)
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+
+def _output_path(out_dir: str, prefix: str, orig_path: str, fmt: Optional[str]) -> str:
+    name = os.path.basename(orig_path)
+    if fmt is not None:
+        name = os.path.splitext(name)[0] + OUTPUT_FORMATS[fmt][1]
+    return os.path.join(out_dir, f"{prefix}{name}")
+
+
+def thumbnail_path(orig_path: str, out_dir: str, fmt: Optional[str] = None) -> str:
+    """Where save_heatmap_overlay(..., thumbnail_dim=...) writes the thumbnail of orig_path."""
+    return _output_path(out_dir, "thumb_", orig_path, fmt)
+
+
+def save_image(image: Image.Image, path: str, fmt: Optional[str] = None, quality: Optional[int] = None):
+    """
+    Encode an RGB image. fmt=None infers the format from the file extension
+    (Pillow defaults); quality applies to JPEG and WebP (1-100).
+    """
+    if fmt is None:
+        image.save(path)
+        return
+    pil_format, _ = OUTPUT_FORMATS[fmt]
+    options = {}
+    if fmt in ("jpeg", "webp") and quality is not None:
+        options["quality"] = quality
+    if fmt == "jpeg":
+        options["optimize"] = True
+    elif fmt == "webp":
+        # method 2 encodes ~2.5x faster than the default 4 for ~4% larger files
+        options["method"] = 2
+    image.save(path, format=pil_format, **options)
+
+
+def save_heatmap_overlay(orig_path: str, out_dir: str, model=None, preprocessed_img: Optional[np.ndarray] = None,
+                         heatmap: Optional[np.ndarray] = None, image: Optional[Image.Image] = None,
+                         max_dim: Optional[int] = None, fmt: Optional[str] = None, quality: Optional[int] = None,
+                         thumbnail_dim: Optional[int] = None) -> str:
     """
     Generate and save a heatmap overlay visualization.
     
@@ -209,6 +398,17 @@ def save_heatmap_overlay(orig_path: str, out_dir: str, model=None, preprocessed_
         out_dir: Directory to save heatmap
         model: Optional PyTorch or TensorFlow model for Grad-CAM
         preprocessed_img: Optional preprocessed image array (224x224 normalized)
+        heatmap: Optional precomputed heatmap (H, W) in [0, 1], e.g. from
+            classify_and_explain(); skips Grad-CAM entirely
+        image: Optional already-decoded RGB original, so the file at
+            orig_path is not decoded a second time
+        max_dim: Optional cap on the longer side of the output; the
+            original is downscaled before blending
+        fmt: Optional encoder ("png", "jpeg", "webp"); by default the
+            format follows the upload's file extension
+        quality: Optional JPEG/WebP quality (1-100)
+        thumbnail_dim: Optional size of an extra thumbnail of the original
+            (for history lists), written to thumbnail_path(orig_path, out_dir, fmt)
     
     Returns:
         Path to saved heatmap image
@@ -216,55 +416,37 @@ def save_heatmap_overlay(orig_path: str, out_dir: str, model=None, preprocessed_
     os.makedirs(out_dir, exist_ok=True)
     
     # Load original image
-    image = Image.open(orig_path).convert("RGB")
-    orig_size = image.size
+    if fmt is not None and fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"fmt must be one of {sorted(OUTPUT_FORMATS)}")
+    if image is None:
+        image = Image.open(orig_path).convert("RGB")
+    # Blend at the output size: the heatmap is upsampled straight to it
+    orig_size = _fit_within(image.size, max_dim)
+    if orig_size != image.size:
+        image = image.resize(orig_size, Image.Resampling.BILINEAR, reducing_gap=2.0)
     w, h = orig_size
+    if thumbnail_dim:
+        thumbnail = image.resize(_fit_within(orig_size, thumbnail_dim), Image.Resampling.BILINEAR,
+                                 reducing_gap=2.0)
+        save_image(thumbnail, thumbnail_path(orig_path, out_dir, fmt), fmt, quality)
     
     # Generate heatmap
-    if model is not None and preprocessed_img is not None:
+    if heatmap is not None:
+        heatmap_pil = Image.fromarray((heatmap * 255).astype(np.uint8)).resize(orig_size, Image.Resampling.LANCZOS)
+    elif model is not None and preprocessed_img is not None:
         try:
             heatmap = generate_gradcam_heatmap(model, preprocessed_img)
             # Resize heatmap to original image size
             heatmap_pil = Image.fromarray((heatmap * 255).astype(np.uint8)).resize(orig_size, Image.Resampling.LANCZOS)
         except Exception as e:
             print(f"Heatmap generation failed: {e}, using fallback")
-            # Fallback: simple center-focused gradient
-            arr = np.zeros((h, w), dtype=np.float32)
-            center_y, center_x = h // 2, w // 2
-            y, x = np.ogrid[:h, :w]
-            dist = np.sqrt((x - center_x)**2 + (y - center_y)**2)
-            max_dist = np.sqrt(center_x**2 + center_y**2)
-            arr = 1 - np.clip(dist / max_dist, 0, 1)
-            heatmap_pil = Image.fromarray((arr * 255).astype(np.uint8))
+            heatmap_pil = _center_gradient(w, h)
     else:
-        # Fallback: simple center-focused gradient
-        arr = np.zeros((h, w), dtype=np.float32)
-        center_y, center_x = h // 2, w // 2
-        y, x = np.ogrid[:h, :w]
-        dist = np.sqrt((x - center_x)**2 + (y - center_y)**2)
-        max_dist = np.sqrt(center_x**2 + center_y**2)
-        arr = 1 - np.clip(dist / max_dist, 0, 1)
-        heatmap_pil = Image.fromarray((arr * 255).astype(np.uint8))
-    
-    # Create colored heatmap (red-yellow colormap)
-    heatmap_colored = Image.new("RGB", orig_size, (0, 0, 0))
-    heatmap_arr = np.array(heatmap_pil).astype(np.float32) / 255.0
-    
-    # Apply red-yellow colormap
-    heatmap_rgb = np.zeros((h, w, 3), dtype=np.uint8)
-    heatmap_rgb[:, :, 0] = (heatmap_arr * 255).astype(np.uint8)  # Red
-    heatmap_rgb[:, :, 1] = (heatmap_arr * 200).astype(np.uint8)  # Yellow component
-    heatmap_rgb[:, :, 2] = (heatmap_arr * 50).astype(np.uint8)   # Low blue
-    
-    heatmap_colored = Image.fromarray(heatmap_rgb)
-    
-    # Blend with original image
-    overlay = heatmap_colored.convert("RGBA")
-    overlay.putalpha(Image.fromarray((heatmap_arr * 180).astype(np.uint8)))  # Semi-transparent
+        heatmap_pil = _center_gradient(w, h)
     
-    blended = Image.alpha_composite(image.convert("RGBA"), overlay)
+    blended = colorize_and_blend(image, heatmap_pil)
     
     # Save
-    out_path = os.path.join(out_dir, f"heatmap_{os.path.basename(orig_path)}")
-    blended.convert("RGB").save(out_path)
+    out_path = _output_path(out_dir, "heatmap_", orig_path, fmt)
+    save_image(blended, out_path, fmt, quality)
     return out_path
@@ -0,0 +1,159 @@
+"""
+Client for the out-of-process inference server (model/inference_server.py).
+
+Pure Python (standard library only) so API workers can talk to the server
+without importing torch.
+
+Wire protocol, in both directions, over a Unix domain socket:
+
+    4-byte big-endian header length | JSON header | payload (header["size"] bytes)
+
+Requests:
+    {"op": "predict", "size": n, "explain": bool} + raw image bytes
+    {"op": "info"}
+Responses:
+    {"ok": true, "predicted_class": str, "confidence": float,
+     "heatmap_shape": [h, w] | null, "size": n} + uint8 heatmap bytes (row-major)
+    {"ok": false, "error": str}
+"""
+
+from __future__ import annotations
+
+import json
+import socket
+import struct
+import threading
+from typing import NamedTuple, Optional
+
+_HEADER_LEN = struct.Struct(">I")
+MAX_HEADER_BYTES = 64 * 1024
+
+# Failures while connecting or sending: the request was not processed, so it is safe to retry once
+_NOT_DELIVERED = (ConnectionRefusedError, FileNotFoundError, BrokenPipeError, ConnectionResetError)
+
+
+class InferenceError(RuntimeError):
+    """Raised when the inference server reports an error or cannot be reached."""
+
+
+class InferenceResult(NamedTuple):
+    predicted_class: str
+    confidence: float
+    heatmap: Optional[bytes]  # uint8, row-major, heatmap_shape[0] x heatmap_shape[1]
+    heatmap_shape: Optional[tuple]
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    chunks = []
+    remaining = n
+    while remaining:
+        chunk = sock.recv(min(remaining, 1 << 20))
+        if not chunk:
+            raise ConnectionError("connection closed mid-frame")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def send_frame(sock: socket.socket, header: dict, payload: bytes = b"") -> None:
+    header = dict(header, size=len(payload))
+    raw = json.dumps(header).encode("utf-8")
+    sock.sendall(_HEADER_LEN.pack(len(raw)) + raw)
+    if payload:
+        sock.sendall(payload)
+
+
+def recv_frame(sock: socket.socket, max_payload: Optional[int] = None) -> tuple[dict, bytes]:
+    """
+    Read one frame; returns (header, payload). Raises ConnectionError on EOF
+    and ValueError on a malformed frame.
+    """
+    first = sock.recv(_HEADER_LEN.size)
+    if not first:
+        raise ConnectionError("connection closed")
+    if len(first) < _HEADER_LEN.size:
+        first += _recv_exact(sock, _HEADER_LEN.size - len(first))
+    (header_len,) = _HEADER_LEN.unpack(first)
+    if header_len > MAX_HEADER_BYTES:
+        raise ValueError(f"frame header too large ({header_len} bytes)")
+    header = json.loads(_recv_exact(sock, header_len))
+    if not isinstance(header, dict):
+        raise ValueError("frame header is not a JSON object")
+    size = int(header.get("size", 0))
+    if max_payload is not None and size > max_payload:
+        raise ValueError(f"frame payload too large ({size} bytes)")
+    payload = _recv_exact(sock, size) if size else b""
+    return header, payload
+
+
+class InferenceClient:
+    """
+    Thread-safe client: each thread keeps its own persistent connection and
+    reconnects once if the server dropped it before the request was sent.
+    Failures after that (including timeouts) are raised, never retried, so a
+    slow request is not run twice.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def _request(self, header: dict, payload: bytes = b"") -> tuple[dict, bytes]:
+        for attempt in (1, 2):
+            sock = getattr(self._local, "sock", None)
+            try:
+                if sock is None:
+                    sock = self._local.sock = self._connect()
+                send_frame(sock, header, payload)
+            except _NOT_DELIVERED as e:
+                # The server never received the request (restarted, or it dropped an idle connection)
+                self.close()
+                if attempt == 2:
+                    raise InferenceError(f"inference server unavailable at {self.socket_path}: {e}") from e
+                continue
+            except OSError as e:
+                self.close()
+                raise InferenceError(f"inference server request failed: {e}") from e
+            try:
+                response, body = recv_frame(sock)
+            except (OSError, ValueError) as e:
+                # Includes timeouts and garbled or truncated frames: the server may still be
+                # running the request, so it is not sent again
+                self.close()
+                raise InferenceError(f"inference server request failed: {e}") from e
+            break
+        if not response.get("ok"):
+            raise InferenceError(response.get("error", "unknown inference server error"))
+        return response, body
+
+    def predict(self, image_bytes: bytes, explain: bool = True) -> InferenceResult:
+        """Classify raw image bytes; with ``explain`` also return the Grad-CAM heatmap."""
+        response, body = self._request({"op": "predict", "explain": explain}, image_bytes)
+        shape = tuple(response["heatmap_shape"]) if response.get("heatmap_shape") else None
+        return InferenceResult(
+            predicted_class=response["predicted_class"],
+            confidence=float(response["confidence"]),
+            heatmap=body or None,
+            heatmap_shape=shape,
+        )
+
+    def info(self) -> dict:
+        """Server metadata: model version, stub mode and batching stats."""
+        response, _ = self._request({"op": "info"})
+        return response
+
+    def close(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
@@ -0,0 +1,223 @@
+"""
+Standalone inference server.
+
+Owns the EfficientNet model and the Grad-CAM pipeline and serves API workers
+over a Unix domain socket (protocol in model/inference_client.py). Requests
+from all connected workers go through one micro-batcher, so API and inference
+processes can be scaled independently.
+
+Usage:
+    python -m model.inference_server --socket /tmp/skinvision-inference.sock
+    python -m model.inference_server --socket /tmp/skinvision-inference.sock --stub
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import os
+import socketserver
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from .batching import MicroBatcher
+from .inference_client import recv_frame, send_frame
+from .preprocessing import preprocess, preprocessing_stats
+
+DEFAULT_SOCKET_PATH = "/tmp/skinvision-inference.sock"
+MAX_IMAGE_BYTES = 50 * 1024 * 1024
+HEATMAP_SIZE = (224, 224)
+STUB_CLASS_NAMES = ["Melanoma"]
+
+
+def _center_gradient(h: int, w: int) -> np.ndarray:
+    y, x = np.ogrid[:h, :w]
+    center_y, center_x = h // 2, w // 2
+    dist = np.sqrt((x - center_x) ** 2 + (y - center_y) ** 2)
+    max_dist = np.sqrt(center_x ** 2 + center_y ** 2)
+    return np.clip(1 - dist / max_dist, 0, 1)
+
+
+class InferencePipeline:
+    """Preprocess -> batched classify (+ Grad-CAM) for raw image bytes."""
+
+    def __init__(self, model=None, model_path: Optional[str] = None, device: str = "cpu", stub: bool = False,
+                 max_batch_size: int = 8, max_wait_ms: float = 5.0, optimize: Optional[str] = None,
+                 quantize: Optional[str] = None):
+        self.stub = stub
+        self.device = device
+        self.model = None
+        self.model_version = "stub"
+        if not stub:
+            from .model_loader import (CLASS_NAMES, DEFAULT_MODEL_PATH, load_local_model, optimize_model,
+                                       quantize_model)
+            self.class_names = CLASS_NAMES
+            self.model = model if model is not None else load_local_model(model_path, device=device)
+            if self.model is None:
+                raise RuntimeError(f"could not load model from {model_path}")
+            self.model_version = self._version_for(model_path) if model is None else "in-memory"
+            # Grad-CAM needs the float model; classify-only batches can use an INT8 or optimized variant
+            checkpoint = (model_path or DEFAULT_MODEL_PATH) if model is None else None
+            quantize = (quantize or os.environ.get("MODEL_QUANTIZE", "none")).lower()
+            if quantize != "none" and device == "cpu":
+                self.classifier = quantize_model(self.model, mode=quantize, model_path=checkpoint)
+            else:
+                self.classifier = optimize_model(self.model, mode=optimize, model_path=checkpoint, device=device)
+        else:
+            self.class_names = STUB_CLASS_NAMES
+        self.batcher = MicroBatcher(self._run_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+    @staticmethod
+    def _version_for(model_path: Optional[str]) -> str:
+        from .model_loader import DEFAULT_MODEL_PATH
+        path = Path(model_path or DEFAULT_MODEL_PATH)
+        stat = path.stat()
+        return f"{path.name}:{stat.st_size}:{int(stat.st_mtime)}"
+
+    def _preprocess(self, image_bytes: bytes):
+        import torch
+
+        return torch.from_numpy(preprocess(image_bytes))
+
+    def _run_batch(self, items: list) -> list:
+        import torch
+        from .grad_cam import classify_and_explain
+
+        tensors = [tensor for tensor, _ in items]
+        batch = torch.cat(tensors, dim=0).to(self.device)
+        if any(explain for _, explain in items):
+            probabilities, heatmaps = classify_and_explain(self.model, batch, output_size=HEATMAP_SIZE)
+        else:
+            with torch.no_grad():
+                probabilities = torch.softmax(self.classifier(batch), dim=1).cpu().numpy()
+            heatmaps = [None] * len(items)
+        results = []
+        for (_, explain), probs, heatmap in zip(items, probabilities, heatmaps):
+            idx = int(probs.argmax())
+            predicted = self.class_names[idx] if idx < len(self.class_names) else self.class_names[0]
+            results.append((predicted, float(probs[idx]), heatmap if explain else None))
+        return results
+
+    def predict(self, image_bytes: bytes, explain: bool = True):
+        """Returns (predicted_class, confidence, heatmap (H, W) float array or None)."""
+        if self.stub:
+            # Validate the upload the same way the real pipeline would
+            Image.open(io.BytesIO(image_bytes)).verify()
+            heatmap = _center_gradient(*HEATMAP_SIZE) if explain else None
+            return self.class_names[0], 0.92, heatmap
+        tensor = self._preprocess(image_bytes)
+        return self.batcher.submit((tensor, explain)).result()
+
+    def info(self) -> dict:
+        return {
+            "model_version": self.model_version,
+            "stub": self.stub,
+            "pid": os.getpid(),
+            "batching": self.batcher.stats(),
+            "preprocessing": preprocessing_stats(),
+        }
+
+    def close(self):
+        self.batcher.close(timeout=5)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        pipeline: InferencePipeline = self.server.pipeline
+        while True:
+            try:
+                header, payload = recv_frame(self.request, max_payload=MAX_IMAGE_BYTES)
+            except (ConnectionError, OSError):
+                return
+            except ValueError as e:
+                send_frame(self.request, {"ok": False, "error": str(e)})
+                return
+            try:
+                op = header.get("op")
+                if op == "predict":
+                    predicted, confidence, heatmap = pipeline.predict(payload, explain=bool(header.get("explain", True)))
+                    body = b""
+                    shape = None
+                    if heatmap is not None:
+                        heatmap_u8 = (np.clip(heatmap, 0, 1) * 255).astype(np.uint8)
+                        body, shape = heatmap_u8.tobytes(), list(heatmap_u8.shape)
+                    send_frame(self.request, {
+                        "ok": True,
+                        "predicted_class": predicted,
+                        "confidence": confidence,
+                        "heatmap_shape": shape,
+                    }, body)
+                elif op == "info":
+                    send_frame(self.request, dict(pipeline.info(), ok=True))
+                else:
+                    send_frame(self.request, {"ok": False, "error": f"unknown op {op!r}"})
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                send_frame(self.request, {"ok": False, "error": str(e)})
+
+
+class InferenceServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, pipeline: InferencePipeline):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.socket_path = socket_path
+        self.pipeline = pipeline
+        super().__init__(socket_path, _Handler)
+
+    def start_in_thread(self) -> threading.Thread:
+        """Serve on a daemon thread (used by tests and embedded setups)."""
+        thread = threading.Thread(target=self.serve_forever, name="inference-server", daemon=True)
+        thread.start()
+        return thread
+
+    def server_close(self):
+        super().server_close()
+        self.pipeline.close()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SkinVision out-of-process inference server")
+    parser.add_argument("--socket", default=os.environ.get("INFERENCE_SOCKET", DEFAULT_SOCKET_PATH))
+    parser.add_argument("--model", default=os.environ.get("MODEL_PATH"))
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--stub", action="store_true", help="Serve fixed predictions without loading a model")
+    parser.add_argument("--max-batch-size", type=int, default=int(os.environ.get("BATCH_MAX_SIZE", "8")))
+    parser.add_argument("--max-wait-ms", type=float, default=float(os.environ.get("BATCH_MAX_WAIT_MS", "5")))
+    parser.add_argument("--optimize", default=os.environ.get("MODEL_OPTIMIZE", "none"),
+                        choices=["none", "trace", "freeze", "compile"])
+    parser.add_argument("--quantize", default=os.environ.get("MODEL_QUANTIZE", "none"),
+                        choices=["none", "dynamic", "static"])
+    args = parser.parse_args()
+
+    pipeline = InferencePipeline(
+        model_path=args.model,
+        device=args.device,
+        stub=args.stub,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        optimize=args.optimize,
+        quantize=args.quantize,
+    )
+    server = InferenceServer(args.socket, pipeline)
+    print(f"✅ Inference server listening on {args.socket} (model version: {pipeline.model_version})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
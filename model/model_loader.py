@@ -7,6 +7,15 @@ Usage:
 
 from __future__ import annotations
 
+import copy
+import csv
+import functools
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import warnings
 from pathlib import Path
 from typing import Optional
 import torch
@@ -26,6 +35,23 @@ CLASS_NAMES = [
 
 DEFAULT_MODEL_PATH = Path(__file__).resolve().parent / "efficientnet_b0_best.pth"
 
+# Inference-only model variants (see optimize_model)
+OPTIMIZE_MODES = ("none", "trace", "freeze", "compile")
+
+# INT8 CPU inference (see quantize_model). Static quantization is calibrated on
+# HAM10000 images listed in the metadata CSV; dx codes map onto CLASS_NAMES.
+QUANTIZE_MODES = ("none", "dynamic", "static")
+HAM10000_METADATA = Path(__file__).resolve().parents[1] / "data" / "HAM10000_metadata.csv"
+HAM10000_LABELS = {
+    "mel": "Melanoma",
+    "nv": "Melanocytic_Nevus",
+    "bcc": "Basal_Cell_Carcinoma",
+    "akiec": "Actinic_Keratosis",
+    "bkl": "Benign_Keratosis",
+    "df": "Dermatofibroma",
+    "vasc": "Vascular_Lesion",
+}
+
 
 class EfficientNetB0Classifier(nn.Module):
     """EfficientNetB0 model for 7-class skin cancer classification."""
@@ -51,13 +77,47 @@ class EfficientNetB0Classifier(nn.Module):
         return x
 
 
-def load_local_model(model_path: Optional[Path] = None, device: str = "cpu"):
+def _extract_state_dict(checkpoint):
+    """Handle different checkpoint formats."""
+    if isinstance(checkpoint, dict):
+        if 'model_state_dict' in checkpoint:
+            return checkpoint['model_state_dict']
+        if 'state_dict' in checkpoint:
+            return checkpoint['state_dict']
+    return checkpoint
+
+
+def _load_mmap_model(path: Path):
+    """
+    Build the model with its weights memory-mapped read-only from ``path``.
+
+    The architecture is created on the meta device (no weight allocation) and
+    the mmapped checkpoint tensors are assigned in place, so every worker
+    process that maps the same file shares one copy of the weights through the
+    page cache instead of holding a private one.
+
+    Only tensor/state-dict checkpoints are accepted (``weights_only=True``), so
+    the file cannot run code when unpickled. A checkpoint saved as a whole
+    module (``torch.save(model)``) is rejected here and load_local_model falls
+    back to the regular path; re-save it with ``torch.save(model.state_dict())``
+    to memory-map it.
+    """
+    checkpoint = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    with torch.device("meta"):
+        model = EfficientNetB0Classifier(num_classes=len(CLASS_NAMES))
+    model.load_state_dict(_extract_state_dict(checkpoint), assign=True)
+    return model
+
+
+def load_local_model(model_path: Optional[Path] = None, device: str = "cpu", mmap: Optional[bool] = None):
     """
     Load a PyTorch model from disk.
     
     Args:
         model_path: Path to .pth model file (default: model/efficientnet_b0_best.pth)
         device: Device to load model on ('cpu' or 'cuda')
+        mmap: Memory-map the checkpoint so workers share the weights (CPU only).
+            Defaults to the MODEL_MMAP environment variable.
     
     Returns:
         Loaded PyTorch model in eval mode, or None if file doesn't exist
@@ -66,6 +126,18 @@ def load_local_model(model_path: Optional[Path] = None, device: str = "cpu"):
     if not path.exists():
         print(f"Model file not found: {path}")
         return None
+    if mmap is None:
+        mmap = os.environ.get("MODEL_MMAP", "false").lower() in ("1", "true", "yes")
+    
+    if mmap and device == "cpu":
+        try:
+            model = _load_mmap_model(path)
+            model.eval()
+            print(f"✅ Model memory-mapped from: {path}")
+            return model
+        except Exception as e:
+            # e.g. legacy (non-zipfile) checkpoints and whole-module pickles cannot be mmapped
+            print(f"⚠️  Could not memory-map {path}: {e}. Loading a private copy instead.")
     
     try:
         # Initialize model architecture
@@ -73,17 +145,7 @@ def load_local_model(model_path: Optional[Path] = None, device: str = "cpu"):
         
         # Load state dict
         checkpoint = torch.load(path, map_location=device)
-        
-        # Handle different checkpoint formats
-        if isinstance(checkpoint, dict):
-            if 'model_state_dict' in checkpoint:
-                model.load_state_dict(checkpoint['model_state_dict'])
-            elif 'state_dict' in checkpoint:
-                model.load_state_dict(checkpoint['state_dict'])
-            else:
-                model.load_state_dict(checkpoint)
-        else:
-            model.load_state_dict(checkpoint)
+        model.load_state_dict(_extract_state_dict(checkpoint))
         
         model.eval()  # Set to evaluation mode
         model.to(device)
@@ -96,10 +158,299 @@ def load_local_model(model_path: Optional[Path] = None, device: str = "cpu"):
         return None
 
 
+def _checkpoint_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def optimized_artifact_path(model_path: Path, mode: str) -> Path:
+    """
+    Where the optimized variant of ``model_path`` is cached: in MODEL_CACHE_DIR
+    (for read-only model directories) or next to the checkpoint, keyed by
+    checkpoint hash and torch version so a new checkpoint or a torch upgrade
+    never picks up a stale artifact.
+    """
+    path = Path(model_path)
+    directory = Path(os.environ.get("MODEL_CACHE_DIR") or path.parent)
+    torch_version = torch.__version__.replace("+", "_")
+    suffix = "inductor" if mode == "compile" else "pt"
+    return directory / f"{path.stem}.{mode}-{_checkpoint_hash(path)[:16]}-torch{torch_version}.{suffix}"
+
+
+def _build_optimized(model, mode: str, model_path: Optional[Path], example):
+    if mode == "compile":
+        # torch.compile output cannot be serialized; inductor caches compiled
+        # kernels under TORCHINDUCTOR_CACHE_DIR, which deployments set to a
+        # writable volume so later starts reuse them.
+        return torch.compile(model)
+
+    artifact = optimized_artifact_path(model_path, mode) if model_path is not None else None
+    optimized = None
+    if artifact is not None and artifact.exists():
+        try:
+            optimized = torch.jit.load(str(artifact), map_location=example.device)
+            print(f"✅ Loaded cached {mode} model: {artifact}")
+        except Exception as e:
+            print(f"⚠️  Could not load cached {mode} model {artifact}: {e}. Rebuilding.")
+
+    if optimized is None:
+        with torch.no_grad():
+            optimized = torch.jit.trace(model, example)
+        if mode == "freeze":
+            optimized = torch.jit.freeze(optimized.eval())
+        _save_artifact(optimized, artifact, mode)
+
+    if mode == "freeze":
+        # The oneDNN rewrites do not survive torch.jit.save, so the frozen graph
+        # is what gets cached and these (cheap) passes run on every load
+        optimized = torch.jit.optimize_for_inference(optimized)
+    return optimized
+
+
+def _save_artifact(optimized, artifact: Optional[Path], mode: str):
+    if artifact is None:
+        return
+    tmp_path = None
+    try:
+        # Write then rename, so workers starting together never read a partial file
+        artifact.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=artifact.parent, suffix=".tmp")
+        os.close(fd)
+        torch.jit.save(optimized, tmp_path)
+        os.replace(tmp_path, artifact)
+        print(f"✅ Cached {mode} model: {artifact}")
+    except Exception as e:
+        # e.g. a read-only model directory (set MODEL_CACHE_DIR); the in-memory module is still used
+        print(f"⚠️  Could not cache {mode} model in {artifact.parent}: {e}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def optimize_model(model, mode: Optional[str] = None, model_path: Optional[Path] = None, device: str = "cpu"):
+    """
+    Build an inference-only variant of ``model``.
+
+    Args:
+        model: Eager model in eval mode
+        mode: 'none', 'trace' (TorchScript trace), 'freeze' (trace + freeze +
+            optimize_for_inference) or 'compile' (torch.compile). Defaults to
+            the MODEL_OPTIMIZE environment variable.
+        model_path: Checkpoint the model was loaded from; traced artifacts are
+            cached in MODEL_CACHE_DIR or next to it
+        device: Device the model lives on
+
+    Returns:
+        The optimized module, or ``model`` itself if optimization is disabled,
+        fails, or does not reproduce the eager outputs. Optimized modules do not
+        support the layer hooks Grad-CAM needs, so keep the eager model for that.
+    """
+    mode = (mode or os.environ.get("MODEL_OPTIMIZE", "none")).lower()
+    if mode in ("", "none", "eager"):
+        return model
+    if mode not in OPTIMIZE_MODES:
+        print(f"⚠️  Unknown MODEL_OPTIMIZE mode {mode!r}. Using the eager model.")
+        return model
+
+    try:
+        example = torch.randn(2, 3, 224, 224, device=device)
+        with warnings.catch_warnings():
+            # torch.jit.* emits FutureWarnings on recent torch releases
+            warnings.simplefilter("ignore", FutureWarning)
+            optimized = _build_optimized(model, mode, Path(model_path) if model_path else None, example)
+        with torch.no_grad():
+            expected = model(example)
+            actual = optimized(example)
+        if not torch.allclose(expected, actual, rtol=1e-3, atol=1e-4):
+            raise RuntimeError("outputs differ from the eager model")
+        print(f"✅ Model optimized for inference ({mode})")
+        return optimized
+    except Exception as e:
+        print(f"⚠️  Model optimization ({mode}) failed: {e}. Using the eager model.")
+        return model
+
+
+def load_ham10000_samples(image_dir, limit: Optional[int] = None, metadata_path: Path = HAM10000_METADATA,
+                          seed: int = 0) -> list:
+    """
+    Class-balanced sample of HAM10000 images found under ``image_dir``.
+
+    Images are matched by ``image_id`` (e.g. ISIC_0027419.jpg) anywhere below
+    ``image_dir``, so the Kaggle layout with part_1/part_2 folders works as is.
+
+    Returns:
+        List of (image_path, class_name), round-robin across classes
+    """
+    image_dir = Path(image_dir)
+    if not image_dir.is_dir():
+        return []
+    files = {}
+    for root, _, names in os.walk(image_dir):
+        for name in names:
+            stem, ext = os.path.splitext(name)
+            if ext.lower() in (".jpg", ".jpeg", ".png"):
+                files[stem] = Path(root) / name
+
+    by_class = {}
+    with open(metadata_path, newline="") as f:
+        for row in csv.DictReader(f):
+            path = files.get(row["image_id"])
+            label = HAM10000_LABELS.get(row["dx"])
+            if path is not None and label is not None:
+                by_class.setdefault(label, []).append(path)
+
+    rng = random.Random(seed)
+    for paths in by_class.values():
+        rng.shuffle(paths)
+    samples = []
+    while any(by_class.values()) and (limit is None or len(samples) < limit):
+        for label in CLASS_NAMES:
+            if by_class.get(label) and (limit is None or len(samples) < limit):
+                samples.append((by_class[label].pop(), label))
+    return samples
+
+
+def iter_sample_batches(samples: list, batch_size: int = 8):
+    """Yield (batch tensor, labels) for (image_path, class_name) samples."""
+    from PIL import Image
+
+    transform = get_preprocessing_transform()
+    for i in range(0, len(samples), batch_size):
+        chunk = samples[i:i + batch_size]
+        batch = torch.stack([transform(Image.open(path).convert("RGB")) for path, _ in chunk])
+        yield batch, [label for _, label in chunk]
+
+
+def _quantize_static(model, samples: list, example):
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    engine = "x86" if "x86" in torch.backends.quantized.supported_engines else "qnnpack"
+    torch.backends.quantized.engine = engine
+    # prepare_fx works on a copy so the float model (used by Grad-CAM) is untouched
+    prepared = prepare_fx(copy.deepcopy(model).eval(), get_default_qconfig_mapping(engine), example_inputs=(example,))
+    with torch.no_grad():
+        for batch, _ in iter_sample_batches(samples):
+            prepared(batch)
+        quantized = convert_fx(prepared)
+        # Traced + frozen so the artifact can be cached and later starts skip calibration
+        return torch.jit.freeze(torch.jit.trace(quantized, example).eval())
+
+
+def quantize_model(model, mode: Optional[str] = None, model_path: Optional[Path] = None,
+                   calibration_dir=None, calibration_samples: Optional[int] = None):
+    """
+    Build an INT8 variant of ``model`` for CPU inference.
+
+    Args:
+        model: Float model in eval mode (on CPU)
+        mode: 'none', 'dynamic' (int8 Linear layers only) or 'static' (FX
+            post-training quantization of the whole network, calibrated on
+            HAM10000 images). Defaults to the MODEL_QUANTIZE environment variable.
+        model_path: Checkpoint the model was loaded from; static artifacts are
+            cached in MODEL_CACHE_DIR or next to it (keyed by checkpoint,
+            calibration set and torch version)
+        calibration_dir: Directory holding HAM10000 images (QUANT_CALIBRATION_DIR)
+        calibration_samples: Number of calibration images (QUANT_CALIBRATION_SAMPLES)
+
+    Returns:
+        The quantized module, or ``model`` itself if quantization is disabled or
+        fails. Static mode falls back to dynamic when no calibration images are
+        found. Quantized modules have no float gradients, so Grad-CAM must keep
+        using the float model.
+    """
+    mode = (mode or os.environ.get("MODEL_QUANTIZE", "none")).lower()
+    if mode in ("", "none"):
+        return model
+    if mode not in QUANTIZE_MODES:
+        print(f"⚠️  Unknown MODEL_QUANTIZE mode {mode!r}. Using the float model.")
+        return model
+
+    try:
+        with warnings.catch_warnings():
+            # torch.ao.quantization and torch.jit emit deprecation warnings on recent torch
+            warnings.simplefilter("ignore", DeprecationWarning)
+            warnings.simplefilter("ignore", FutureWarning)
+            warnings.simplefilter("ignore", UserWarning)
+            if mode == "static":
+                calibration_dir = calibration_dir or os.environ.get("QUANT_CALIBRATION_DIR")
+                limit = calibration_samples or int(os.environ.get("QUANT_CALIBRATION_SAMPLES", "128"))
+                samples = load_ham10000_samples(calibration_dir, limit=limit) if calibration_dir else []
+                if not samples:
+                    print("⚠️  No HAM10000 calibration images found (set QUANT_CALIBRATION_DIR). "
+                          "Using dynamic quantization.")
+                    mode = "dynamic"
+
+            if mode == "dynamic":
+                quantized = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+            else:
+                calibration_key = hashlib.sha256(
+                    "\n".join(sorted(path.stem for path, _ in samples)).encode()
+                ).hexdigest()[:8]
+                artifact = (optimized_artifact_path(model_path, f"int8-{calibration_key}")
+                            if model_path is not None else None)
+                quantized = None
+                if artifact is not None and artifact.exists():
+                    try:
+                        quantized = torch.jit.load(str(artifact), map_location="cpu")
+                        print(f"✅ Loaded cached INT8 model: {artifact}")
+                    except Exception as e:
+                        print(f"⚠️  Could not load cached INT8 model {artifact}: {e}. Recalibrating.")
+                if quantized is None:
+                    quantized = _quantize_static(model, samples, torch.randn(2, 3, 224, 224))
+                    _save_artifact(quantized, artifact, "int8")
+
+            with torch.no_grad():
+                quantized(torch.randn(1, 3, 224, 224))
+        print(f"✅ Model quantized to INT8 ({mode})")
+        return quantized
+    except Exception as e:
+        print(f"⚠️  INT8 quantization ({mode}) failed: {e}. Using the float model.")
+        return model
+
+
+def process_memory_mb() -> dict:
+    """
+    Memory usage of the current process in MB.
+
+    On Linux this reads /proc/self/smaps_rollup, which splits RSS into pages
+    shared with other processes (e.g. mmapped weights) and private pages; PSS
+    charges shared pages proportionally and is the number to size containers by.
+    """
+    usage = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"):
+                    usage[key] = int(rest.split()[0]) / 1024.0
+        return {
+            "rss_mb": usage.get("Rss", 0.0),
+            "pss_mb": usage.get("Pss", 0.0),
+            "shared_mb": usage.get("Shared_Clean", 0.0) + usage.get("Shared_Dirty", 0.0),
+            "private_mb": usage.get("Private_Clean", 0.0) + usage.get("Private_Dirty", 0.0),
+        }
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return {}
+    # Other Unixes: only the peak RSS is available (bytes on macOS, KB elsewhere)
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"max_rss_mb": maxrss / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0)}
+
+
+@functools.lru_cache(maxsize=None)
 def get_preprocessing_transform():
     """
     Get the image preprocessing transform for EfficientNetB0.
     Matches ImageNet normalization used during training.
+
+    Built once and shared (the transforms are stateless). Request paths use
+    model/preprocessing.py, which produces the same tensors faster.
     """
     return transforms.Compose([
         transforms.Resize((224, 224)),
@@ -0,0 +1,184 @@
+"""
+ONNX Runtime backend for the EfficientNetB0 classifier.
+
+Export a checkpoint (needs torch):
+    python -m model.onnx_backend --model model/efficientnet_b0_best.pth --output model/efficientnet_b0_best.onnx
+
+Inference only needs numpy, Pillow and onnxruntime, so the classification
+path can run without importing torch (INFERENCE_BACKEND=onnx in the backend).
+"""
+
+from __future__ import annotations
+
+import argparse
+import inspect
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from .preprocessing import IMAGENET_MEAN as _MEAN, IMAGENET_STD as _STD, image_to_nchw
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+INPUT_SIZE = (224, 224)
+IMAGENET_MEAN = np.array(_MEAN, dtype=np.float32).reshape(1, 3, 1, 1)
+IMAGENET_STD = np.array(_STD, dtype=np.float32).reshape(1, 3, 1, 1)
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+
+def export_onnx(model, output_path, opset: int = 17) -> Path:
+    """
+    Export a (float, eval-mode) classifier to ONNX with a dynamic batch axis.
+
+    Inputs are (N, 3, 224, 224) normalized images, outputs are (N, C) logits.
+    """
+    import torch
+
+    output_path = Path(output_path)
+    kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        # The TorchScript exporter needs no extra packages (the dynamo one needs onnxscript)
+        kwargs["dynamo"] = False
+    fd, tmp_path = tempfile.mkstemp(dir=output_path.parent, suffix=".onnx.tmp")
+    os.close(fd)
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                model.eval(),
+                torch.randn(1, 3, *INPUT_SIZE),
+                tmp_path,
+                input_names=["input"],
+                output_names=["logits"],
+                dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+                opset_version=opset,
+                **kwargs,
+            )
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    return output_path
+
+
+def preprocess_image(image) -> np.ndarray:
+    """
+    PIL image -> (1, 3, 224, 224) float32 array, matching
+    model_loader.get_preprocessing_transform() without torchvision.
+    """
+    return image_to_nchw(image.convert("RGB"), INPUT_SIZE)
+
+
+def to_nchw(batch) -> np.ndarray:
+    """
+    Accept torch tensors (already normalized NCHW) or numpy arrays, either
+    normalized NCHW or the backend's fallback (N, H, W, 3) in [0, 1].
+    """
+    if hasattr(batch, "detach"):
+        batch = batch.detach().cpu().numpy()
+    batch = np.asarray(batch, dtype=np.float32)
+    if batch.ndim == 4 and batch.shape[-1] == 3:
+        batch = (batch.transpose(0, 3, 1, 2) - IMAGENET_MEAN) / IMAGENET_STD
+    return np.ascontiguousarray(batch, dtype=np.float32)
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class OnnxClassifier:
+    """
+    onnxruntime session with a torch-module-like call interface: calling it
+    with an (N, 3, 224, 224) batch returns (N, C) logits as a numpy array.
+    """
+
+    def __init__(self, model_path, intra_op_threads: int = 0, inter_op_threads: int = 0,
+                 graph_optimization: str = "all"):
+        if ort is None:
+            raise ImportError("onnxruntime is not installed")
+        if graph_optimization not in GRAPH_OPTIMIZATION_LEVELS:
+            raise ValueError(f"graph_optimization must be one of {sorted(GRAPH_OPTIMIZATION_LEVELS)}")
+        options = ort.SessionOptions()
+        # 0 lets onnxruntime pick (one thread per physical core)
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        if inter_op_threads > 1:
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        options.graph_optimization_level = getattr(
+            ort.GraphOptimizationLevel, GRAPH_OPTIMIZATION_LEVELS[graph_optimization]
+        )
+        self.model_path = Path(model_path)
+        self.session = ort.InferenceSession(str(self.model_path), sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch) -> np.ndarray:
+        return self.session.run(None, {self.input_name: to_nchw(batch)})[0]
+
+    def predict_proba(self, batch) -> np.ndarray:
+        return softmax(self(batch))
+
+    def eval(self):
+        """No-op, for code written against torch modules."""
+        return self
+
+
+def load_onnx_model(model_path, intra_op_threads: int = 0, inter_op_threads: int = 0,
+                    graph_optimization: str = "all") -> Optional[OnnxClassifier]:
+    """Create an OnnxClassifier, or return None if the file or onnxruntime is missing."""
+    path = Path(model_path)
+    if ort is None:
+        print("⚠️  onnxruntime is not installed; the ONNX backend is unavailable")
+        return None
+    if not path.exists():
+        print(f"ONNX model file not found: {path}")
+        print("   Export it with: python -m model.onnx_backend --model <checkpoint.pth> --output <model.onnx>")
+        return None
+    try:
+        model = OnnxClassifier(path, intra_op_threads, inter_op_threads, graph_optimization)
+        print(f"✅ ONNX model loaded from: {path}")
+        return model
+    except Exception as e:
+        print(f"❌ Error loading ONNX model: {e}")
+        return None
+
+
+def main():
+    from .model_loader import DEFAULT_MODEL_PATH, load_local_model
+
+    parser = argparse.ArgumentParser(description="Export the EfficientNetB0 checkpoint to ONNX")
+    parser.add_argument("--model", default=str(DEFAULT_MODEL_PATH))
+    parser.add_argument("--output", help="Default: the checkpoint path with a .onnx suffix")
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+
+    model = load_local_model(args.model)
+    if model is None:
+        raise SystemExit(f"Could not load {args.model}")
+    output = export_onnx(model, args.output or Path(args.model).with_suffix(".onnx"), opset=args.opset)
+    print(f"✅ Exported ONNX model: {output}")
+
+    if ort is not None:
+        import torch
+
+        batch = torch.randn(4, 3, *INPUT_SIZE)
+        with torch.no_grad():
+            expected = model(batch).numpy()
+        actual = OnnxClassifier(output)(batch)
+        print(f"   max |logit difference| vs torch: {np.abs(expected - actual).max():.2e}")
+
+
+if __name__ == "__main__":
+    main()
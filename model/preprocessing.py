@@ -0,0 +1,160 @@
+"""
+Fast image preprocessing for uploads.
+
+Replaces decode -> convert -> Resize -> ToTensor -> Normalize with:
+
+1. JPEG draft decoding: libjpeg decodes straight to the smallest 1/2, 1/4 or
+   1/8 scale that is still at least the target size, so a 12 MP phone photo
+   is never fully decoded.
+2. One antialiased bilinear resize (what torchvision's Resize does for PIL
+   images).
+3. A fused uint8 -> normalized float32 step: a 256-entry lookup table per
+   channel is applied with ``np.take`` directly into the (1, 3, H, W) output
+   buffer, so there are no intermediate float arrays.
+
+Only numpy and Pillow are needed, so the same code serves the torch path
+(wrap the result with ``torch.from_numpy``), the ONNX backend and the numpy
+fallback. Per-stage timings are kept for /metrics/inference.
+"""
+
+from __future__ import annotations
+
+import io
+import math
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+INPUT_SIZE = (224, 224)
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+# (3, 256) tables mapping uint8 pixel values to model inputs
+_NORMALIZE_LUT = (
+    (np.arange(256, dtype=np.float64)[None, :] / 255.0 - np.array(IMAGENET_MEAN)[:, None])
+    / np.array(IMAGENET_STD)[:, None]
+).astype(np.float32)
+_UNIT_LUT = (np.arange(256, dtype=np.float64) / 255.0).astype(np.float32)
+
+
+class StageTimings:
+    """Rolling per-stage latency window (milliseconds)."""
+
+    def __init__(self, stages, window: int = 1000):
+        self._lock = threading.Lock()
+        self._samples = {stage: deque(maxlen=window) for stage in stages}
+        self._counts = {stage: 0 for stage in stages}
+
+    def record(self, stage: str, started: float) -> float:
+        """Record time since ``started`` (a perf_counter value); returns now."""
+        now = time.perf_counter()
+        with self._lock:
+            self._samples[stage].append((now - started) * 1000.0)
+            self._counts[stage] += 1
+        return now
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = {}
+            for stage, samples in self._samples.items():
+                values = np.array(samples, dtype=np.float64)
+                if values.size:
+                    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+                else:
+                    p50 = p90 = p99 = 0.0
+                result[stage] = {"count": self._counts[stage], "p50": float(p50), "p90": float(p90),
+                                 "p99": float(p99)}
+            return result
+
+
+TIMINGS = StageTimings(("decode", "resize", "normalize"))
+
+
+def _fit_within(image_size, max_dim: int) -> tuple[int, int]:
+    """Size of ``image_size`` scaled down so its longer side is ``max_dim``."""
+    width, height = image_size
+    scale = max_dim / max(width, height)
+    return max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale))
+
+
+def decode_image(source, size=INPUT_SIZE, max_dim: Optional[int] = None) -> Image.Image:
+    """
+    Decode upload bytes (or a file path) to an RGB image, using JPEG draft
+    mode to decode directly at a reduced scale that is still at least ``size``
+    (``size=None`` decodes at full resolution). With ``max_dim``, ``size`` is
+    replaced by the image scaled so its longer side is ``max_dim``, which is
+    enough for an output capped at that size.
+    """
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as image:
+        if max_dim:
+            size = _fit_within(image.size, max_dim) if max(image.size) > max_dim else None
+        if size is not None and image.format == "JPEG":
+            image.draft("RGB", size)
+        return image.convert("RGB")
+
+
+def image_to_nchw(image: Image.Image, size=INPUT_SIZE, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Resize an RGB image and write the normalized (1, 3, H, W) float32 array
+    into ``out`` (allocated if not given).
+    """
+    started = time.perf_counter()
+    if image.size != size:
+        image = image.resize(size, Image.BILINEAR)
+    started = TIMINGS.record("resize", started)
+
+    pixels = np.asarray(image, dtype=np.uint8)
+    if out is None:
+        out = np.empty((1, 3, size[1], size[0]), dtype=np.float32)
+    for channel in range(3):
+        np.take(_NORMALIZE_LUT[channel], pixels[:, :, channel], out=out[0, channel])
+    TIMINGS.record("normalize", started)
+    return out
+
+
+def image_to_unit_nhwc(image: Image.Image, size=INPUT_SIZE) -> np.ndarray:
+    """Resize an RGB image to a (1, H, W, 3) float32 array in [0, 1] (the numpy fallback layout)."""
+    started = time.perf_counter()
+    if image.size != size:
+        image = image.resize(size, Image.BILINEAR)
+    started = TIMINGS.record("resize", started)
+    out = np.take(_UNIT_LUT, np.asarray(image, dtype=np.uint8))[None]
+    TIMINGS.record("normalize", started)
+    return out
+
+
+def preprocess(data, size=INPUT_SIZE, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Upload bytes (or a file path) -> normalized (1, 3, H, W) float32 array for EfficientNetB0."""
+    started = time.perf_counter()
+    image = decode_image(data, size)
+    TIMINGS.record("decode", started)
+    return image_to_nchw(image, size, out=out)
+
+
+def preprocess_unit_nhwc(data, size=INPUT_SIZE) -> np.ndarray:
+    """Upload bytes (or a file path) -> (1, H, W, 3) float32 array in [0, 1]."""
+    started = time.perf_counter()
+    image = decode_image(data, size)
+    TIMINGS.record("decode", started)
+    return image_to_unit_nhwc(image, size)
+
+
+def decode_and_preprocess(source, size=INPUT_SIZE, max_dim: Optional[int] = None) -> tuple[Image.Image, np.ndarray]:
+    """
+    Decode once and return both the RGB image (for the heatmap overlay) and
+    the normalized model input derived from it. JPEGs are draft-decoded to
+    no more than an overlay capped at ``max_dim`` needs (None = full
+    resolution).
+    """
+    started = time.perf_counter()
+    image = decode_image(source, size=None, max_dim=max_dim)
+    TIMINGS.record("decode", started)
+    return image, image_to_nchw(image, size)
+
+
+def preprocessing_stats() -> dict:
+    return TIMINGS.stats()